@@ -2,46 +2,45 @@ import os
 import logging
 import json
 import tempfile
-from PyPDF2 import PdfReader
-from docx import Document
-from openpyxl import load_workbook
-from pptx import Presentation
-import pytesseract
-import cv2
-import numpy as np
 
-# Try to import Groq - handle import error gracefully
-try:
-    from groq import Groq
-    GROQ_IMPORT_SUCCESS = True
-except ImportError:
-    GROQ_IMPORT_SUCCESS = False
-    logger = logging.getLogger(__name__)
-    logger.warning("Groq package not installed - AI features will be disabled")
+# Groq and the document readers are imported on first use, so importing
+# this module stays cheap until someone actually asks for AI analysis.
 
 logger = logging.getLogger(__name__)
 
-# Initialize Groq client
+# Groq client, created on first use
 client = None
-try:
-    GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-    if GROQ_API_KEY and GROQ_IMPORT_SUCCESS:
-        client = Groq(api_key=GROQ_API_KEY)
-        AI_AVAILABLE = True
-        logger.info("Groq AI client initialized successfully")
-    else:
-        AI_AVAILABLE = False
-        if not GROQ_IMPORT_SUCCESS:
-            logger.warning("Groq package not available - AI features disabled")
+_client_initialized = False
+
+def get_ai_client():
+    """Get the Groq client, creating it on first use (None if AI is disabled)"""
+    global client, _client_initialized
+    if _client_initialized:
+        return client
+    _client_initialized = True
+    
+    try:
+        from groq import Groq
+    except ImportError:
+        logger.warning("Groq package not available - AI features disabled")
+        return None
+    
+    try:
+        GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+        if GROQ_API_KEY:
+            client = Groq(api_key=GROQ_API_KEY)
+            logger.info("Groq AI client initialized successfully")
         else:
             logger.warning("GROQ_API_KEY not found - AI features disabled")
-except Exception as e:
-    logger.error(f"Error initializing Groq client: {e}")
-    AI_AVAILABLE = False
+    except Exception as e:
+        logger.error(f"Error initializing Groq client: {e}")
+    return client
 
 def extract_text_from_pdf(file_path):
     """Extract text content from PDF file"""
     try:
+        from PyPDF2 import PdfReader
+        
         reader = PdfReader(file_path)
         text_content = []
         
@@ -58,6 +57,8 @@ def extract_text_from_pdf(file_path):
 def extract_text_from_docx(file_path):
     """Extract text content from Word document"""
     try:
+        from docx import Document
+        
         doc = Document(file_path)
         text_content = []
         
@@ -73,6 +74,8 @@ def extract_text_from_docx(file_path):
 def extract_text_from_xlsx(file_path):
     """Extract text content from Excel file"""
     try:
+        from openpyxl import load_workbook
+        
         workbook = load_workbook(file_path)
         text_content = []
         
@@ -98,6 +101,8 @@ def extract_text_from_xlsx(file_path):
 def extract_text_from_pptx(file_path):
     """Extract text content from PowerPoint presentation"""
     try:
+        from pptx import Presentation
+        
         prs = Presentation(file_path)
         text_content = []
         
@@ -119,6 +124,9 @@ def extract_text_from_pptx(file_path):
 def extract_text_from_image(file_path):
     """Extract text from image using OCR"""
     try:
+        import pytesseract
+        import cv2
+        
         # Read image
         img = cv2.imread(file_path)
         if img is None:
@@ -138,7 +146,8 @@ def extract_text_from_image(file_path):
 
 def analyze_document_with_ai(content, document_type="document"):
     """Analyze document content using Groq AI and provide enhancement suggestions"""
-    if not AI_AVAILABLE:
+    client = get_ai_client()
+    if not client:
         return {
             "error": "AI analysis not available. Please set GROQ_API_KEY environment variable.",
             "suggestions": []
@@ -1,28 +1,20 @@
 import os
 import logging
-from flask import Flask, request, render_template_string
-from werkzeug.middleware.proxy_fix import ProxyFix
-from bot import setup_bot, process_update
+from contextlib import asynccontextmanager
+from jinja2 import Template
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from starlette.routing import Route
+from bot import setup_bot, start_bot, stop_bot, process_update
+from metrics import metrics_registry
+from log_buffer import configure_logging
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Create Flask app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "your-secret-key-here")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Initialize bot
-bot = setup_bot()
-
-@app.route('/')
-def index():
-    """Landing page with webhook setup instructions"""
-    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN', 'NOT_SET')
-    webhook_url = request.url_root + 'webhook'
-    
-    return render_template_string("""
+INDEX_TEMPLATE = Template("""
     <!DOCTYPE html>
     <html>
     <head>
@@ -90,37 +82,77 @@ curl -F "url={{ webhook_url }}" https://api.telegram.org/bot{{ bot_token }}/setW
         </script>
     </body>
     </html>
-    """, webhook_url=webhook_url, bot_token=bot_token)
+    """)
+
+async def index(request: Request):
+    """Landing page with webhook setup instructions"""
+    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN', 'NOT_SET')
+    webhook_url = str(request.base_url) + 'webhook'
+    
+    return HTMLResponse(INDEX_TEMPLATE.render(webhook_url=webhook_url, bot_token=bot_token))
 
-@app.route('/webhook', methods=['POST', 'GET'])
-def webhook():
+async def webhook(request: Request):
     """Handle incoming Telegram updates"""
     if request.method == 'GET':
-        return {
+        return JSONResponse({
             "status": "Webhook endpoint is active",
             "method": "This endpoint only accepts POST requests from Telegram",
             "bot": "DocuSmith (@FlexiPDF_bot)",
             "features": ["txt2pdf", "img2pdf", "doc2pdf", "mergepdf", "splitpdf"]
-        }, 200
+        }, status_code=200)
     
     try:
-        update_data = request.get_json()
+        update_data = await request.json()
         if update_data:
-            logger.info(f"Received update: {update_data}")
-            process_update(bot, update_data)
-            return "OK", 200
+            logger.debug(f"Received update {update_data.get('update_id')}")
+            process_update(request.app.state.application, update_data)
+            return PlainTextResponse("OK", status_code=200)
         else:
             logger.warning("Received empty update")
-            return "Bad Request", 400
+            return PlainTextResponse("Bad Request", status_code=400)
     except Exception as e:
         logger.error(f"Error processing webhook: {e}")
-        return "Internal Server Error", 500
+        return PlainTextResponse("Internal Server Error", status_code=500)
 
-@app.route('/health')
-def health():
+async def health(request: Request):
     """Health check endpoint"""
-    return {"status": "healthy", "bot": "running"}, 200
+    return JSONResponse({"status": "healthy", "bot": "running"}, status_code=200)
+
+async def metrics(request: Request):
+    """Prometheus metrics endpoint, protected by METRICS_TOKEN when it is set"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token:
+        supplied = request.query_params.get('token') or request.headers.get('authorization', '').removeprefix('Bearer ')
+        if supplied != token:
+            return PlainTextResponse("Unauthorized", status_code=401)
+    
+    return PlainTextResponse(metrics_registry.render(), media_type='text/plain; version=0.0.4')
+
+def create_app(build_application=setup_bot):
+    """Create the ASGI app; the bot runs on the server's own event loop"""
+    @asynccontextmanager
+    async def lifespan(app):
+        application = build_application()
+        app.state.application = application
+        await start_bot(application)
+        try:
+            yield
+        finally:
+            await stop_bot(application)
+
+    return Starlette(
+        routes=[
+            Route('/', index),
+            Route('/webhook', webhook, methods=['POST', 'GET']),
+            Route('/health', health),
+            Route('/metrics', metrics),
+        ],
+        lifespan=lifespan
+    )
+
+app = create_app()
 
 if __name__ == '__main__':
+    import uvicorn
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    uvicorn.run(app, host='0.0.0.0', port=port, proxy_headers=True, forwarded_allow_ips='*')
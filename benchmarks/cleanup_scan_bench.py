@@ -0,0 +1,133 @@
+"""Temp file cleanup scan benchmark on a synthetic directory.
+
+Fills a scratch directory with ``--files`` files, a ``--match`` fraction
+of them named like the bot's temp files and an ``--old`` fraction of
+those older than the cleanup age. Then it times the stats scan and the
+deleting sweep of CleanupSystem against a replica of the previous
+implementation. The replica runs one glob per pattern per directory, over
+a temp_dirs list that names the same directory twice. Each sweep runs on
+a fresh copy of the tree.
+
+Usage:
+    python benchmarks/cleanup_scan_bench.py --files 100000
+"""
+import os
+import sys
+import glob
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cleanup_system import CleanupSystem
+
+MATCHING_NAMES = ['split_{}.pdf', 'merge_{}.pdf', 'img_{}.pdf', 'doc_{}.pdf', 'text_{}.pdf', '{}.tmp', 'temp_{}']
+OTHER_NAMES = ['img_{}.jpg', 'upload_{}.docx', 'ocr_{}.jpg', 'session_{}.db', 'cache_{}.pdf']
+
+def build_tree(root, files, match, old):
+    """Create the synthetic temp directory"""
+    rng = random.Random(42)
+    old_time = time.time() - 2 * 3600
+    for index in range(files):
+        matching = rng.random() < match
+        name = rng.choice(MATCHING_NAMES if matching else OTHER_NAMES).format(index)
+        path = os.path.join(root, name)
+        with open(path, 'wb') as file:
+            file.write(b'x' * rng.randint(0, 2048))
+        if matching and rng.random() < old:
+            os.utime(path, (old_time, old_time))
+
+def legacy_stats(temp_dirs, patterns):
+    """The previous get_temp_stats: one glob per pattern per directory"""
+    total_files = 0
+    total_size = 0
+    for temp_dir in temp_dirs:
+        if not os.path.exists(temp_dir):
+            continue
+        for pattern in patterns:
+            for file_path in glob.glob(os.path.join(temp_dir, pattern)):
+                try:
+                    total_files += 1
+                    total_size += os.stat(file_path).st_size
+                except OSError:
+                    continue
+    return total_files, total_size
+
+def legacy_cleanup(temp_dirs, patterns, cutoff_time):
+    """The previous cleanup_temp_files"""
+    deleted_count = 0
+    total_size_freed = 0
+    for temp_dir in temp_dirs:
+        if not os.path.exists(temp_dir):
+            continue
+        for pattern in patterns:
+            for file_path in glob.glob(os.path.join(temp_dir, pattern)):
+                try:
+                    file_stat = os.stat(file_path)
+                    if file_stat.st_mtime < cutoff_time:
+                        os.unlink(file_path)
+                        deleted_count += 1
+                        total_size_freed += file_stat.st_size
+                except OSError:
+                    continue
+    return deleted_count, total_size_freed
+
+def timed(func, *args):
+    """Run ``func`` and return (seconds, result)"""
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--match', type=float, default=0.3, help='fraction of files matching a cleanup pattern')
+    parser.add_argument('--old', type=float, default=0.5, help='fraction of matching files past the cleanup age')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='cleanup_bench_')
+    template = os.path.join(scratch, 'template')
+    os.makedirs(template)
+    try:
+        print(f"Building {args.files} files...")
+        build_tree(template, args.files, args.match, args.old)
+
+        cleanup = CleanupSystem()
+        # The same directory twice, as tempfile.gettempdir() and '/tmp' are on Render
+        cleanup.temp_dirs = [template, os.path.join(template, '')]
+        patterns = cleanup.cleanup_patterns
+        cutoff = time.time() - cleanup.max_file_age_hours * 3600
+
+        legacy_times, scan_times = [], []
+        for _ in range(args.runs):
+            seconds, legacy_result = timed(legacy_stats, cleanup.temp_dirs, patterns)
+            legacy_times.append(seconds)
+            seconds, scan_result = timed(cleanup.scan_temp_files)
+            scan_times.append(seconds)
+        print(f"\nstats scan:   legacy {min(legacy_times) * 1000:8.1f} ms ({legacy_result[0]} files counted)")
+        print(f"              scandir {min(scan_times) * 1000:7.1f} ms ({scan_result['files']} files counted)")
+        print(f"              {min(legacy_times) / min(scan_times):.1f}x faster")
+
+        # Deleting sweeps each get a fresh copy of the tree
+        for label, sweep in (('legacy', lambda dirs: legacy_cleanup(dirs, patterns, cutoff)),
+                             ('scandir', None)):
+            copy = os.path.join(scratch, label)
+            shutil.copytree(template, copy)
+            dirs = [copy, os.path.join(copy, '')]
+            if sweep is None:
+                cleanup.temp_dirs = dirs
+                seconds, result = timed(cleanup.scan_temp_files, cutoff)
+                deleted = result['deleted']
+            else:
+                seconds, (deleted, _) = timed(sweep, dirs)
+            print(f"delete sweep: {label:7} {seconds * 1000:8.1f} ms ({deleted} files deleted)")
+            shutil.rmtree(copy)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Metrics instrumentation overhead on the conversion paths.
+
+Times the metric updates one job makes (a stage histogram observation per
+stage transition, the job duration, the outcome counter and the pool
+conversion histogram and counter). Then it runs text, image and merge
+conversions in-process with and without those updates and reports the
+overhead as a share of the conversion time. Finally it times a render of
+the registry with every operation and stage populated, as a scrape would.
+
+Usage:
+    python benchmarks/metrics_overhead_bench.py --runs 20
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from metrics import MetricsRegistry
+from pdf_utils import create_text_pdf, create_image_pdf, merge_pdfs
+
+# Stages a typical job passes through before it finishes
+STAGES = ('queued', 'downloading', 'converting', 'sending')
+
+def build_registry():
+    """Register the job and pool metrics the way jobs.py and conversion_executor.py do"""
+    registry = MetricsRegistry()
+    stage_seconds = registry.histogram('pdfbot_job_stage_seconds', 'stage', ('operation', 'stage'))
+    job_seconds = registry.histogram('pdfbot_job_seconds', 'job', ('operation',))
+    jobs_total = registry.counter('pdfbot_jobs_total', 'jobs', ('operation', 'outcome'))
+    conversion_seconds = registry.histogram('pdfbot_conversion_seconds', 'conversion', ('function',))
+    conversions_total = registry.counter('pdfbot_conversions_total', 'conversions', ('function', 'outcome'))
+
+    def instrument(operation, function, started):
+        """Make every metric update of one job"""
+        stage_started = started
+        for stage in STAGES:
+            now = time.perf_counter()
+            stage_seconds.labels(operation, stage).observe(now - stage_started)
+            stage_started = now
+        conversion_seconds.labels(function).observe(now - started)
+        conversions_total.labels(function, 'ok').inc()
+        finished = time.perf_counter()
+        job_seconds.labels(operation).observe(finished - started)
+        jobs_total.labels(operation, 'done').inc()
+
+    return registry, instrument
+
+def make_inputs(scratch, images):
+    """Create the image and PDF inputs"""
+    image_paths = []
+    for index in range(images):
+        path = os.path.join(scratch, f'img_{index}.jpg')
+        Image.new('RGB', (1200, 1600), (index * 40 % 255, 120, 200)).save(path, quality=85)
+        image_paths.append(path)
+    pdf_paths = []
+    for index in range(3):
+        path = os.path.join(scratch, f'merge_{index}.pdf')
+        create_text_pdf(f"Document {index}\n" + "Lorem ipsum dolor sit amet. " * 400, output=path)
+        pdf_paths.append(path)
+    return image_paths, pdf_paths
+
+def best_of(runs, func):
+    """Run ``func`` ``runs`` times and return the fastest time in seconds"""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--images', type=int, default=3)
+    parser.add_argument('--calls', type=int, default=100000, help='jobs worth of metric updates to time')
+    args = parser.parse_args()
+
+    registry, instrument = build_registry()
+
+    started = time.perf_counter()
+    for _ in range(args.calls):
+        instrument('img2pdf', 'create_image_pdf', time.perf_counter())
+    per_job = (time.perf_counter() - started) / args.calls
+    print(f"metric updates per job: {per_job * 1e6:.2f} µs")
+
+    with tempfile.TemporaryDirectory(prefix='metrics_bench_') as scratch:
+        image_paths, pdf_paths = make_inputs(scratch, args.images)
+        conversions = [
+            ('txt2pdf', 'create_text_pdf', lambda: create_text_pdf("Hello " * 2000, output=io.BytesIO())),
+            ('img2pdf', 'create_image_pdf', lambda: create_image_pdf(image_paths, output=io.BytesIO())),
+            ('mergepdf', 'merge_pdfs', lambda: merge_pdfs(pdf_paths, output=io.BytesIO()))
+        ]
+        print()
+        for operation, function, convert in conversions:
+            def instrumented():
+                started = time.perf_counter()
+                convert()
+                instrument(operation, function, started)
+
+            plain = best_of(args.runs, convert)
+            measured = best_of(args.runs, instrumented)
+            print(f"{operation:9} {plain * 1000:8.2f} ms plain, {measured * 1000:8.2f} ms instrumented, "
+                  f"overhead {per_job / plain * 100:.4f}% of conversion time")
+
+    started = time.perf_counter()
+    body = registry.render()
+    print(f"\nscrape render: {(time.perf_counter() - started) * 1000:.2f} ms "
+          f"({body.count(chr(10))} lines)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Worker boot time benchmark based on ``python -X importtime``.
+
+Imports ``app`` (what each server worker does before serving its first
+update) in a fresh interpreter several times and reports the cumulative
+import time and the slowest top-level imports. Pass ``--ref`` to measure
+a git revision of this repository side by side with the working tree.
+
+Usage:
+    python benchmarks/startup_importtime.py --runs 5 --ref baseline-commit
+"""
+import os
+import re
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)$')
+
+def measure(tree, module):
+    """Import ``module`` once in a fresh interpreter; return (total_us, wall_s, per-package us)"""
+    env = dict(os.environ)
+    env.setdefault('TELEGRAM_BOT_TOKEN', '123456:BENCHMARK')
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    code = (
+        "import time, sys; started = time.perf_counter(); "
+        f"import {module}; "
+        "sys.stdout.write(repr(time.perf_counter() - started))"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=tree, env=env, capture_output=True, text=True, check=True
+    )
+
+    # Sum self time per root package, e.g. every reportlab.* module together
+    imports = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            package = match.group(3).split('.')[0]
+            imports[package] = imports.get(package, 0) + int(match.group(1))
+    wall = float(result.stdout.strip().splitlines()[-1])
+    return sum(imports.values()), wall, imports
+
+def run_tree(label, tree, module, runs, top):
+    """Measure a source tree and print its summary"""
+    totals, walls, imports = [], [], {}
+    for _ in range(runs):
+        total, wall, run_imports = measure(tree, module)
+        totals.append(total)
+        walls.append(wall)
+        for name, micros in run_imports.items():
+            imports.setdefault(name, []).append(micros)
+
+    print(f"\n== {label} ==")
+    print(f"import {module}: median {statistics.median(walls) * 1000:.1f} ms wall, "
+          f"min {min(walls) * 1000:.1f} ms, importtime total {statistics.median(totals) / 1000:.1f} ms")
+    slowest = sorted(imports.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:top]
+    for name, micros in slowest:
+        print(f"  {statistics.median(micros) / 1000:>8.1f} ms  {name}")
+    return statistics.median(walls)
+
+def export_ref(ref):
+    """Extract a git revision into a temporary directory"""
+    target = tempfile.mkdtemp(prefix='importtime_')
+    archive = subprocess.run(['git', 'archive', ref], cwd=REPO_ROOT, capture_output=True, check=True)
+    subprocess.run(['tar', '-x', '-C', target], input=archive.stdout, check=True)
+    return target
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--ref', help='git revision to compare against (e.g. the baseline commit)')
+    args = parser.parse_args()
+
+    before = None
+    if args.ref:
+        tree = export_ref(args.ref)
+        try:
+            before = run_tree(f"{args.ref}", tree, args.module, args.runs, args.top)
+        finally:
+            shutil.rmtree(tree, ignore_errors=True)
+
+    after = run_tree('working tree', REPO_ROOT, args.module, args.runs, args.top)
+    if before:
+        print(f"\nworker boot: {before * 1000:.1f} ms -> {after * 1000:.1f} ms "
+              f"({(1 - after / before) * 100:.0f}% faster)")
+
+if __name__ == '__main__':
+    main()
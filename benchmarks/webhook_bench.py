@@ -0,0 +1,215 @@
+"""Webhook throughput and acknowledgement latency benchmark.
+
+Compares the ASGI entry point in app.py against a replica of the previous
+stack: a synchronous Flask-style view served by one gunicorn sync worker,
+handing updates to a daemon thread that drains a queue.Queue and awaits
+each update in turn.
+
+Handlers are simulated by an application whose ``process_update`` sleeps
+for ``--work-ms``, standing in for Telegram API round trips. Telegram is
+never contacted.
+
+Usage:
+    python benchmarks/webhook_bench.py --updates 2000 --clients 32
+"""
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:BENCHMARK')
+
+from telegram import Update
+
+def make_update(update_id, users):
+    """Build a minimal text message update"""
+    user_id = 1000 + update_id % users
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench'},
+            'text': 'hello'
+        }
+    }
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+class FakeApplication:
+    """Stand-in for telegram.ext.Application"""
+
+    def __init__(self, work_seconds):
+        self.bot = None
+        self.work_seconds = work_seconds
+        self.processed = 0
+        self.done = threading.Event()
+        self.expected = 0
+
+    async def initialize(self):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_update(self, update):
+        await asyncio.sleep(self.work_seconds)
+        self.processed += 1
+        if self.processed >= self.expected:
+            self.done.set()
+
+def bench_legacy(bodies, clients, work_seconds, sync_workers):
+    """Replica of the Flask view + queue.Queue + asyncio.run thread bridge"""
+    application = FakeApplication(work_seconds)
+    application.expected = len(bodies)
+    update_queue = queue.Queue()
+    logger = logging.getLogger('legacy')
+
+    def update_processor():
+        async def process_updates():
+            while True:
+                try:
+                    update_data = update_queue.get(timeout=1)
+                    update = Update.de_json(update_data, application.bot)
+                    if update:
+                        await application.process_update(update)
+                    update_queue.task_done()
+                except queue.Empty:
+                    continue
+        asyncio.run(process_updates())
+
+    threading.Thread(target=update_processor, daemon=True).start()
+
+    def view(body):
+        update_data = json.loads(body)
+        logger.info(f"Received update: {update_data}")
+        update_queue.put(update_data)
+        return "OK", 200
+
+    server = ThreadPoolExecutor(max_workers=sync_workers)
+    latencies = []
+    lock = threading.Lock()
+    cursor = iter(bodies)
+
+    def client():
+        while True:
+            with lock:
+                body = next(cursor, None)
+            if body is None:
+                return
+            started = time.perf_counter()
+            server.submit(view, body).result()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    application.done.wait()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    return elapsed, latencies
+
+def bench_asgi(bodies, clients, work_seconds):
+    """Drive app.create_app() directly over the ASGI protocol"""
+    from app import create_app
+
+    application = FakeApplication(work_seconds)
+    application.expected = len(bodies)
+    app = create_app(build_application=lambda: application)
+
+    async def call(body):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'POST', 'scheme': 'http', 'path': '/webhook', 'raw_path': b'/webhook',
+            'query_string': b'', 'root_path': '', 'server': ('bench', 80), 'client': ('bench', 1),
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode())],
+            'app': app
+        }
+        sent = False
+        status = None
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await app(scope, receive, send)
+        return status
+
+    async def run():
+        latencies = []
+        cursor = iter(bodies)
+
+        async def client():
+            for body in cursor:
+                started = time.perf_counter()
+                await call(body)
+                latencies.append(time.perf_counter() - started)
+
+        async with app.router.lifespan_context(app):
+            started = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(clients)))
+            while application.processed < application.expected:
+                await asyncio.sleep(0.001)
+            elapsed = time.perf_counter() - started
+        return elapsed, latencies
+
+    return asyncio.run(run())
+
+def report(name, count, elapsed, latencies):
+    print(f"{name:<28} {count / elapsed:>12.1f} {percentile(latencies, 50) * 1000:>10.2f} "
+          f"{percentile(latencies, 99) * 1000:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--work-ms', type=float, default=20.0)
+    parser.add_argument('--sync-workers', type=int, default=1,
+                        help='threads serving the legacy view (gunicorn sync worker = 1)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    bodies = [json.dumps(make_update(i, args.users)).encode() for i in range(args.updates)]
+    work_seconds = args.work_ms / 1000
+
+    print(f"{args.updates} updates, {args.clients} clients, {args.users} users, "
+          f"{args.work_ms:.0f} ms simulated handler work")
+    print(f"{'stack':<28} {'updates/s':>12} {'p50 ms':>10} {'p99 ms':>10}")
+    report('flask + thread bridge', args.updates,
+           *bench_legacy(bodies, args.clients, work_seconds, args.sync_workers))
+    report('asgi + dispatcher', args.updates,
+           *bench_asgi(bodies, args.clients, work_seconds))
+
+if __name__ == '__main__':
+    main()
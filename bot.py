@@ -1,14 +1,25 @@
 import os
 import logging
+import schedule
 from telegram import Bot, Update
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from handlers import (
     start_handler, help_handler, txt2pdf_handler, img2pdf_handler, 
     doc2pdf_handler, mergepdf_handler, splitpdf_handler,
-    button_callback_handler, message_handler
+    button_callback_handler, message_handler, state_manager
 )
 from master_control import handle_master_login
 from cleanup_system import cleanup_system
+from conversion_executor import conversion_executor
+from job_journal import job_journal
+from jobs import recover_interrupted_jobs
+from prefetch import upload_prefetcher
+from delivery import document_delivery
+from temp_tracker import temp_tracker
+from disk_pressure import disk_pressure_watcher
+from stats_sampler import stats_sampler
+from usage_stats import usage_stats
+from broadcast import broadcaster
 
 logger = logging.getLogger(__name__)
 
@@ -47,65 +58,133 @@ def setup_bot():
     ))
     
     # Initialize cleanup system
+    schedule.every().hour.do(state_manager.cleanup_inactive_users)
+    schedule.every().hour.do(job_journal.compact)
+    schedule.every().hour.do(document_delivery.prune)
+    schedule.every().hour.do(usage_stats.prune)
+    schedule.every(10).minutes.do(upload_prefetcher.release_idle_sessions)
+    schedule.every(10).minutes.do(temp_tracker.sweep)
     cleanup_system.schedule_cleanup()
+    disk_pressure_watcher.start()
+    stats_sampler.start()
+    usage_stats.start()
     logger.info("Cleanup system initialized with hourly schedule")
     
+    # Start conversion workers before the first job arrives
+    conversion_executor.warm_up()
+    
     return application
 
-import threading
-import queue
+import asyncio
+from dispatcher import update_dispatcher
+from update_dedup import update_deduplicator
 
-# Global application instance
-_application_instance = None
-_update_queue = queue.Queue()
-_processing_thread = None
+async def start_bot(application):
+    """Initialize and start the application on the server's event loop"""
+    await application.initialize()
+    await application.start()
+    logger.info("Bot application started")
+    
+    # Pick up conversions and broadcasts cut off by the last shutdown
+    await recover_interrupted_jobs(application.bot)
+    broadcaster.start(application.bot)
 
-def start_update_processor():
-    """Start a background thread to process updates"""
-    global _processing_thread
-    if _processing_thread is None or not _processing_thread.is_alive():
-        _processing_thread = threading.Thread(target=_update_processor, daemon=True)
-        _processing_thread.start()
+async def stop_bot(application):
+    """Stop and shut down the application"""
+    await broadcaster.stop()
+    await application.stop()
+    await application.shutdown()
+    logger.info("Bot application stopped")
 
-def _update_processor():
-    """Background thread function to process updates"""
-    import asyncio
-    
-    async def process_updates():
-        global _application_instance
-        if _application_instance and not _application_instance.running:
-            await _application_instance.initialize()
-            
-        while True:
-            try:
-                # Get update from queue (blocking)
-                update_data = _update_queue.get(timeout=1)
-                if _application_instance:
-                    update = Update.de_json(update_data, _application_instance.bot)
-                    if update:
-                        await _application_instance.process_update(update)
-                _update_queue.task_done()
-            except queue.Empty:
-                continue
-            except Exception as e:
-                logger.error(f"Error in update processor: {e}")
-    
-    # Run the async processing loop
-    asyncio.run(process_updates())
+def _sender_id(update_data):
+    """Get the ID of the user who sent an update, if any"""
+    for field in ('message', 'edited_message', 'callback_query', 'inline_query',
+                  'chosen_inline_result', 'pre_checkout_query', 'shipping_query'):
+        sender = (update_data.get(field) or {}).get('from')
+        if sender and 'id' in sender:
+            return sender['id']
+    return None
+
+def _update_key(update_data):
+    """Pick the lane key so updates from the same user stay in order"""
+    sender_id = _sender_id(update_data)
+    return update_data.get('update_id') if sender_id is None else sender_id
+
+# Callbacks that start a conversion job
+HEAVY_CALLBACK_PREFIXES = ('orient_', 'merge_done', 'ocr_done', 'quick_split_')
+
+# States in which an incoming message starts a conversion job
+HEAVY_MESSAGE_STATES = {
+    'waiting_for_document', 'waiting_for_split_pdf', 'waiting_for_split_pages',
+    'waiting_for_password', 'ai_analysis'
+}
+
+BUSY_MESSAGE = "⏳ The bot is very busy right now. Please try again in a minute."
+
+# Pending "busy" notifications; capped so overload never snowballs
+_busy_replies = set()
+MAX_BUSY_REPLIES = 50
+
+def _is_heavy_update(update_data):
+    """Check whether an update would start an expensive operation"""
+    callback_query = update_data.get('callback_query')
+    if callback_query:
+        return (callback_query.get('data') or '').startswith(HEAVY_CALLBACK_PREFIXES)
+
+    message = update_data.get('message')
+    if message and message.get('from'):
+        return state_manager.get_state(message['from']['id']) in HEAVY_MESSAGE_STATES
+    return False
+
+def _reply_busy(application, update_data):
+    """Tell a shed user to retry, without queueing behind the backlog"""
+    if len(_busy_replies) >= MAX_BUSY_REPLIES:
+        return
+
+    callback_query = update_data.get('callback_query')
+    message = update_data.get('message')
+    if callback_query:
+        coroutine = application.bot.answer_callback_query(
+            callback_query['id'], text=BUSY_MESSAGE, show_alert=True
+        )
+    elif message:
+        coroutine = application.bot.send_message(chat_id=message['chat']['id'], text=BUSY_MESSAGE)
+    else:
+        return
+
+    async def reply():
+        try:
+            await coroutine
+        except Exception as e:
+            logger.warning(f"Could not send busy reply: {e}")
+
+    task = asyncio.get_running_loop().create_task(reply())
+    _busy_replies.add(task)
+    task.add_done_callback(_busy_replies.discard)
 
 def process_update(application, update_data):
-    """Queue incoming Telegram update for processing"""
-    global _application_instance, _update_queue
-    
+    """Queue incoming Telegram update for processing on the running event loop"""
+    async def job():
+        update = Update.de_json(update_data, application.bot)
+        if update:
+            await application.process_update(update)
+
     try:
-        # Set the global application instance
-        _application_instance = application
-        
-        # Start the update processor if not running
-        start_update_processor()
-        
-        # Add update to queue for processing
-        _update_queue.put(update_data)
-        
+        update_id = update_data.get('update_id')
+        if update_id is not None and update_deduplicator.is_duplicate(update_id):
+            logger.info(f"Dropped duplicate delivery of update {update_id}")
+            return
+
+        sender_id = _sender_id(update_data)
+        if sender_id is not None:
+            usage_stats.record('active', sender_id)
+        broadcaster.register_update(update_data)
+
+        accepted = update_dispatcher.submit(
+            _update_key(update_data), job, heavy=_is_heavy_update(update_data)
+        )
+        if not accepted:
+            logger.warning(f"Update {update_data.get('update_id')} shed by admission control")
+            _reply_busy(application, update_data)
     except Exception as e:
         logger.error(f"Error queuing update: {e}")
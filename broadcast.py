@@ -0,0 +1,279 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from dispatcher import update_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Longest text Telegram accepts in one message
+MAX_BROADCAST_LENGTH = 4096
+
+# Broadcasts that still have chats to send to
+OPEN_STATUSES = ('queued', 'running')
+
+class BroadcastStore:
+    """SQLite registry of chats that used the bot, and of broadcasts.
+
+    A chat is written once, when it is first seen; later sightings are a
+    set lookup. Chats that blocked the bot or were deleted are marked so
+    later broadcasts skip them. Each broadcast row holds its text, its
+    status and a checkpoint: the last chat ID it sent to (chats are sent
+    to in ID order) and its counters.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.environ.get(
+            'BROADCAST_DB_PATH', os.path.join(tempfile.gettempdir(), 'pdfbot_broadcasts.db')
+        )
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS chats ("
+                "chat_id INTEGER PRIMARY KEY, first_seen REAL NOT NULL, unreachable INTEGER NOT NULL DEFAULT 0)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS broadcasts ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL, created REAL NOT NULL, "
+                "status TEXT NOT NULL, total INTEGER NOT NULL, cursor INTEGER, "
+                "sent INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, "
+                "unreachable INTEGER NOT NULL DEFAULT 0, finished REAL)"
+            )
+        self._known = {chat_id for (chat_id,) in self._connection().execute("SELECT chat_id FROM chats")}
+
+    def _connection(self):
+        """Get this thread's database connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def register_chat(self, chat_id: int):
+        """Remember a chat the bot can broadcast to"""
+        if chat_id in self._known:
+            return
+        self._known.add(chat_id)
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO chats (chat_id, first_seen) VALUES (?, ?)", (chat_id, time.time())
+            )
+
+    def mark_unreachable(self, chat_id: int):
+        """Skip a chat that blocked the bot or no longer exists"""
+        with self._connection() as connection:
+            connection.execute("UPDATE chats SET unreachable = 1 WHERE chat_id = ?", (chat_id,))
+
+    def reachable_count(self) -> int:
+        """Count the chats a broadcast goes to"""
+        return self._connection().execute("SELECT COUNT(*) FROM chats WHERE unreachable = 0").fetchone()[0]
+
+    def chats_after(self, cursor: Optional[int], limit: int) -> List[int]:
+        """Get the next reachable chat IDs after ``cursor``, in order"""
+        rows = self._connection().execute(
+            "SELECT chat_id FROM chats WHERE unreachable = 0 AND chat_id > ? ORDER BY chat_id LIMIT ?",
+            (-2 ** 63 if cursor is None else cursor, limit)
+        )
+        return [chat_id for (chat_id,) in rows]
+
+    def create_broadcast(self, text: str) -> int:
+        """Queue a broadcast and return its ID"""
+        with self._connection() as connection:
+            return connection.execute(
+                "INSERT INTO broadcasts (text, created, status, total) VALUES (?, ?, 'queued', ?)",
+                (text, time.time(), self.reachable_count())
+            ).lastrowid
+
+    def checkpoint(self, broadcast: Dict[str, Any]):
+        """Save a broadcast's progress"""
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE broadcasts SET status = ?, cursor = ?, sent = ?, failed = ?, unreachable = ?, finished = ? "
+                "WHERE id = ?",
+                (broadcast['status'], broadcast['cursor'], broadcast['sent'], broadcast['failed'],
+                 broadcast['unreachable'], broadcast['finished'], broadcast['id'])
+            )
+
+    def next_open(self) -> Optional[Dict[str, Any]]:
+        """Get the oldest broadcast that still has chats to send to"""
+        row = self._connection().execute(
+            "SELECT * FROM broadcasts WHERE status IN (?, ?) ORDER BY id LIMIT 1", OPEN_STATUSES
+        ).fetchone()
+        return dict(row) if row else None
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Get the most recent broadcast"""
+        row = self._connection().execute("SELECT * FROM broadcasts ORDER BY id DESC LIMIT 1").fetchone()
+        return dict(row) if row else None
+
+    def cancel_open(self) -> int:
+        """Cancel every unfinished broadcast"""
+        with self._connection() as connection:
+            return connection.execute(
+                "UPDATE broadcasts SET status = 'cancelled', finished = ? WHERE status IN (?, ?)",
+                (time.time(),) + OPEN_STATUSES
+            ).rowcount
+
+class Broadcaster:
+    """Send broadcasts in the background without crowding out user traffic.
+
+    Broadcasts run one at a time, oldest first, as a task on the bot's
+    event loop. Sends are paced at BROADCAST_RATE messages per second, below
+    Telegram's global limit of about 30 per second so replies to users
+    keep their share; each chat gets one message, well within the per-chat
+    limit. A RetryAfter halves the rate and waits as told; the rate then
+    creeps back up with every successful send. Sending pauses while the
+    update dispatcher is shedding load or has more than
+    BROADCAST_YIELD_QUEUE updates waiting. Progress is checkpointed after
+    every send, so a broadcast interrupted by a restart resumes with the
+    next chat.
+    """
+
+    def __init__(self, store: BroadcastStore = None, rate: float = None, yield_queue: int = None,
+                 retries: int = 3):
+        self.store = store or BroadcastStore()
+        self.max_rate = rate or float(os.environ.get('BROADCAST_RATE', 20))
+        self.yield_queue = yield_queue or int(os.environ.get('BROADCAST_YIELD_QUEUE', 20))
+        self.retries = retries
+        self.rate = self.max_rate
+        self._task = None
+        self._bot = None
+        self._next_send = 0.0
+        self.rate_limited = 0
+        self.paused = 0
+
+    def register_update(self, update_data: Dict[str, Any]):
+        """Register the chat an incoming update came from"""
+        message = update_data.get('message') or (update_data.get('callback_query') or {}).get('message')
+        chat = (message or {}).get('chat')
+        if chat and 'id' in chat:
+            self.store.register_chat(chat['id'])
+
+    def submit(self, bot, text: str) -> int:
+        """Queue a broadcast and make sure the sender is running"""
+        broadcast_id = self.store.create_broadcast(text)
+        logger.info(f"Broadcast #{broadcast_id} queued for {self.store.reachable_count()} chats")
+        self.start(bot)
+        return broadcast_id
+
+    def start(self, bot):
+        """Start sending open broadcasts, including ones interrupted by a restart"""
+        self._bot = bot
+        if self._task is not None and not self._task.done():
+            return
+        if self.store.next_open() is None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._task.add_done_callback(self._log_crash)
+
+    @staticmethod
+    def _log_crash(task):
+        """Log a sender task that died; its broadcast resumes on the next start"""
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Broadcast sender stopped: {task.exception()}")
+
+    async def stop(self):
+        """Stop sending; open broadcasts resume on the next start"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def cancel(self) -> int:
+        """Cancel every unfinished broadcast"""
+        cancelled = self.store.cancel_open()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        return cancelled
+
+    async def _pace(self):
+        """Wait for the next send slot and for user traffic to calm down"""
+        while True:
+            stats = update_dispatcher.get_stats()
+            if not stats['shedding'] and stats['queued'] <= self.yield_queue:
+                break
+            self.paused += 1
+            await asyncio.sleep(1)
+
+        delay = self._next_send - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next_send = time.monotonic() + 1 / self.rate
+
+    async def _send(self, chat_id: int, text: str) -> str:
+        """Send one message; returns 'sent', 'failed' or 'unreachable'"""
+        for attempt in range(1, self.retries + 1):
+            await self._pace()
+            try:
+                await self._bot.send_message(chat_id=chat_id, text=text)
+                self.rate = min(self.max_rate, self.rate + 0.1)
+                return 'sent'
+            except RetryAfter as e:
+                self.rate_limited += 1
+                self.rate = max(1.0, self.rate / 2)
+                logger.warning(f"Broadcast rate limited, waiting {e.retry_after}s and slowing to {self.rate:.1f}/s")
+                self._next_send = time.monotonic() + float(e.retry_after)
+            except (Forbidden, BadRequest) as e:
+                # Blocked the bot, deactivated or deleted chat
+                logger.info(f"Broadcast skipped chat {chat_id}: {e}")
+                self.store.mark_unreachable(chat_id)
+                return 'unreachable'
+            except NetworkError as e:
+                if attempt == self.retries:
+                    logger.warning(f"Broadcast to chat {chat_id} failed: {e}")
+                    return 'failed'
+                await asyncio.sleep(2 ** attempt)
+            except TelegramError as e:
+                logger.warning(f"Broadcast to chat {chat_id} failed: {e}")
+                return 'failed'
+        return 'failed'
+
+    async def _run(self):
+        """Send open broadcasts until there are none left"""
+        while True:
+            broadcast = self.store.next_open()
+            if broadcast is None:
+                return
+            broadcast['status'] = 'running'
+            self.store.checkpoint(broadcast)
+            logger.info(f"Broadcast #{broadcast['id']} running from chat {broadcast['cursor']}")
+
+            while True:
+                chat_ids = self.store.chats_after(broadcast['cursor'], 100)
+                if not chat_ids:
+                    break
+                for chat_id in chat_ids:
+                    outcome = await self._send(chat_id, broadcast['text'])
+                    broadcast[outcome] += 1
+                    broadcast['cursor'] = chat_id
+                    self.store.checkpoint(broadcast)
+
+            broadcast['status'] = 'done'
+            broadcast['finished'] = time.time()
+            self.store.checkpoint(broadcast)
+            logger.info(
+                f"Broadcast #{broadcast['id']} done: {broadcast['sent']} sent, {broadcast['failed']} failed, "
+                f"{broadcast['unreachable']} unreachable"
+            )
+
+    def get_stats(self):
+        """Get the latest broadcast's progress and the sender's pacing"""
+        return {
+            'chats': self.store.reachable_count(),
+            'running': self._task is not None and not self._task.done(),
+            'rate': self.rate,
+            'rate_limited': self.rate_limited,
+            'paused': self.paused,
+            'latest': self.store.latest()
+        }
+
+# Global broadcaster instance
+broadcaster = Broadcaster()
@@ -1,11 +1,13 @@
 import os
+import re
+import fnmatch
 import tempfile
 import time
 import logging
 import schedule
 import threading
 from datetime import datetime, timedelta
-import glob
+from workspace import workspace_registry
 
 logger = logging.getLogger(__name__)
 
@@ -22,31 +24,71 @@ class CleanupSystem:
             '*.tmp',
             'temp_*'
         ]
+        # One regex for all patterns, so each name is tested once
+        self._pattern = re.compile('|'.join(fnmatch.translate(pattern) for pattern in self.cleanup_patterns))
     
-    def cleanup_temp_files(self):
+    def _unique_temp_dirs(self):
+        """Get the existing temp directories, each physical directory once"""
+        seen = set()
+        unique_dirs = []
+        for temp_dir in self.temp_dirs:
+            try:
+                dir_stat = os.stat(temp_dir)
+            except OSError:
+                continue
+            # tempfile.gettempdir() is usually /tmp itself
+            if (dir_stat.st_dev, dir_stat.st_ino) not in seen:
+                seen.add((dir_stat.st_dev, dir_stat.st_ino))
+                unique_dirs.append(temp_dir)
+        return unique_dirs
+    
+    def scan_temp_files(self, delete_before=None, protected=()):
+        """Scan the temp directories once, deleting matching files modified before ``delete_before``.
+
+        Real paths in ``protected`` are never deleted. Returns the count and
+        size of the matching files that remain and of the ones deleted.
+        """
+        result = {'files': 0, 'bytes': 0, 'deleted': 0, 'freed': 0}
+        for temp_dir in self._unique_temp_dirs():
+            try:
+                entries = os.scandir(temp_dir)
+            except OSError as e:
+                logger.error(f"Cannot scan {temp_dir}: {e}")
+                continue
+            with entries:
+                for entry in entries:
+                    # Like glob, wildcards never match hidden files
+                    if entry.name.startswith('.') or not self._pattern.match(entry.name):
+                        continue
+                    try:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        file_stat = entry.stat(follow_symlinks=False)
+                        if delete_before is not None and file_stat.st_mtime < delete_before \
+                                and (not protected or os.path.realpath(entry.path) not in protected):
+                            os.unlink(entry.path)
+                            result['deleted'] += 1
+                            result['freed'] += file_stat.st_size
+                            logger.debug(f"Deleted temp file: {entry.path}")
+                        else:
+                            result['files'] += 1
+                            result['bytes'] += file_stat.st_size
+                    except OSError:
+                        continue
+        return result
+    
+    def cleanup_temp_files(self, max_age_hours=None, protected=()):
         """Clean up temporary files older than specified time"""
         try:
-            deleted_count = 0
-            total_size_freed = 0
-            cutoff_time = time.time() - (self.max_file_age_hours * 3600)
+            max_age_hours = self.max_file_age_hours if max_age_hours is None else max_age_hours
+            cutoff_time = time.time() - (max_age_hours * 3600)
+            result = self.scan_temp_files(delete_before=cutoff_time, protected=protected)
+            deleted_count = result['deleted']
+            total_size_freed = result['freed']
             
-            for temp_dir in self.temp_dirs:
-                if not os.path.exists(temp_dir):
-                    continue
-                    
-                for pattern in self.cleanup_patterns:
-                    file_pattern = os.path.join(temp_dir, pattern)
-                    for file_path in glob.glob(file_pattern):
-                        try:
-                            file_stat = os.stat(file_path)
-                            if file_stat.st_mtime < cutoff_time:
-                                file_size = file_stat.st_size
-                                os.unlink(file_path)
-                                deleted_count += 1
-                                total_size_freed += file_size
-                                logger.info(f"Deleted temp file: {file_path}")
-                        except (OSError, FileNotFoundError):
-                            continue
+            # Job workspaces are removed when their job ends; this only
+            # catches directories left by a crashed process
+            deleted_count += workspace_registry.remove_orphans(max_age_hours * 3600)
             
             logger.info(f"Cleanup completed: {deleted_count} files deleted, {total_size_freed/1024/1024:.2f} MB freed")
             return deleted_count, total_size_freed
@@ -58,24 +100,8 @@ class CleanupSystem:
     def get_temp_stats(self):
         """Get statistics about temporary files"""
         try:
-            total_files = 0
-            total_size = 0
-            
-            for temp_dir in self.temp_dirs:
-                if not os.path.exists(temp_dir):
-                    continue
-                    
-                for pattern in self.cleanup_patterns:
-                    file_pattern = os.path.join(temp_dir, pattern)
-                    for file_path in glob.glob(file_pattern):
-                        try:
-                            file_stat = os.stat(file_path)
-                            total_files += 1
-                            total_size += file_stat.st_size
-                        except (OSError, FileNotFoundError):
-                            continue
-            
-            return total_files, total_size
+            result = self.scan_temp_files()
+            return result['files'], result['bytes']
             
         except Exception as e:
             logger.error(f"Error getting temp stats: {e}")
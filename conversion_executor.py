@@ -0,0 +1,162 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from temp_tracker import temp_tracker
+from metrics import metrics_registry
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+CONVERSION_SECONDS = metrics_registry.histogram(
+    'pdfbot_conversion_seconds', 'Wall time of pool conversions, including the wait for a worker', ('function',)
+)
+CONVERSIONS_TOTAL = metrics_registry.counter(
+    'pdfbot_conversions_total', 'Pool conversions by outcome', ('function', 'outcome')
+)
+
+class ConversionTimeout(Exception):
+    """Raised when a conversion job exceeds its time limit"""
+
+def _warm_worker():
+    """Import the conversion libraries so the worker is ready for real jobs"""
+    # The conversion modules import these lazily; workers pay for them up
+    # front so the first real job does not
+    import pdf_utils  # noqa: F401
+    import document_converter  # noqa: F401
+    import reportlab.platypus  # noqa: F401
+    import fpdf  # noqa: F401
+    import PyPDF2  # noqa: F401
+    import PIL.Image  # noqa: F401
+    return os.getpid()
+
+def _traced_call(func, args, kwargs, parent):
+    """Run a conversion in a worker, collecting its spans for the job's trace"""
+    with tracer.collect(parent) as trace:
+        result = func(*args, **kwargs)
+    return result, trace.started, trace.spans
+
+class ConversionExecutor:
+    """Run CPU-bound conversions in a warm process pool.
+
+    Jobs take and return file paths, so only short strings cross the process
+    boundary. ``run`` returns an awaitable, so handlers can ``await`` a
+    conversion without blocking the event loop.
+    """
+
+    def __init__(self, max_workers: int = None, default_timeout: float = None):
+        self.max_workers = max_workers or int(os.environ.get('CONVERSION_WORKERS', os.cpu_count() or 2))
+        self.default_timeout = default_timeout or float(os.environ.get('CONVERSION_TIMEOUT', 300))
+        self._pool = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.resubmitted = 0
+
+    def _get_pool(self):
+        """Get the process pool, creating it if needed"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"Conversion pool started with {self.max_workers} workers")
+            return self._pool
+
+    def warm_up(self):
+        """Start all workers and preload the conversion modules"""
+        if multiprocessing.parent_process() is not None:
+            # Spawned workers re-import the main module; never nest pools
+            return
+        pool = self._get_pool()
+        for _ in range(self.max_workers):
+            pool.submit(_warm_worker)
+
+    def _recycle(self, pool):
+        """Replace a pool whose worker is stuck on a timed-out job"""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+
+        # Other jobs on the old pool fail with BrokenProcessPool; run() sends
+        # them to the new pool, so only the stuck job is lost
+        processes = list((pool._processes or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        logger.warning(f"Conversion pool recycled, {len(processes)} workers terminated")
+
+    async def run(self, func, *args, timeout: float = None, **kwargs):
+        """Run ``func(*args, **kwargs)`` in the pool and await its result"""
+        timeout = timeout or self.default_timeout
+        pool = self._get_pool()
+        loop = asyncio.get_running_loop()
+        trace = tracer.current()
+        name = f"pool.{func.__name__}"
+        if trace is None:
+            call = functools.partial(func, *args, **kwargs)
+        else:
+            call = functools.partial(_traced_call, func, args, kwargs, name)
+        started = time.perf_counter()
+
+        try:
+            with tracer.span(name) as span:
+                submitted = time.time()
+                try:
+                    result = await asyncio.wait_for(loop.run_in_executor(pool, call), timeout)
+                except BrokenProcessPool:
+                    if pool is self._pool:
+                        raise
+                    # The pool was recycled for another job's timeout; run
+                    # again on the new pool in the time that is left
+                    self.resubmitted += 1
+                    logger.warning(f"Resubmitting {func.__name__} after a pool recycle")
+                    remaining = timeout - (time.perf_counter() - started)
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    pool = self._get_pool()
+                    submitted = time.time()
+                    result = await asyncio.wait_for(loop.run_in_executor(pool, call), remaining)
+                if trace is not None:
+                    result, worker_started, worker_spans = result
+                    span['queue_wait'] = round(worker_started - submitted, 6)
+                    trace.spans.extend(worker_spans)
+            self.completed += 1
+            CONVERSION_SECONDS.labels(func.__name__).observe(time.perf_counter() - started)
+            CONVERSIONS_TOTAL.labels(func.__name__, 'ok').inc()
+            # Temp outputs created in the worker are now owned by this process
+            if isinstance(result, str) and temp_tracker.is_temp_output(result):
+                temp_tracker.track(result)
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            CONVERSIONS_TOTAL.labels(func.__name__, 'timeout').inc()
+            logger.error(f"Conversion {func.__name__} timed out after {timeout}s")
+            self._recycle(pool)
+            raise ConversionTimeout(f"{func.__name__} exceeded {timeout}s")
+        except Exception:
+            self.failed += 1
+            CONVERSIONS_TOTAL.labels(func.__name__, 'error').inc()
+            raise
+
+    def get_stats(self):
+        """Get conversion pool statistics"""
+        return {
+            'workers': self.max_workers,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'resubmitted': self.resubmitted
+        }
+
+# Global conversion executor instance
+conversion_executor = ConversionExecutor()
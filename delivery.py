@@ -0,0 +1,149 @@
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import tempfile
+import threading
+from typing import Optional
+from telegram.error import BadRequest
+from pdf_utils import open_pdf_output
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+class DocumentDelivery:
+    """Send results, resending by Telegram file_id when possible.
+
+    After a result is uploaded, the ``file_id`` Telegram returns is stored
+    in SQLite under the result's fingerprint (its result cache key plus
+    the file name, which Telegram keeps with the file). Delivering the same
+    result again sends that ``file_id`` instead of the bytes. If Telegram
+    rejects a stale ID, the entry is dropped and the file is uploaded again.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or os.environ.get(
+            'DELIVERY_INDEX_PATH', os.path.join(tempfile.gettempdir(), 'pdfbot_deliveries.db')
+        )
+        self.max_entries = max_entries or int(os.environ.get('DELIVERY_INDEX_MAX_ENTRIES', 10000))
+        self._local = threading.local()
+        self.resent = 0
+        self.uploaded = 0
+        self.stale = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS delivered_files ("
+                "fingerprint TEXT PRIMARY KEY, file_id TEXT NOT NULL, ts REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS delivered_files_ts ON delivered_files (ts)")
+
+    def _connection(self):
+        """Get this thread's database connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def fingerprint(result_key: Optional[str], filename: str) -> Optional[str]:
+        """Identify a delivered file by its result and name"""
+        if result_key is None:
+            return None
+        return hashlib.sha256(f"{result_key}:{filename}".encode('utf-8')).hexdigest()
+
+    def lookup(self, fingerprint: Optional[str]) -> Optional[str]:
+        """Get the file_id a result was delivered with"""
+        if fingerprint is None:
+            return None
+        row = self._connection().execute(
+            "SELECT file_id FROM delivered_files WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def delivered(self, result_key: Optional[str], filename: str) -> bool:
+        """Check whether a result has a file_id to resend"""
+        return self.lookup(self.fingerprint(result_key, filename)) is not None
+
+    def remember(self, fingerprint: Optional[str], file_id: str):
+        """Store the file_id a result was delivered with"""
+        if fingerprint is None:
+            return
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO delivered_files (fingerprint, file_id, ts) VALUES (?, ?, ?)",
+                (fingerprint, file_id, time.time())
+            )
+
+    def forget(self, fingerprint: str):
+        """Drop a file_id Telegram no longer accepts"""
+        with self._connection() as connection:
+            connection.execute("DELETE FROM delivered_files WHERE fingerprint = ?", (fingerprint,))
+
+    async def resend(self, bot, chat_id: int, result_key: Optional[str], filename: str, **kwargs):
+        """Send a result delivered before by its file_id, without its bytes.
+
+        Returns the sent message, or None if the result has no usable
+        file_id, in which case the caller has to build and upload it.
+        """
+        fingerprint = self.fingerprint(result_key, filename)
+        file_id = self.lookup(fingerprint)
+        if not file_id:
+            return None
+        try:
+            with tracer.span('telegram.resend'):
+                message = await bot.send_document(chat_id=chat_id, document=file_id, **kwargs)
+        except BadRequest as e:
+            logger.warning(f"Delivered file_id for {filename} was rejected ({e}), uploading again")
+            self.forget(fingerprint)
+            self.stale += 1
+            return None
+        self.remember(fingerprint, file_id)
+        self.resent += 1
+        return message
+
+    async def send_document(self, bot, chat_id: int, result_key: Optional[str], document,
+                            filename: str, **kwargs):
+        """Send a result (a file path or buffer) as a document.
+
+        ``result_key`` is the result cache key of the document, or None if
+        it cannot be reused. Extra keyword arguments go to
+        ``bot.send_document``.
+        """
+        message = await self.resend(bot, chat_id, result_key, filename, **kwargs)
+        if message is not None:
+            return message
+
+        fingerprint = self.fingerprint(result_key, filename)
+        with open_pdf_output(document) as pdf_file, tracer.span('telegram.upload'):
+            message = await bot.send_document(chat_id=chat_id, document=pdf_file, filename=filename, **kwargs)
+        self.uploaded += 1
+        if message.document:
+            self.remember(fingerprint, message.document.file_id)
+        return message
+
+    def prune(self) -> int:
+        """Keep only the max_entries most recently delivered files"""
+        with self._connection() as connection:
+            cursor = connection.execute(
+                "DELETE FROM delivered_files WHERE fingerprint NOT IN ("
+                "SELECT fingerprint FROM delivered_files ORDER BY ts DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+        return cursor.rowcount
+
+    def get_stats(self):
+        """Get index size and resend/upload counts"""
+        entries = self._connection().execute("SELECT COUNT(*) FROM delivered_files").fetchone()[0]
+        return {
+            'entries': entries,
+            'resent': self.resent,
+            'uploaded': self.uploaded,
+            'stale': self.stale
+        }
+
+# Global document delivery instance
+document_delivery = DocumentDelivery()
@@ -0,0 +1,116 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from job_journal import job_journal
+from cleanup_system import cleanup_system
+from temp_tracker import temp_tracker
+from result_cache import result_cache
+
+logger = logging.getLogger(__name__)
+
+# Cleanup passes, mildest first: (minimum file age in minutes, share of
+# the result cache budget to keep)
+CLEANUP_PASSES = [
+    (60, 1.0),
+    (15, 0.5),
+    (2, 0.0)
+]
+
+class DiskPressureWatcher:
+    """Free temp disk space as soon as usage crosses a watermark.
+
+    A background thread samples the temp mount every DISK_CHECK_SECONDS.
+    Once usage reaches DISK_HIGH_WATERMARK it runs the cleanup passes in
+    order, each deleting younger temp files and shrinking the result cache
+    further, and stops as soon as usage falls below DISK_LOW_WATERMARK.
+    Files listed by unfinished jobs in the journal are protected, as are
+    live job workspaces and tracked converter outputs. The minimum file age
+    of the last pass protects files that are still being written.
+    """
+
+    def __init__(self, path: str = None, high_watermark: float = None, low_watermark: float = None,
+                 interval: float = None):
+        self.path = path or os.environ.get('DISK_QUOTA_PATH', tempfile.gettempdir())
+        self.high_watermark = high_watermark or float(os.environ.get('DISK_HIGH_WATERMARK', 85))
+        self.low_watermark = low_watermark or float(os.environ.get('DISK_LOW_WATERMARK', 70))
+        self.interval = interval or float(os.environ.get('DISK_CHECK_SECONDS', 30))
+        self._thread = None
+        self.usage = 0.0
+        self.checks = 0
+        self.triggered = 0
+        self.passes = 0
+        self.deepest_pass = 0
+        self.freed = 0
+
+    def _usage_percent(self) -> float:
+        """Get how full the temp mount is"""
+        usage = shutil.disk_usage(self.path)
+        return usage.used / usage.total * 100
+
+    def _protected_paths(self):
+        """Get the real paths of files that unfinished jobs still use"""
+        return {os.path.realpath(path) for job in job_journal.unfinished_jobs() for path in job['files']}
+
+    def check(self) -> float:
+        """Sample disk usage and clean up if it is above the high watermark"""
+        self.checks += 1
+        self.usage = self._usage_percent()
+        if self.usage < self.high_watermark:
+            return self.usage
+
+        self.triggered += 1
+        started_usage = self.usage
+        protected = self._protected_paths()
+        freed = 0
+        for number, (max_age_minutes, cache_share) in enumerate(CLEANUP_PASSES, start=1):
+            leaked_bytes = temp_tracker.leaked_bytes
+            _, files_freed = cleanup_system.cleanup_temp_files(max_age_minutes / 60, protected)
+            temp_tracker.sweep(max_age_minutes * 60)
+            freed += files_freed + temp_tracker.leaked_bytes - leaked_bytes + result_cache.trim(cache_share)
+            self.passes += 1
+            self.deepest_pass = max(self.deepest_pass, number)
+            self.usage = self._usage_percent()
+            if self.usage < self.low_watermark:
+                break
+
+        self.freed += freed
+        logger.warning(
+            f"Disk pressure: {started_usage:.0f}% -> {self.usage:.0f}% after {number} cleanup passes "
+            f"({freed / 1024 / 1024:.1f} MB freed)"
+        )
+        return self.usage
+
+    def start(self):
+        """Start watching in a background thread"""
+        if self._thread is not None:
+            return
+
+        def watch():
+            while True:
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error(f"Disk pressure check failed: {e}")
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=watch, name='disk-pressure', daemon=True)
+        self._thread.start()
+        logger.info(f"Disk pressure watcher started ({self.high_watermark:.0f}% high, {self.low_watermark:.0f}% low)")
+
+    def get_stats(self):
+        """Get the last usage sample and cleanup counts"""
+        return {
+            'usage': self.usage,
+            'high_watermark': self.high_watermark,
+            'low_watermark': self.low_watermark,
+            'triggered': self.triggered,
+            'passes': self.passes,
+            'deepest_pass': self.deepest_pass,
+            'freed': self.freed
+        }
+
+# Global disk pressure watcher instance
+disk_pressure_watcher = DiskPressureWatcher()
@@ -0,0 +1,175 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from cleanup_system import cleanup_system
+from metrics import metrics_registry
+from workspace import workspace_registry
+
+logger = logging.getLogger(__name__)
+
+# Peak disk use of an operation, as a multiple of its input size (inputs
+# plus intermediates plus output)
+EXPANSION_FACTORS = {
+    'txt2pdf': 1.0,
+    'splitpdf': 2.0,
+    'password': 2.0,
+    'img2pdf': 2.5,
+    'doc2pdf': 3.0,
+    'mergepdf': 2.0,
+    'ocr2pdf': 3.0,
+    'ai': 1.0
+}
+DEFAULT_EXPANSION_FACTOR = 2.0
+
+# Assumed size of an input whose size Telegram did not report (the Bot API
+# download limit)
+UNKNOWN_FILE_BYTES = 20 * 1024 * 1024
+
+class DiskQuota:
+    """Reserve space on the temp disk before jobs download their inputs.
+
+    A job reserves its estimated peak use (input sizes times the
+    operation's expansion factor) and keeps it until it finishes. What a
+    job has already written to its workspace is gone from the free space,
+    so only the rest of its reservation is held back. Jobs that do not
+    fit in the free space, less a headroom and the unwritten part of the
+    other jobs' reservations, wait in FIFO order. Crossing the usage watermark,
+    or having to queue a job, triggers an early temp file cleanup. A job
+    too big to ever fit runs once nothing else holds a reservation.
+    """
+
+    def __init__(self, path: str = None, headroom_bytes: int = None, watermark: float = None,
+                 poll_seconds: float = 5):
+        self.path = path or os.environ.get('DISK_QUOTA_PATH', tempfile.gettempdir())
+        self.headroom_bytes = headroom_bytes or int(os.environ.get('DISK_HEADROOM_MB', 50)) * 1024 * 1024
+        self.watermark = watermark or float(os.environ.get('DISK_CLEANUP_WATERMARK', 80))
+        self.poll_seconds = poll_seconds
+        self._reserved = 0
+        self._holders: Dict[object, Tuple[int, Optional[str]]] = {}
+        self._queue = deque()
+        self._condition = None
+        self._cleanup = None
+        self._last_cleanup = 0.0
+        self.reservations = 0
+        self.queued = 0
+        self.cleanups = 0
+
+    @staticmethod
+    def estimate(operation: str, sizes: List[Optional[int]]) -> int:
+        """Estimate the peak bytes a job writes to disk"""
+        total = sum(UNKNOWN_FILE_BYTES if size is None else size for size in sizes)
+        return int(total * EXPANSION_FACTORS.get(operation, DEFAULT_EXPANSION_FACTOR))
+
+    def _outstanding(self) -> int:
+        """Get the reserved bytes that jobs have not written to their workspaces yet"""
+        outstanding = 0
+        for need, job_id in list(self._holders.values()):
+            written = workspace_registry.written(job_id) if job_id else 0
+            outstanding += max(0, need - written)
+        return outstanding
+
+    def _available(self) -> int:
+        """Get the bytes not yet used or reserved"""
+        free = shutil.disk_usage(self.path).free
+        return free - self.headroom_bytes - self._outstanding()
+
+    def _usage_percent(self) -> float:
+        """Get how full the disk is"""
+        usage = shutil.disk_usage(self.path)
+        return usage.used / usage.total * 100
+
+    def _start_cleanup(self, reason: str):
+        """Run the temp file cleanup in a thread, at most once a minute"""
+        if self._cleanup is not None and not self._cleanup.done():
+            return
+        if time.monotonic() - self._last_cleanup < 60:
+            return
+        self._last_cleanup = time.monotonic()
+        self.cleanups += 1
+        logger.warning(f"Starting early temp file cleanup: {reason}")
+        self._cleanup = asyncio.get_running_loop().run_in_executor(None, cleanup_system.cleanup_temp_files)
+
+    @asynccontextmanager
+    async def reserve(self, operation: str, sizes: List[Optional[int]], job_id: str = None):
+        """Hold a disk reservation for a job's inputs for the duration of the block.
+
+        ``job_id`` names the workspace the job writes to, so the bytes it
+        has written are not counted against the free space twice.
+        """
+        need = self.estimate(operation, sizes)
+        if not need:
+            yield
+            return
+
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        usage = self._usage_percent()
+        if usage >= self.watermark:
+            self._start_cleanup(f"disk {usage:.0f}% full")
+
+        ticket = object()
+        self._queue.append(ticket)
+        try:
+            async with self._condition:
+                waited = False
+                while not (self._queue[0] is ticket
+                           and (need <= self._available() or (waited and not self._holders))):
+                    if not waited:
+                        self.queued += 1
+                        self._start_cleanup(f"{operation} job needs {need / 1024 / 1024:.0f} MB")
+                        logger.info(f"Queued {operation} job until {need / 1024 / 1024:.0f} MB of disk is free")
+                    waited = True
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), self.poll_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                self._queue.popleft()
+                self._reserved += need
+                self._holders[ticket] = (need, job_id)
+                self.reservations += 1
+                self._condition.notify_all()
+        except BaseException:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                await self._notify()
+            raise
+
+        try:
+            yield
+        finally:
+            self._reserved -= need
+            del self._holders[ticket]
+            await self._notify()
+
+    async def _notify(self):
+        """Wake waiting jobs so they re-check the free space"""
+        async with self._condition:
+            self._condition.notify_all()
+
+    def get_stats(self):
+        """Get reservation counts and disk usage"""
+        usage = shutil.disk_usage(self.path)
+        return {
+            'reserved': self._reserved,
+            'holders': len(self._holders),
+            'waiting': len(self._queue),
+            'reservations': self.reservations,
+            'queued': self.queued,
+            'cleanups': self.cleanups,
+            'free': usage.free,
+            'watermark': self.watermark
+        }
+
+# Global disk quota instance
+disk_quota = DiskQuota()
+
+metrics_registry.gauge('pdfbot_disk_reserved_bytes', 'Temp disk space reserved by jobs').set_function(
+    lambda: disk_quota.get_stats()['reserved'])
+metrics_registry.gauge('pdfbot_disk_waiting_jobs', 'Jobs waiting for temp disk space').set_function(
+    lambda: disk_quota.get_stats()['waiting'])
@@ -0,0 +1,150 @@
+import os
+import asyncio
+import logging
+import contextvars
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict
+from metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Whether the update running in the current lane task still holds its
+# concurrency slot
+_held_slot = contextvars.ContextVar('held_slot', default=None)
+
+class UpdateDispatcher:
+    """Run updates concurrently while keeping each user's updates in order.
+
+    Every submitted job goes into a per-key lane (normally the Telegram user
+    ID). A lane is drained by its own task, one job at a time, so one user's
+    updates are never reordered. A shared semaphore limits how many jobs run
+    at once across all lanes. A job that is about to wait a long time, e.g.
+    for a heavy-job slot, gives its slot back with ``release_slot`` so
+    other users' cheap updates keep running. All methods must be called
+    from the event loop thread.
+
+    Intake is bounded. Once the queue reaches the high watermark, heavy jobs
+    are shed until it drains back to the low watermark; cheap jobs are only
+    refused when the queue is completely full.
+    """
+
+    def __init__(self, max_concurrency: int = None, max_queued: int = None,
+                 high_watermark: int = None, low_watermark: int = None):
+        self.max_concurrency = max_concurrency or int(os.environ.get('MAX_CONCURRENT_UPDATES', 16))
+        self.max_queued = max_queued or int(os.environ.get('UPDATE_QUEUE_MAX', 1000))
+        self.high_watermark = high_watermark or int(os.environ.get('UPDATE_QUEUE_HIGH_WATERMARK', 200))
+        self.low_watermark = low_watermark or int(os.environ.get('UPDATE_QUEUE_LOW_WATERMARK', 100))
+        self._semaphore = None
+        self._lanes: Dict[Any, Deque[Callable[[], Awaitable[Any]]]] = {}
+        self._tasks = set()
+        self._queued = 0
+        self._in_flight = 0
+        self._shedding = False
+        self.processed = 0
+        self.failed = 0
+        self.shed = 0
+        self.dropped = 0
+        self.released = 0
+
+    def _update_shedding(self):
+        """Switch shedding on and off with hysteresis between the watermarks"""
+        if not self._shedding and self._queued >= self.high_watermark:
+            self._shedding = True
+            logger.warning(f"Update queue at {self._queued}, shedding heavy operations")
+        elif self._shedding and self._queued <= self.low_watermark:
+            self._shedding = False
+            logger.info(f"Update queue down to {self._queued}, accepting heavy operations again")
+
+    def submit(self, key, job: Callable[[], Awaitable[Any]], heavy: bool = False) -> bool:
+        """Queue a coroutine factory on the lane for ``key``.
+
+        Returns False if the job was refused by admission control.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self._update_shedding()
+        if self._queued >= self.max_queued:
+            self.dropped += 1
+            return False
+        if heavy and self._shedding:
+            self.shed += 1
+            return False
+
+        lane = self._lanes.get(key)
+        self._queued += 1
+        if lane is None:
+            lane = deque([job])
+            self._lanes[key] = lane
+            task = asyncio.get_running_loop().create_task(self._drain_lane(key, lane))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            lane.append(job)
+        return True
+
+    async def _drain_lane(self, key, lane):
+        """Run the jobs of one lane sequentially until it is empty"""
+        try:
+            while lane:
+                job = lane.popleft()
+                await self._semaphore.acquire()
+                held = [True]
+                token = _held_slot.set(held)
+                self._queued -= 1
+                self._update_shedding()
+                self._in_flight += 1
+                try:
+                    await job()
+                    self.processed += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Error processing update for {key}: {e}")
+                finally:
+                    self._in_flight -= 1
+                    _held_slot.reset(token)
+                    if held[0]:
+                        self._semaphore.release()
+        finally:
+            if self._lanes.get(key) is lane:
+                del self._lanes[key]
+
+    def release_slot(self):
+        """Give back the slot of the update running in this task, if it holds one.
+
+        The update keeps running and its lane stays blocked until it is
+        done; it just no longer counts against the concurrency limit.
+        """
+        held = _held_slot.get()
+        if held and held[0]:
+            held[0] = False
+            self.released += 1
+            self._semaphore.release()
+
+    def get_stats(self):
+        """Get queue depth and in-flight counts"""
+        return {
+            'queued': self._queued,
+            'in_flight': self._in_flight,
+            'active_lanes': len(self._lanes),
+            'max_concurrency': self.max_concurrency,
+            'max_queued': self.max_queued,
+            'shedding': self._shedding,
+            'processed': self.processed,
+            'failed': self.failed,
+            'shed': self.shed,
+            'dropped': self.dropped,
+            'released': self.released
+        }
+
+# Global update dispatcher instance
+update_dispatcher = UpdateDispatcher()
+
+metrics_registry.gauge('pdfbot_updates_queued', 'Updates waiting for their user lane').set_function(
+    lambda: update_dispatcher.get_stats()['queued'])
+metrics_registry.gauge('pdfbot_updates_in_flight', 'Updates being handled').set_function(
+    lambda: update_dispatcher.get_stats()['in_flight'])
+metrics_registry.counter('pdfbot_updates_processed_total', 'Updates handled').set_function(
+    lambda: update_dispatcher.get_stats()['processed'])
+metrics_registry.counter('pdfbot_updates_shed_total', 'Updates shed or dropped under load').set_function(
+    lambda: update_dispatcher.get_stats()['shed'] + update_dispatcher.get_stats()['dropped'])
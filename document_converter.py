@@ -1,48 +1,58 @@
 import os
-import tempfile
 import logging
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.colors import black
-from reportlab.lib.units import inch
+from pdf_utils import new_pdf_output, discard_pdf_output, describe_pdf_output
+from tracing import tracer
+
+# ReportLab and the format readers are imported inside the converters, so
+# importing this module does not load them until a conversion runs.
 
 logger = logging.getLogger(__name__)
 
-def convert_document_to_pdf(file_path, file_name):
+def convert_document_to_pdf(file_path, file_name, output=None):
     """Convert various document formats to PDF"""
     
     file_extension = os.path.splitext(file_name)[1].lower()
-    
-    if file_extension == '.docx':
-        return convert_docx_to_pdf(file_path)
-    elif file_extension == '.xlsx':
-        return convert_xlsx_to_pdf(file_path)
-    elif file_extension == '.pptx':
-        return convert_pptx_to_pdf(file_path)
-    elif file_extension == '.html':
-        return convert_html_to_pdf(file_path)
-    elif file_extension == '.txt':
-        return convert_txt_to_pdf(file_path)
-    else:
+    converters = {
+        '.docx': convert_docx_to_pdf,
+        '.xlsx': convert_xlsx_to_pdf,
+        '.pptx': convert_pptx_to_pdf,
+        '.html': convert_html_to_pdf,
+        '.txt': convert_txt_to_pdf
+    }
+    if file_extension not in converters:
         raise ValueError(f"Unsupported file format: {file_extension}")
+    
+    with tracer.span(f"document.convert{file_extension}"):
+        return converters[file_extension](file_path, output)
+
+def _read_text(source):
+    """Read UTF-8 text from a path or a binary file-like object"""
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8') as file:
+            return file.read()
+    source.seek(0)
+    return source.read().decode('utf-8')
 
-def convert_docx_to_pdf(docx_path):
+def convert_docx_to_pdf(docx_path, output=None):
     """Convert Word document to PDF"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.colors import black
     
-    # Create temporary file
-    temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    # Create the output file or buffer
+    target = new_pdf_output(output)
     
     try:
         from docx import Document
         
         # Read Word document
-        doc = Document(docx_path)
+        with tracer.span('document.read'):
+            doc = Document(docx_path)
         
         # Create PDF document
         pdf_doc = SimpleDocTemplate(
-            temp_path,
+            target,
             pagesize=A4,
             rightMargin=72,
             leftMargin=72,
@@ -103,33 +113,37 @@ def convert_docx_to_pdf(docx_path):
                 story.append(Spacer(1, 12))
         
         # Build PDF
-        pdf_doc.build(story)
+        with tracer.span('pdf.write'):
+            pdf_doc.build(story)
         
-        logger.info(f"DOCX converted to PDF: {temp_path}")
-        return temp_path
+        logger.info(f"DOCX converted to PDF: {describe_pdf_output(target)}")
+        return target
         
     except Exception as e:
         logger.error(f"Error converting DOCX to PDF: {e}")
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        discard_pdf_output(target)
         raise
 
-def convert_xlsx_to_pdf(xlsx_path):
+def convert_xlsx_to_pdf(xlsx_path, output=None):
     """Convert Excel spreadsheet to PDF"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.colors import black
     
-    # Create temporary file
-    temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    # Create the output file or buffer
+    target = new_pdf_output(output)
     
     try:
         from openpyxl import load_workbook
         
         # Load workbook
-        workbook = load_workbook(xlsx_path)
+        with tracer.span('document.read'):
+            workbook = load_workbook(xlsx_path)
         
         # Create PDF document
         pdf_doc = SimpleDocTemplate(
-            temp_path,
+            target,
             pagesize=A4,
             rightMargin=36,
             leftMargin=36,
@@ -185,33 +199,36 @@ def convert_xlsx_to_pdf(xlsx_path):
                     story.append(Spacer(1, 20))
         
         # Build PDF
-        pdf_doc.build(story)
+        with tracer.span('pdf.write'):
+            pdf_doc.build(story)
         
-        logger.info(f"XLSX converted to PDF: {temp_path}")
-        return temp_path
+        logger.info(f"XLSX converted to PDF: {describe_pdf_output(target)}")
+        return target
         
     except Exception as e:
         logger.error(f"Error converting XLSX to PDF: {e}")
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        discard_pdf_output(target)
         raise
 
-def convert_pptx_to_pdf(pptx_path):
+def convert_pptx_to_pdf(pptx_path, output=None):
     """Convert PowerPoint presentation to PDF"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
     
-    # Create temporary file
-    temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    # Create the output file or buffer
+    target = new_pdf_output(output)
     
     try:
         from pptx import Presentation
         
         # Load presentation
-        presentation = Presentation(pptx_path)
+        with tracer.span('document.read'):
+            presentation = Presentation(pptx_path)
         
         # Create PDF document
         pdf_doc = SimpleDocTemplate(
-            temp_path,
+            target,
             pagesize=A4,
             rightMargin=72,
             leftMargin=72,
@@ -259,37 +276,38 @@ def convert_pptx_to_pdf(pptx_path):
                 story.append(Spacer(1, 20))
         
         # Build PDF
-        pdf_doc.build(story)
+        with tracer.span('pdf.write'):
+            pdf_doc.build(story)
         
-        logger.info(f"PPTX converted to PDF: {temp_path}")
-        return temp_path
+        logger.info(f"PPTX converted to PDF: {describe_pdf_output(target)}")
+        return target
         
     except Exception as e:
         logger.error(f"Error converting PPTX to PDF: {e}")
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        discard_pdf_output(target)
         raise
 
-def convert_html_to_pdf(html_path):
+def convert_html_to_pdf(html_path, output=None):
     """Convert HTML file to PDF"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
     
-    # Create temporary file
-    temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    # Create the output file or buffer
+    target = new_pdf_output(output)
     
     try:
         from bs4 import BeautifulSoup
         
         # Read HTML file
-        with open(html_path, 'r', encoding='utf-8') as file:
-            html_content = file.read()
+        html_content = _read_text(html_path)
         
         # Parse HTML
         soup = BeautifulSoup(html_content, 'html.parser')
         
         # Create PDF document
         pdf_doc = SimpleDocTemplate(
-            temp_path,
+            target,
             pagesize=A4,
             rightMargin=72,
             leftMargin=72,
@@ -329,32 +347,33 @@ def convert_html_to_pdf(html_path):
                     story.append(Spacer(1, 6))
         
         # Build PDF
-        pdf_doc.build(story)
+        with tracer.span('pdf.write'):
+            pdf_doc.build(story)
         
-        logger.info(f"HTML converted to PDF: {temp_path}")
-        return temp_path
+        logger.info(f"HTML converted to PDF: {describe_pdf_output(target)}")
+        return target
         
     except Exception as e:
         logger.error(f"Error converting HTML to PDF: {e}")
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        discard_pdf_output(target)
         raise
 
-def convert_txt_to_pdf(txt_path):
+def convert_txt_to_pdf(txt_path, output=None):
     """Convert text file to PDF"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
     
-    # Create temporary file
-    temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    # Create the output file or buffer
+    target = new_pdf_output(output)
     
     try:
         # Read text file
-        with open(txt_path, 'r', encoding='utf-8') as file:
-            text_content = file.read()
+        text_content = _read_text(txt_path)
         
         # Create PDF document
         pdf_doc = SimpleDocTemplate(
-            temp_path,
+            target,
             pagesize=A4,
             rightMargin=72,
             leftMargin=72,
@@ -378,13 +397,13 @@ def convert_txt_to_pdf(txt_path):
                 story.append(Spacer(1, 6))
         
         # Build PDF
-        pdf_doc.build(story)
+        with tracer.span('pdf.write'):
+            pdf_doc.build(story)
         
-        logger.info(f"TXT converted to PDF: {temp_path}")
-        return temp_path
+        logger.info(f"TXT converted to PDF: {describe_pdf_output(target)}")
+        return target
         
     except Exception as e:
         logger.error(f"Error converting TXT to PDF: {e}")
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        discard_pdf_output(target)
         raise
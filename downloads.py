@@ -0,0 +1,133 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, List
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from metrics import metrics_registry
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Jobs whose inputs total at most this many bytes are converted in memory
+IN_MEMORY_MAX_BYTES = int(os.environ.get('IN_MEMORY_MAX_BYTES', 8 * 1024 * 1024))
+
+def fits_in_memory(*sizes) -> bool:
+    """Check whether inputs of these sizes are small enough to convert in memory"""
+    return all(size is not None for size in sizes) and sum(sizes) <= IN_MEMORY_MAX_BYTES
+
+class FileDownloader:
+    """Download Telegram files concurrently with retries.
+
+    A semaphore shared by all jobs bounds how many downloads run at once.
+    Each file is retried with exponential backoff on network errors and
+    flood-control waits; other errors (e.g. a file that no longer exists)
+    fail at once.
+    """
+
+    def __init__(self, concurrency: int = None, retries: int = None, backoff: float = None):
+        self.concurrency = concurrency or int(os.environ.get('DOWNLOAD_CONCURRENCY', 4))
+        self.retries = retries or int(os.environ.get('DOWNLOAD_RETRIES', 3))
+        self.backoff = backoff or float(os.environ.get('DOWNLOAD_BACKOFF', 0.5))
+        self._semaphore = None
+        self.downloaded = 0
+        self.retried = 0
+        self.failed = 0
+        self.bytes = 0
+
+    async def _download_one(self, bot, file_id: str, target, timing: dict):
+        """Download one file, retrying transient errors"""
+        for attempt in range(1, self.retries + 1):
+            wait_started = time.perf_counter()
+            async with self._semaphore:
+                timing['queued'] += time.perf_counter() - wait_started
+                try:
+                    started = time.perf_counter()
+                    file = await bot.get_file(file_id)
+                    resolved = time.perf_counter()
+                    if isinstance(target, str):
+                        await file.download_to_drive(target)
+                        size = os.path.getsize(target)
+                    else:
+                        target.seek(0)
+                        target.truncate()
+                        await file.download_to_memory(target)
+                        size = target.getbuffer().nbytes
+                    finished = time.perf_counter()
+                except BadRequest:
+                    self.failed += 1
+                    raise
+                except RetryAfter as e:
+                    error = e
+                    delay = e.retry_after
+                except NetworkError as e:
+                    error = e
+                    delay = self.backoff * 2 ** (attempt - 1)
+                else:
+                    timing['resolve'] += resolved - started
+                    timing['transfer'] += finished - resolved
+                    timing['bytes'] += size
+                    self.downloaded += 1
+                    return
+
+            if attempt == self.retries:
+                self.failed += 1
+                raise error
+            self.retried += 1
+            timing['retries'] += 1
+            logger.warning(f"Download of {file_id} failed ({error}), retry {attempt} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def download_all(self, bot, file_ids: List[str], targets: List[Any]) -> dict:
+        """Download ``file_ids[i]`` to ``targets[i]`` and return a timing breakdown.
+
+        A target is a file path or a writable buffer such as io.BytesIO.
+        Files land in their given targets, so callers keep their order no
+        matter which download finishes first. If any file fails, the rest
+        are cancelled and the error is raised.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        timing = {'files': len(file_ids), 'queued': 0.0, 'resolve': 0.0,
+                  'transfer': 0.0, 'retries': 0, 'bytes': 0}
+        started = time.perf_counter()
+        with tracer.span('telegram.download', files=len(file_ids)) as span:
+            tasks = [asyncio.create_task(self._download_one(bot, file_id, target, timing))
+                     for file_id, target in zip(file_ids, targets)]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            span.update(bytes=timing['bytes'], retries=timing['retries'],
+                        resolve=round(timing['resolve'], 6), transfer=round(timing['transfer'], 6))
+        timing['wall'] = time.perf_counter() - started
+
+        self.bytes += timing['bytes']
+        logger.info(
+            f"Downloaded {timing['files']} files ({timing['bytes'] / 1024:.0f} KB) in {timing['wall']:.2f}s: "
+            f"resolve {timing['resolve']:.2f}s, transfer {timing['transfer']:.2f}s, "
+            f"queued {timing['queued']:.2f}s, {timing['retries']} retries"
+        )
+        return timing
+
+    def get_stats(self):
+        """Get download counters"""
+        return {
+            'concurrency': self.concurrency,
+            'downloaded': self.downloaded,
+            'retried': self.retried,
+            'failed': self.failed,
+            'bytes': self.bytes
+        }
+
+# Global file downloader instance
+file_downloader = FileDownloader()
+
+metrics_registry.counter('pdfbot_download_bytes_total', 'Bytes downloaded from Telegram').set_function(
+    lambda: file_downloader.bytes)
+metrics_registry.counter('pdfbot_download_retries_total', 'Download retries').set_function(
+    lambda: file_downloader.retried)
@@ -0,0 +1,194 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple
+from metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Relative cost of each operation, in scheduler units
+OPERATION_COSTS = {
+    'txt2pdf': 1,
+    'splitpdf': 1,
+    'password': 1,
+    'img2pdf': 2,
+    'doc2pdf': 3,
+    'mergepdf': 3,
+    'ocr2pdf': 6,
+    'ai': 6
+}
+DEFAULT_OPERATION_COST = 2
+
+class TokenBucket:
+    """Allow bursts up to ``capacity`` units, refilled at ``rate`` units per second"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        """Add the tokens earned since the last update"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount: float) -> float:
+        """Take ``amount`` tokens; return 0, or the seconds to wait if there are too few"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        """Check whether the bucket has refilled completely"""
+        self._refill()
+        return self.tokens >= self.capacity
+
+class FairScheduler:
+    """Rate-limit heavy jobs per user and share conversion slots fairly.
+
+    Admission uses a token bucket per user, charged with the cost of the
+    operation, so one user cannot keep starting OCR or AI jobs back to back.
+    Admitted jobs then wait for one of a fixed number of slots. Waiting jobs
+    are ordered by weighted fair queueing: each job gets a virtual finish
+    tag of ``max(virtual clock, user's last tag) + cost``, and the smallest
+    tag runs next, so users who just ran expensive jobs queue behind users
+    who did not. All methods must be called from the event loop thread.
+    """
+
+    def __init__(self, slots: int = None, burst: float = None, refill_per_minute: float = None):
+        self.slots = slots or int(os.environ.get('HEAVY_JOB_SLOTS', os.cpu_count() or 2))
+        self.burst = burst or float(os.environ.get('USER_RATE_BURST', 12))
+        self.refill_per_minute = refill_per_minute or float(os.environ.get('USER_RATE_PER_MINUTE', 12))
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._finish_tags: Dict[int, float] = {}
+        self._virtual_time = 0.0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._running_cost = 0
+        # Seconds of wall time per cost unit, smoothed over finished jobs
+        self._seconds_per_unit = 2.0
+        self._prune_at = 1000
+        self.admitted = 0
+        self.rejected = 0
+        self.delayed = 0
+
+    def admit(self, user_id: int, operation: str) -> Tuple[bool, float]:
+        """Charge a user's bucket for a job.
+
+        Returns ``(True, eta)`` with the estimated seconds until the job
+        starts, or ``(False, retry_after)`` if the user is over their limit.
+        """
+        cost = OPERATION_COSTS.get(operation, DEFAULT_OPERATION_COST)
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self._prune_at:
+                self._forget_idle_users()
+                self._prune_at = max(1000, 2 * len(self._buckets))
+            bucket = TokenBucket(self.burst, self.refill_per_minute / 60)
+            self._buckets[user_id] = bucket
+
+        retry_after = bucket.consume(cost)
+        if retry_after:
+            self.rejected += 1
+            logger.info(f"Rate limited {operation} for user {user_id}, retry in {retry_after:.0f}s")
+            return False, retry_after
+
+        self.admitted += 1
+        return True, self.estimate_wait()
+
+    def estimate_wait(self) -> float:
+        """Estimate how long a job submitted now waits for a slot"""
+        if self._running < self.slots:
+            return 0.0
+        waiting_cost = sum(entry[3] for entry in self._waiting)
+        # Running jobs are on average half done
+        ahead = waiting_cost + self._running_cost / 2
+        return ahead * self._seconds_per_unit / self.slots
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, operation: str):
+        """Hold a job slot for the duration of the block"""
+        cost = OPERATION_COSTS.get(operation, DEFAULT_OPERATION_COST)
+        start_tag = max(self._virtual_time, self._finish_tags.get(user_id, 0.0))
+        finish_tag = start_tag + cost
+        self._finish_tags[user_id] = finish_tag
+
+        if self._running < self.slots and not self._waiting:
+            self._running += 1
+        else:
+            self.delayed += 1
+            future = asyncio.get_running_loop().create_future()
+            entry = [finish_tag, next(self._sequence), future, cost]
+            heapq.heappush(self._waiting, entry)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just as we were cancelled
+                    self._release()
+                else:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                raise
+
+        self._virtual_time = max(self._virtual_time, start_tag)
+        self._running_cost += cost
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._running_cost -= cost
+            elapsed = time.monotonic() - started
+            self._seconds_per_unit = 0.8 * self._seconds_per_unit + 0.2 * (elapsed / cost)
+            self._release()
+
+    def _release(self):
+        """Hand a freed slot to the waiting job with the smallest finish tag"""
+        while self._waiting:
+            _, _, future, _ = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    def _forget_idle_users(self) -> int:
+        """Drop state for users whose bucket has refilled and who have nothing queued"""
+        idle = [user_id for user_id in set(self._buckets) | set(self._finish_tags)
+                if (user_id not in self._buckets or self._buckets[user_id].is_full())
+                and self._finish_tags.get(user_id, 0.0) <= self._virtual_time]
+        for user_id in idle:
+            self._buckets.pop(user_id, None)
+            self._finish_tags.pop(user_id, None)
+        return len(idle)
+
+    def get_stats(self):
+        """Get slot usage and admission counts"""
+        return {
+            'slots': self.slots,
+            'running': self._running,
+            'waiting': len(self._waiting),
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'delayed': self.delayed,
+            'seconds_per_unit': self._seconds_per_unit
+        }
+
+# Global fair scheduler instance
+fair_scheduler = FairScheduler()
+
+metrics_registry.gauge('pdfbot_job_slots_busy', 'Jobs holding a conversion slot').set_function(
+    lambda: fair_scheduler.get_stats()['running'])
+metrics_registry.gauge('pdfbot_jobs_waiting', 'Jobs waiting for a conversion slot').set_function(
+    lambda: fair_scheduler.get_stats()['waiting'])
+metrics_registry.counter('pdfbot_jobs_rate_limited_total', 'Jobs rejected by the per-user rate limit').set_function(
+    lambda: fair_scheduler.get_stats()['rejected'])
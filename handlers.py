@@ -1,16 +1,31 @@
+import io
 import os
+import time
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from user_states import UserStateManager
-from pdf_utils import create_text_pdf, create_image_pdf, merge_pdfs, split_pdf, create_ocr_pdf
+from pdf_utils import (
+    create_text_pdf, create_image_pdf, merge_pdfs, split_pdf, create_ocr_pdf,
+    add_password_protection, get_pdf_page_count, prepare_image, PAGE_IMAGE_MAX_SIDE,
+    open_pdf_output
+)
 from document_converter import convert_document_to_pdf
 from cleanup_system import cleanup_system
+from conversion_executor import conversion_executor
+from downloads import file_downloader, fits_in_memory
+from prefetch import upload_prefetcher
+from result_cache import result_cache
+from delivery import document_delivery
+from jobs import run_job, register_job_runner, admit_job, OPERATION_NAMES
+from usage_stats import usage_stats
+from broadcast import broadcaster, MAX_BROADCAST_LENGTH
+from log_buffer import log_buffer
 from ai_enhancement import analyze_document_file, format_enhancement_suggestions
 from master_control import (
     master_control, handle_master_login, handle_master_password, 
     show_master_panel, handle_master_stats, handle_master_cleanup,
-    handle_master_broadcast_request
+    handle_master_broadcast_request, handle_master_broadcast_status, handle_master_broadcast_cancel
 )
 import tempfile
 
@@ -19,6 +34,13 @@ logger = logging.getLogger(__name__)
 # Initialize state manager
 state_manager = UserStateManager()
 
+async def resend_delivered(bot, job, chat_id, cache_key, filename, **kwargs) -> bool:
+    """Resend a result delivered before by its file_id, before the job takes a slot or downloads anything"""
+    if not document_delivery.delivered(cache_key, filename):
+        return False
+    job.set_stage('uploading')
+    return await document_delivery.resend(bot, chat_id, cache_key, filename, **kwargs) is not None
+
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
     user = update.effective_user
@@ -140,6 +162,7 @@ async def img2pdf_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     state_manager.set_state(user_id, 'waiting_for_images')
     state_manager.clear_user_data(user_id, 'images')
+    upload_prefetcher.release(user_id)
     
     keyboard = [[InlineKeyboardButton("✅ Done", callback_data="img_done")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -177,6 +200,7 @@ async def mergepdf_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     state_manager.set_state(user_id, 'waiting_for_merge_pdfs')
     state_manager.clear_user_data(user_id, 'pdfs')
+    upload_prefetcher.release(user_id)
     
     keyboard = [[InlineKeyboardButton("✅ Done", callback_data="merge_done")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -376,6 +400,7 @@ async def img2pdf_callback(query, context):
     user_id = query.from_user.id
     state_manager.set_state(user_id, 'waiting_for_images')
     state_manager.clear_user_data(user_id, 'images')
+    upload_prefetcher.release(user_id)
     
     await query.edit_message_text(
         "🖼️ **Images to PDF Converter**\n\n"
@@ -409,6 +434,7 @@ async def mergepdf_callback(query, context):
     user_id = query.from_user.id
     state_manager.set_state(user_id, 'waiting_for_merge_pdfs')
     state_manager.clear_user_data(user_id, 'pdfs')
+    upload_prefetcher.release(user_id)
     
     keyboard = [[InlineKeyboardButton("✅ Done", callback_data="merge_done")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -445,8 +471,8 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         state_manager.clear_user_state(user_id)
         return
     elif current_state == 'waiting_for_broadcast_message':
+        # Clears the state itself, except when the master has to resend
         await handle_broadcast_message_input(update, context)
-        state_manager.clear_user_state(user_id)
         return
     
     # Handle regular user states
@@ -566,41 +592,57 @@ async def handle_size_choice(query, context, data):
     font = state_manager.get_user_data(user_id, 'font')
     color = state_manager.get_user_data(user_id, 'color')
     
+    if not await admit_job(query.message, user_id, 'txt2pdf'):
+        return
+    
     await query.edit_message_text(
         "🔄 **Generating your PDF...**\n"
         "Please wait a moment...",
         parse_mode='Markdown'
     )
     
+    await run_txt2pdf_job(context.bot, query.message.chat_id, user_id, {
+        'text': text,
+        'font': font,
+        'color': color,
+        'size': size
+    })
+
+@register_job_runner('txt2pdf')
+async def run_txt2pdf_job(bot, chat_id, user_id, inputs, attempt=1):
+    """Create a styled text PDF and send it"""
+    font, color, size = inputs['font'], inputs['color'], inputs['size']
+    
     try:
-        # Create PDF
-        pdf_path = create_text_pdf(text, font, color, size)
-        
-        # Send PDF
-        with open(pdf_path, 'rb') as pdf_file:
-            await context.bot.send_document(
-                chat_id=query.message.chat_id,
-                document=pdf_file,
-                filename="converted_text.pdf",
-                caption="📂 **Your PDF is ready!**\n\n"
-                       f"📝 Font: {font.title()}\n"
-                       f"🎨 Color: {color.title()}\n"
-                       f"📄 Size: {size.upper()}",
-                parse_mode='Markdown'
+        async with run_job(user_id, chat_id, 'txt2pdf', inputs, attempt) as job:
+            # Create PDF
+            job.set_stage('converting')
+            # Message text is small enough to always convert in memory
+            pdf_output = await conversion_executor.run(
+                create_text_pdf, inputs['text'], font, color, size, output=io.BytesIO()
             )
-        
-        # Clean up files immediately after sending
-        cleanup_system.cleanup_temp_files()
-        if os.path.exists(pdf_path):
-            os.unlink(pdf_path)
+            
+            # Send PDF
+            job.set_stage('uploading')
+            with open_pdf_output(pdf_output) as pdf_file:
+                await bot.send_document(
+                    chat_id=chat_id,
+                    document=pdf_file,
+                    filename="converted_text.pdf",
+                    caption="📂 **Your PDF is ready!**\n\n"
+                           f"📝 Font: {font.title()}\n"
+                           f"🎨 Color: {color.title()}\n"
+                           f"📄 Size: {size.upper()}",
+                    parse_mode='Markdown'
+                )
         state_manager.clear_user_state(user_id)
         
         # Show menu
         keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="start")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
+        await bot.send_message(
+            chat_id=chat_id,
             text="✅ **PDF created successfully!**\n\n"
                  "Need to create another PDF?",
             reply_markup=reply_markup,
@@ -609,8 +651,8 @@ async def handle_size_choice(query, context, data):
         
     except Exception as e:
         logger.error(f"Error creating text PDF: {e}")
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
+        await bot.send_message(
+            chat_id=chat_id,
             text="❌ **Error creating PDF**\n\n"
                  "Sorry, there was an error processing your text. Please try again.",
             parse_mode='Markdown'
@@ -625,13 +667,16 @@ async def handle_image_upload(update: Update, context: ContextTypes.DEFAULT_TYPE
         # Get the largest photo
         photo = update.message.photo[-1]
         
-        # Download and store image info
-        file = await context.bot.get_file(photo.file_id)
+        # Start downloading and preparing the image while more arrive
+        upload_prefetcher.prefetch(
+            context.bot, user_id, photo.file_id, '.jpg', prepare_image, PAGE_IMAGE_MAX_SIDE
+        )
         
         images = state_manager.get_user_data(user_id, 'images') or []
         images.append({
             'file_id': photo.file_id,
-            'file_unique_id': photo.file_unique_id
+            'file_unique_id': photo.file_unique_id,
+            'file_size': photo.file_size
         })
         state_manager.set_user_data(user_id, 'images', images)
         
@@ -682,50 +727,69 @@ async def handle_orientation_choice(query, context, data):
     
     images = state_manager.get_user_data(user_id, 'images') or []
     
+    if not await admit_job(query.message, user_id, 'img2pdf'):
+        return
+    
     await query.edit_message_text(
         "🔄 **Creating PDF from images...**\n"
         "Please wait while I process and optimize your images...",
         parse_mode='Markdown'
     )
     
+    await run_img2pdf_job(context.bot, query.message.chat_id, user_id, {
+        'images': images,
+        'orientation': orientation
+    })
+
+@register_job_runner('img2pdf')
+async def run_img2pdf_job(bot, chat_id, user_id, inputs, attempt=1):
+    """Download images, build the PDF and send it"""
+    images = inputs['images']
+    orientation = inputs['orientation']
+    
     try:
-        # Download images and create PDF
-        image_paths = []
-        for img_info in images:
-            file = await context.bot.get_file(img_info['file_id'])
-            file_path = f"/tmp/img_{img_info['file_unique_id']}.jpg"
-            await file.download_to_drive(file_path)
-            image_paths.append(file_path)
-        
-        # Create PDF
-        pdf_path = create_image_pdf(image_paths, orientation)
-        
-        # Send PDF
-        with open(pdf_path, 'rb') as pdf_file:
-            await context.bot.send_document(
-                chat_id=query.message.chat_id,
-                document=pdf_file,
-                filename="images_to_pdf.pdf",
-                caption="📂 **Your PDF is ready!**\n\n"
+        async with run_job(user_id, chat_id, 'img2pdf', inputs, attempt, defer_slot=True) as job:
+            # Reuse the PDF of an identical earlier job
+            cache_key = result_cache.make_key(
+                'img2pdf', [img_info.get('file_unique_id') for img_info in images], orientation=orientation
+            )
+            filename = "images_to_pdf.pdf"
+            caption = ("📂 **Your PDF is ready!**\n\n"
                        f"📸 Images: {len(images)}\n"
                        f"📄 Orientation: {orientation.title()}\n"
-                       "🔧 Optimized for quality and size",
-                parse_mode='Markdown'
-            )
-        
-        # Clean up
-        for img_path in image_paths:
-            if os.path.exists(img_path):
-                os.unlink(img_path)
-        os.unlink(pdf_path)
+                       "🔧 Optimized for quality and size")
+            if not await resend_delivered(bot, job, chat_id, cache_key, filename, caption=caption, parse_mode='Markdown'):
+                await job.acquire()
+                image_paths = [job.workspace.file(f"img_{i}.jpg") for i in range(len(images))]
+                pdf_output = await result_cache.get(cache_key)
+                if pdf_output is None:
+                    # Download images and create PDF
+                    job.set_stage('downloading', files=image_paths)
+                    image_paths = await upload_prefetcher.collect(
+                        bot, user_id, [img_info['file_id'] for img_info in images], image_paths
+                    )
+                    
+                    # Create PDF, in memory unless the images are large
+                    job.set_stage('converting')
+                    output = io.BytesIO() if fits_in_memory(*map(os.path.getsize, image_paths)) else job.workspace.file('result.pdf')
+                    pdf_output = await conversion_executor.run(create_image_pdf, image_paths, orientation, output=output)
+                    await result_cache.put(cache_key, pdf_output)
+                
+                # Send PDF
+                job.set_stage('uploading', files=[pdf_output])
+                await document_delivery.send_document(
+                    bot, chat_id, cache_key, pdf_output,
+                    filename=filename, caption=caption, parse_mode='Markdown'
+                )
         state_manager.clear_user_state(user_id)
+        upload_prefetcher.release(user_id)
         
         # Show menu
         keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="start")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
+        await bot.send_message(
+            chat_id=chat_id,
             text="✅ **PDF created successfully!**\n\n"
                  "Need to create another PDF?",
             reply_markup=reply_markup,
@@ -734,13 +798,14 @@ async def handle_orientation_choice(query, context, data):
         
     except Exception as e:
         logger.error(f"Error creating image PDF: {e}")
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
+        await bot.send_message(
+            chat_id=chat_id,
             text="❌ **Error creating PDF**\n\n"
                  "Sorry, there was an error processing your images. Please try again.",
             parse_mode='Markdown'
         )
         state_manager.clear_user_state(user_id)
+        upload_prefetcher.release(user_id)
 
 async def handle_document_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle document upload for PDF conversion"""
@@ -765,58 +830,88 @@ async def handle_document_upload(update: Update, context: ContextTypes.DEFAULT_T
             )
             return
         
+        if not await admit_job(update.message, user_id, 'doc2pdf'):
+            return
+        
         await update.message.reply_text(
             "✅ **Document received!**\n\n"
             "🔄 Converting to PDF...",
             parse_mode='Markdown'
         )
         
-        try:
-            # Download file
-            file = await context.bot.get_file(document.file_id)
-            file_path = f"/tmp/{document.file_name}"
-            await file.download_to_drive(file_path)
-            
-            # Convert to PDF
-            pdf_path = convert_document_to_pdf(file_path, file_name)
-            
-            # Send PDF
-            with open(pdf_path, 'rb') as pdf_file:
-                await update.message.reply_document(
-                    document=pdf_file,
-                    filename=f"{os.path.splitext(document.file_name)[0]}.pdf",
-                    caption="📂 **Your PDF is ready!**\n\n"
-                           f"📄 Original: {document.file_name}\n"
-                           "🔄 Successfully converted to PDF",
-                    parse_mode='Markdown'
-                )
-            
-            # Clean up
-            if os.path.exists(file_path):
-                os.unlink(file_path)
-            os.unlink(pdf_path)
-            state_manager.clear_user_state(user_id)
-            
-            # Show menu
-            keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="start")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.message.reply_text(
-                "✅ **Document converted successfully!**\n\n"
-                "Need to convert another document?",
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
+        await run_doc2pdf_job(context.bot, update.effective_chat.id, user_id, {
+            'file_id': document.file_id,
+            'file_unique_id': document.file_unique_id,
+            'file_name': document.file_name,
+            'file_size': document.file_size
+        })
+
+@register_job_runner('doc2pdf')
+async def run_doc2pdf_job(bot, chat_id, user_id, inputs, attempt=1):
+    """Download a document, convert it to PDF and send it"""
+    original_name = inputs['file_name']
+    
+    try:
+        async with run_job(user_id, chat_id, 'doc2pdf', inputs, attempt, defer_slot=True) as job:
+            # Small documents never touch the disk
+            in_memory = fits_in_memory(inputs.get('file_size'))
+            extension = os.path.splitext(original_name.lower())[1]
             
-        except Exception as e:
-            logger.error(f"Error converting document: {e}")
-            await update.message.reply_text(
-                "❌ **Error converting document**\n\n"
-                "Sorry, there was an error processing your document. "
-                "Please make sure the file is not corrupted and try again.",
-                parse_mode='Markdown'
+            # Reuse the PDF of an identical earlier conversion
+            cache_key = result_cache.make_key(
+                'doc2pdf', [inputs.get('file_unique_id')], extension=extension
             )
-            state_manager.clear_user_state(user_id)
+            filename = f"{os.path.splitext(original_name)[0]}.pdf"
+            caption = ("📂 **Your PDF is ready!**\n\n"
+                       f"📄 Original: {original_name}\n"
+                       "🔄 Successfully converted to PDF")
+            if not await resend_delivered(bot, job, chat_id, cache_key, filename, caption=caption, parse_mode='Markdown'):
+                await job.acquire()
+                file_path = io.BytesIO() if in_memory else job.workspace.file(f"input{extension}")
+                pdf_output = await result_cache.get(cache_key)
+                if pdf_output is None:
+                    # Download file
+                    job.set_stage('downloading', files=[file_path])
+                    await file_downloader.download_all(bot, [inputs['file_id']], [file_path])
+                    
+                    # Convert to PDF
+                    job.set_stage('converting')
+                    pdf_output = await conversion_executor.run(
+                        convert_document_to_pdf, file_path, original_name.lower(),
+                        output=io.BytesIO() if in_memory else job.workspace.file('result.pdf')
+                    )
+                    await result_cache.put(cache_key, pdf_output)
+                
+                # Send PDF
+                job.set_stage('uploading', files=[pdf_output])
+                await document_delivery.send_document(
+                    bot, chat_id, cache_key, pdf_output,
+                    filename=filename, caption=caption, parse_mode='Markdown'
+                )
+        state_manager.clear_user_state(user_id)
+        
+        # Show menu
+        keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="start")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await bot.send_message(
+            chat_id=chat_id,
+            text="✅ **Document converted successfully!**\n\n"
+                 "Need to convert another document?",
+            reply_markup=reply_markup,
+            parse_mode='Markdown'
+        )
+        
+    except Exception as e:
+        logger.error(f"Error converting document: {e}")
+        await bot.send_message(
+            chat_id=chat_id,
+            text="❌ **Error converting document**\n\n"
+                 "Sorry, there was an error processing your document. "
+                 "Please make sure the file is not corrupted and try again.",
+            parse_mode='Markdown'
+        )
+        state_manager.clear_user_state(user_id)
 
 async def handle_pdf_upload_for_merge(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle PDF upload for merging"""
@@ -831,10 +926,15 @@ async def handle_pdf_upload_for_merge(update: Update, context: ContextTypes.DEFA
             )
             return
         
+        # Start downloading the PDF while more arrive; merging parses it anyway
+        upload_prefetcher.prefetch(context.bot, user_id, document.file_id, '.pdf')
+        
         pdfs = state_manager.get_user_data(user_id, 'pdfs') or []
         pdfs.append({
             'file_id': document.file_id,
-            'file_name': document.file_name
+            'file_unique_id': document.file_unique_id,
+            'file_name': document.file_name,
+            'file_size': document.file_size
         })
         state_manager.set_user_data(user_id, 'pdfs', pdfs)
         
@@ -857,49 +957,62 @@ async def process_merge_pdfs(query, context):
         )
         return
     
+    if not await admit_job(query.message, user_id, 'mergepdf'):
+        return
+    
     await query.edit_message_text(
         f"🔄 **Merging {len(pdfs)} PDFs...**\n"
         "Please wait...",
         parse_mode='Markdown'
     )
     
+    await run_mergepdf_job(context.bot, query.message.chat_id, user_id, {'pdfs': pdfs})
+
+@register_job_runner('mergepdf')
+async def run_mergepdf_job(bot, chat_id, user_id, inputs, attempt=1):
+    """Download PDFs, merge them and send the result"""
+    pdfs = inputs['pdfs']
+    
     try:
-        # Download PDFs
-        pdf_paths = []
-        for pdf_info in pdfs:
-            file = await context.bot.get_file(pdf_info['file_id'])
-            file_path = f"/tmp/merge_{pdf_info['file_id']}.pdf"
-            await file.download_to_drive(file_path)
-            pdf_paths.append(file_path)
-        
-        # Merge PDFs
-        merged_pdf_path = merge_pdfs(pdf_paths)
-        
-        # Send merged PDF
-        with open(merged_pdf_path, 'rb') as pdf_file:
-            await context.bot.send_document(
-                chat_id=query.message.chat_id,
-                document=pdf_file,
-                filename="merged_document.pdf",
-                caption="📂 **Merged PDF is ready!**\n\n"
+        async with run_job(user_id, chat_id, 'mergepdf', inputs, attempt, defer_slot=True) as job:
+            # Reuse the result of an identical earlier merge
+            cache_key = result_cache.make_key('mergepdf', [pdf_info.get('file_unique_id') for pdf_info in pdfs])
+            filename = "merged_document.pdf"
+            caption = ("📂 **Merged PDF is ready!**\n\n"
                        f"📄 Combined {len(pdfs)} PDF files\n"
-                       "✅ Successfully merged",
-                parse_mode='Markdown'
-            )
-        
-        # Clean up
-        for pdf_path in pdf_paths:
-            if os.path.exists(pdf_path):
-                os.unlink(pdf_path)
-        os.unlink(merged_pdf_path)
+                       "✅ Successfully merged")
+            if not await resend_delivered(bot, job, chat_id, cache_key, filename, caption=caption, parse_mode='Markdown'):
+                await job.acquire()
+                pdf_paths = [job.workspace.file(f"merge_{i}.pdf") for i in range(len(pdfs))]
+                merged_pdf = await result_cache.get(cache_key)
+                if merged_pdf is None:
+                    # Download PDFs
+                    job.set_stage('downloading', files=pdf_paths)
+                    pdf_paths = await upload_prefetcher.collect(
+                        bot, user_id, [pdf_info['file_id'] for pdf_info in pdfs], pdf_paths
+                    )
+                    
+                    # Merge PDFs, in memory unless the inputs are large
+                    job.set_stage('converting')
+                    output = io.BytesIO() if fits_in_memory(*map(os.path.getsize, pdf_paths)) else job.workspace.file('result.pdf')
+                    merged_pdf = await conversion_executor.run(merge_pdfs, pdf_paths, output=output)
+                    await result_cache.put(cache_key, merged_pdf)
+                
+                # Send merged PDF
+                job.set_stage('uploading', files=[merged_pdf])
+                await document_delivery.send_document(
+                    bot, chat_id, cache_key, merged_pdf,
+                    filename=filename, caption=caption, parse_mode='Markdown'
+                )
         state_manager.clear_user_state(user_id)
+        upload_prefetcher.release(user_id)
         
         # Show menu
         keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="start")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
+        await bot.send_message(
+            chat_id=chat_id,
             text="✅ **PDFs merged successfully!**\n\n"
                  "Need to process more PDFs?",
             reply_markup=reply_markup,
@@ -908,13 +1021,14 @@ async def process_merge_pdfs(query, context):
         
     except Exception as e:
         logger.error(f"Error merging PDFs: {e}")
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
+        await bot.send_message(
+            chat_id=chat_id,
             text="❌ **Error merging PDFs**\n\n"
                  "Sorry, there was an error merging your PDFs. Please try again.",
             parse_mode='Markdown'
         )
         state_manager.clear_user_state(user_id)
+        upload_prefetcher.release(user_id)
 
 async def handle_pdf_upload_for_split(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle PDF upload for splitting"""
@@ -942,12 +1056,13 @@ async def handle_pdf_upload_for_split(update: Update, context: ContextTypes.DEFA
             await file.download_to_drive(file_path)
             
             # Get page count
-            from PyPDF2 import PdfReader
-            reader = PdfReader(file_path)
-            page_count = len(reader.pages)
+            page_count = await conversion_executor.run(get_pdf_page_count, file_path)
             
             # Store PDF info
             state_manager.set_user_data(user_id, 'split_pdf_path', file_path)
+            state_manager.set_user_data(user_id, 'split_pdf_file_id', document.file_id)
+            state_manager.set_user_data(user_id, 'split_pdf_unique_id', document.file_unique_id)
+            state_manager.set_user_data(user_id, 'split_pdf_file_size', document.file_size)
             state_manager.set_user_data(user_id, 'split_pdf_pages', page_count)
             state_manager.set_state(user_id, 'waiting_for_split_pages')
             
@@ -1023,64 +1138,99 @@ async def handle_split_pages_input(update: Update, context: ContextTypes.DEFAULT
         state_manager.clear_user_state(user_id)
         return
     
-    try:
-        # Parse page numbers
-        page_numbers = parse_page_numbers(pages_input, total_pages)
-        
-        if not page_numbers:
-            await update.message.reply_text(
-                "❌ **Invalid page numbers!**\n\n"
-                f"Please enter valid page numbers (1-{total_pages}).\n\n"
-                "**Examples:**\n"
-                "• `1-3` (pages 1 to 3)\n"
-                "• `1,3,5` (pages 1, 3, and 5)\n"
-                "• `2-4,6,8-10` (pages 2-4, 6, and 8-10)",
-                parse_mode='Markdown'
-            )
-            return
-        
+    # Parse page numbers
+    page_numbers = parse_page_numbers(pages_input, total_pages)
+    
+    if not page_numbers:
         await update.message.reply_text(
-            f"🔄 **Extracting pages {pages_input}...**\n"
-            "Please wait...",
+            "❌ **Invalid page numbers!**\n\n"
+            f"Please enter valid page numbers (1-{total_pages}).\n\n"
+            "**Examples:**\n"
+            "• `1-3` (pages 1 to 3)\n"
+            "• `1,3,5` (pages 1, 3, and 5)\n"
+            "• `2-4,6,8-10` (pages 2-4, 6, and 8-10)",
             parse_mode='Markdown'
         )
-        
-        # Split PDF
-        output_pdf_path = split_pdf(pdf_path, page_numbers)
-        
-        # Send split PDF
-        with open(output_pdf_path, 'rb') as pdf_file:
-            await update.message.reply_document(
-                document=pdf_file,
-                filename=f"extracted_pages_{pages_input.replace(',', '_').replace('-', '_')}.pdf",
-                caption="📂 **Extracted PDF is ready!**\n\n"
-                       f"📄 Extracted pages: {pages_input}\n"
-                       f"📊 Total extracted: {len(page_numbers)} pages",
-                parse_mode='Markdown'
-            )
-        
-        # Clean up
-        if os.path.exists(pdf_path):
-            os.unlink(pdf_path)
-        os.unlink(output_pdf_path)
+        return
+    
+    if not await admit_job(update.message, user_id, 'splitpdf'):
+        return
+    
+    await update.message.reply_text(
+        f"🔄 **Extracting pages {pages_input}...**\n"
+        "Please wait...",
+        parse_mode='Markdown'
+    )
+    
+    await run_splitpdf_job(context.bot, update.effective_chat.id, user_id, {
+        'file_id': state_manager.get_user_data(user_id, 'split_pdf_file_id'),
+        'file_unique_id': state_manager.get_user_data(user_id, 'split_pdf_unique_id'),
+        'file_size': state_manager.get_user_data(user_id, 'split_pdf_file_size'),
+        'pdf_path': pdf_path,
+        'page_numbers': page_numbers,
+        'pages_label': pages_input
+    })
+
+@register_job_runner('splitpdf')
+async def run_splitpdf_job(bot, chat_id, user_id, inputs, attempt=1):
+    """Extract the requested pages of an uploaded PDF and send them"""
+    pdf_path = inputs['pdf_path']
+    page_numbers = inputs['page_numbers']
+    pages_label = inputs['pages_label']
+    
+    try:
+        async with run_job(user_id, chat_id, 'splitpdf', inputs, attempt, defer_slot=True) as job:
+            # Reuse the extract of an identical earlier split
+            cache_key = result_cache.make_key('splitpdf', [inputs.get('file_unique_id')], pages=page_numbers)
+            filename = f"extracted_pages_{pages_label.replace(',', '_').replace('-', '_')}.pdf"
+            caption = ("📂 **Extracted PDF is ready!**\n\n"
+                       f"📄 Extracted pages: {pages_label}\n"
+                       f"📊 Total extracted: {len(page_numbers)} pages")
+            if not await resend_delivered(bot, job, chat_id, cache_key, filename, caption=caption, parse_mode='Markdown'):
+                await job.acquire()
+                output_pdf = await result_cache.get(cache_key)
+                if output_pdf is None:
+                    # The PDF was downloaded at upload time; fetch it again if it is gone
+                    if not os.path.exists(pdf_path):
+                        pdf_path = job.workspace.file('input.pdf')
+                        job.set_stage('downloading', files=[pdf_path])
+                        await file_downloader.download_all(bot, [inputs['file_id']], [pdf_path])
+                    
+                    # Split PDF; the extract of a small PDF is built in memory
+                    job.set_stage('converting', files=[pdf_path])
+                    output = io.BytesIO() if fits_in_memory(os.path.getsize(pdf_path)) else job.workspace.file('result.pdf')
+                    output_pdf = await conversion_executor.run(split_pdf, pdf_path, page_numbers, output=output)
+                    await result_cache.put(cache_key, output_pdf)
+                
+                # Send split PDF
+                job.set_stage('uploading', files=[output_pdf])
+                await document_delivery.send_document(
+                    bot, chat_id, cache_key, output_pdf,
+                    filename=filename, caption=caption, parse_mode='Markdown'
+                )
+            
+            # The upload-time copy lives outside the workspace
+            cleanup_system.cleanup_file(inputs['pdf_path'])
         state_manager.clear_user_state(user_id)
         
         # Show menu
         keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="start")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(
-            "✅ **PDF split successfully!**\n\n"
-            "Need to process more PDFs?",
+        await bot.send_message(
+            chat_id=chat_id,
+            text="✅ **PDF split successfully!**\n\n"
+                 "Need to process more PDFs?",
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
         
     except Exception as e:
         logger.error(f"Error splitting PDF: {e}")
-        await update.message.reply_text(
-            "❌ **Error splitting PDF**\n\n"
-            "Sorry, there was an error extracting the pages. Please try again.",
+        await bot.send_message(
+            chat_id=chat_id,
+            text="❌ **Error splitting PDF**\n\n"
+                 "Sorry, there was an error extracting the pages. Please try again.",
             parse_mode='Markdown'
         )
         state_manager.clear_user_state(user_id)
@@ -1132,67 +1282,36 @@ async def handle_quick_split(query, context, data):
         state_manager.clear_user_state(user_id)
         return
     
+    # Parse page numbers from quick selection
+    page_numbers = parse_page_numbers(page_range, total_pages)
+    
+    if not page_numbers:
+        await context.bot.send_message(
+            chat_id=query.message.chat_id,
+            text="❌ **Invalid page selection!**\n\n"
+                 "Please try again.",
+            parse_mode='Markdown'
+        )
+        return
+    
+    # Only a valid selection is charged against the user's rate limit
+    if not await admit_job(query.message, user_id, 'splitpdf'):
+        return
+    
     await query.edit_message_text(
         f"🔄 **Extracting pages {page_range}...**\n"
         "Please wait...",
         parse_mode='Markdown'
     )
     
-    try:
-        # Parse page numbers from quick selection
-        page_numbers = parse_page_numbers(page_range, total_pages)
-        
-        if not page_numbers:
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="❌ **Invalid page selection!**\n\n"
-                     "Please try again.",
-                parse_mode='Markdown'
-            )
-            return
-        
-        # Split PDF
-        output_pdf_path = split_pdf(pdf_path, page_numbers)
-        
-        # Send split PDF
-        with open(output_pdf_path, 'rb') as pdf_file:
-            await context.bot.send_document(
-                chat_id=query.message.chat_id,
-                document=pdf_file,
-                filename=f"extracted_pages_{page_range.replace(',', '_').replace('-', '_')}.pdf",
-                caption="📂 **Extracted PDF is ready!**\n\n"
-                       f"📄 Extracted pages: {page_range}\n"
-                       f"📊 Total extracted: {len(page_numbers)} pages",
-                parse_mode='Markdown'
-            )
-        
-        # Clean up
-        if os.path.exists(pdf_path):
-            os.unlink(pdf_path)
-        os.unlink(output_pdf_path)
-        state_manager.clear_user_state(user_id)
-        
-        # Show menu
-        keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="start")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="✅ **PDF split successfully!**\n\n"
-                 "Need to process more PDFs?",
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
-        
-    except Exception as e:
-        logger.error(f"Error in quick split: {e}")
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="❌ **Error splitting PDF**\n\n"
-                 "Sorry, there was an error extracting the pages. Please try again.",
-            parse_mode='Markdown'
-        )
-        state_manager.clear_user_state(user_id)
+    await run_splitpdf_job(context.bot, query.message.chat_id, user_id, {
+        'file_id': state_manager.get_user_data(user_id, 'split_pdf_file_id'),
+        'file_unique_id': state_manager.get_user_data(user_id, 'split_pdf_unique_id'),
+        'file_size': state_manager.get_user_data(user_id, 'split_pdf_file_size'),
+        'pdf_path': pdf_path,
+        'page_numbers': page_numbers,
+        'pages_label': page_range
+    })
 
 async def handle_custom_split_request(query, context):
     """Handle custom split request"""
@@ -1226,23 +1345,33 @@ async def handle_broadcast_message_input(update: Update, context: ContextTypes.D
     message_text = update.message.text.strip()
     
     if not master_control.is_master(user_id) or not master_control.is_authenticated(user_id):
+        state_manager.clear_user_state(user_id)
         await update.message.reply_text(
             "❌ **Access Denied**\n\nYou are not authorized for this action.",
             parse_mode='Markdown'
         )
         return
     
-    await update.message.reply_text(
-        "📢 **Broadcasting message to all users...**\n\nPlease wait...",
-        parse_mode='Markdown'
-    )
+    # Stay in the broadcast state so the shorter message is broadcast
+    if len(message_text) > MAX_BROADCAST_LENGTH:
+        await update.message.reply_text(
+            f"❌ **Message too long**\n\nBroadcasts are limited to {MAX_BROADCAST_LENGTH} characters. Please send a shorter message.",
+            parse_mode='Markdown'
+        )
+        return
+    
+    state_manager.clear_user_state(user_id)
+    broadcast_id = broadcaster.submit(context.bot, message_text)
     
-    # Here you would implement actual broadcast logic
-    # For now, just confirm the message was received
+    # The message itself is not echoed: user text could break the Markdown
     await update.message.reply_text(
-        f"✅ **Broadcast Scheduled**\n\n"
-        f"Message: {message_text}\n\n"
-        "The message will be sent to all bot users.",
+        f"✅ **Broadcast #{broadcast_id} Scheduled**\n\n"
+        f"It will be sent to {broadcaster.get_stats()['chats']} chats in the background, "
+        "paced to stay within Telegram's limits.",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("📊 Progress", callback_data="master_broadcast_status"),
+            InlineKeyboardButton("🏠 Main Panel", callback_data="master_panel")
+        ]]),
         parse_mode='Markdown'
     )
 
@@ -1262,12 +1391,16 @@ async def handle_master_callbacks(query, context, data):
         await handle_master_cleanup(query, context)
     elif data == "master_broadcast":
         await handle_master_broadcast_request(query, context)
+    elif data == "master_broadcast_status":
+        await handle_master_broadcast_status(query, context)
+    elif data == "master_broadcast_cancel":
+        await handle_master_broadcast_cancel(query, context)
     elif data == "master_users":
         await handle_master_users_stats(query, context)
     elif data == "master_settings":
         await handle_master_settings(query, context)
-    elif data == "master_logs":
-        await handle_master_logs(query, context)
+    elif data.startswith("master_logs"):
+        await handle_master_logs(query, context, data)
 
 async def show_master_panel_callback(query, context):
     """Show master panel as callback"""
@@ -1302,12 +1435,24 @@ Welcome to the bot administration interface. Choose an option below:
 
 async def handle_master_users_stats(query, context):
     """Handle user statistics request"""
+    summary = usage_stats.get_summary()
+    
+    # Operations by files processed
+    operation_lines = "".join(
+        f"\n• {OPERATION_NAMES.get(row['operation'], row['operation'])}: "
+        f"{row['done']} files ({row['failed']} failed), ~{row['users']} users"
+        for row in summary['operations']
+    ) or "\n• No jobs yet"
+    
     await query.edit_message_text(
         "👥 **User Statistics**\n\n"
-        "• Total Users: Coming soon\n"
-        "• Active Today: Coming soon\n"
-        "• Files Processed: Coming soon\n\n"
-        "This feature will be implemented in the next update.",
+        f"• Total Users: ~{summary['total_users']}\n"
+        f"• Active Today: ~{summary['active_today']}\n"
+        f"• Active Last {summary['recent_days']} Days: ~{summary['active_recent']}\n"
+        f"• Files Processed: {summary['files_processed']} ({summary['files_today']} today, "
+        f"{summary['jobs_failed']} failed jobs)\n\n"
+        f"**📂 By Operation:**{operation_lines}\n\n"
+        "_User counts are estimates (±2%)._",
         reply_markup=InlineKeyboardMarkup([[
             InlineKeyboardButton("🏠 Main Panel", callback_data="master_panel")
         ]]),
@@ -1328,15 +1473,56 @@ async def handle_master_settings(query, context):
         parse_mode='Markdown'
     )
 
-async def handle_master_logs(query, context):
-    """Handle server logs request"""
+# Level filters of the Server Logs panel: (callback name, button label, level)
+LOG_LEVEL_FILTERS = [
+    ('ALL', "All", logging.NOTSET),
+    ('INFO', "Info+", logging.INFO),
+    ('WARNING', "Warn+", logging.WARNING),
+    ('ERROR', "Errors", logging.ERROR)
+]
+
+async def handle_master_logs(query, context, data="master_logs"):
+    """Page through the buffered server logs, filtered by level and module"""
+    # master_logs:<level>:<module or ->:<page>
+    parts = data.split(':')
+    level_name = parts[1] if len(parts) > 1 else 'ALL'
+    module = parts[2] if len(parts) > 2 and parts[2] != '-' else None
+    page = int(parts[3]) if len(parts) > 3 and parts[3].isdigit() else 0
+    levels = {name: level for name, _, level in LOG_LEVEL_FILTERS}
+    
+    lines, pages = log_buffer.page(page, per_page=12, level=levels.get(level_name, logging.NOTSET),
+                                   module=module, max_line=250)
+    page = min(page, pages - 1)
+    
+    def callback(level=level_name, module=module, page=0):
+        return f"master_logs:{level}:{module or '-'}:{page}"
+    
+    # Backticks would end the code block early
+    body = "\n".join(line.replace('`', "'") for line in lines) or "No matching log records."
+    text = (
+        f"📋 **Server Logs** ({level_name}, {f'`{module}`' if module else 'all modules'})\n"
+        f"Page {page + 1} / {pages}, newest first, updated {time.strftime('%H:%M:%S')}\n\n"
+        f"```\n{body}\n```"
+    )
+    
+    keyboard = [
+        [InlineKeyboardButton(("• " if name == level_name else "") + label, callback_data=callback(level=name))
+         for name, label, _ in LOG_LEVEL_FILTERS],
+        [InlineKeyboardButton(("• " if name == module else "") + (name or "All modules"), callback_data=callback(module=name))
+         for name in [None] + log_buffer.top_modules(3)]
+    ]
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️ Newer", callback_data=callback(page=page - 1)))
+    navigation.append(InlineKeyboardButton("🔄 Refresh", callback_data=callback(page=page)))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("Older ▶️", callback_data=callback(page=page + 1)))
+    keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("🏠 Main Panel", callback_data="master_panel")])
+    
     await query.edit_message_text(
-        "📋 **Server Logs**\n\n"
-        "Recent activity logs will be displayed here.\n"
-        "This feature is coming in the next update.",
-        reply_markup=InlineKeyboardMarkup([[
-            InlineKeyboardButton("🏠 Main Panel", callback_data="master_panel")
-        ]]),
+        text,
+        reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     )
 
@@ -1345,6 +1531,7 @@ async def ocr2pdf_callback(query, context):
     user_id = query.from_user.id
     state_manager.set_state(user_id, 'ocr_images')
     state_manager.clear_user_data(user_id, 'images')
+    upload_prefetcher.release(user_id)
     
     text = """
 🔍 **OCR Text Extraction**
@@ -1432,6 +1619,7 @@ async def handle_password_protect_upload(update: Update, context: ContextTypes.D
     # Store the document info
     state_manager.set_user_data(user_id, 'pdf_file_id', document.file_id)
     state_manager.set_user_data(user_id, 'pdf_file_name', document.file_name)
+    state_manager.set_user_data(user_id, 'pdf_file_size', document.file_size)
     state_manager.set_state(user_id, 'waiting_for_password')
     
     await update.message.reply_text(
@@ -1461,62 +1649,82 @@ async def handle_password_input(update: Update, context: ContextTypes.DEFAULT_TY
     file_id = state_manager.get_user_data(user_id, 'pdf_file_id')
     file_name = state_manager.get_user_data(user_id, 'pdf_file_name')
     
+    if not await admit_job(update.message, user_id, 'password'):
+        return
+    
     await update.message.reply_text(
         "🔄 **Processing your PDF...**\n"
         "Adding password protection with 128-bit encryption...",
         parse_mode='Markdown'
     )
     
+    # Not registered as a job runner: the password is never journaled, so
+    # an interrupted job is failed on restart rather than re-run
+    await run_password_job(context.bot, update.effective_chat.id, user_id, {
+        'file_id': file_id,
+        'file_name': file_name,
+        'file_size': state_manager.get_user_data(user_id, 'pdf_file_size'),
+        'password': password
+    })
+    
+    # Clear user state
+    state_manager.clear_user_state(user_id)
+
+async def run_password_job(bot, chat_id, user_id, inputs, attempt=1):
+    """Download a PDF, encrypt it with the user's password and send it"""
+    file_name = inputs['file_name']
+    
     try:
-        # Download the file
-        file = await context.bot.get_file(file_id)
-        input_path = f"temp_input_{user_id}.pdf"
-        await file.download_to_drive(input_path)
-        
-        # Add password protection
-        from pdf_utils import add_password_protection
-        output_path = add_password_protection(input_path, password)
-        success = True
-        
-        if output_path:
-            # Send the protected PDF
-            with open(output_path, 'rb') as pdf_file:
-                await update.message.reply_document(
-                    document=pdf_file,
-                    filename=f"protected_{file_name}",
-                    caption=f"🔐 PDF Password Protected Successfully!\n\n"
-                           f"🔒 Your PDF is now secured with 128-bit encryption\n"
-                           f"📄 Protected file: protected_{file_name}\n"
-                           f"🔑 Use your password to open the file",
+        async with run_job(user_id, chat_id, 'password', inputs, attempt) as job:
+            # Download the file; small PDFs never touch the disk
+            in_memory = fits_in_memory(inputs.get('file_size'))
+            input_path = io.BytesIO() if in_memory else job.workspace.file('input.pdf')
+            job.set_stage('downloading', files=[input_path])
+            await file_downloader.download_all(bot, [inputs['file_id']], [input_path])
+            
+            # Add password protection
+            job.set_stage('encrypting')
+            output_path = await conversion_executor.run(
+                add_password_protection, input_path, inputs['password'],
+                output=io.BytesIO() if in_memory else job.workspace.file('result.pdf')
+            )
+            
+            if output_path:
+                # Send the protected PDF
+                job.set_stage('uploading', files=[output_path])
+                with open_pdf_output(output_path) as pdf_file:
+                    await bot.send_document(
+                        chat_id=chat_id,
+                        document=pdf_file,
+                        filename=f"protected_{file_name}",
+                        caption=f"🔐 PDF Password Protected Successfully!\n\n"
+                               f"🔒 Your PDF is now secured with 128-bit encryption\n"
+                               f"📄 Protected file: protected_{file_name}\n"
+                               f"🔑 Use your password to open the file",
+                        reply_markup=InlineKeyboardMarkup([[
+                            InlineKeyboardButton("🏠 Main Menu", callback_data="start")
+                        ]])
+                    )
+            else:
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text="❌ **Error protecting PDF**\n"
+                         "The PDF file may be corrupted or already password protected.",
                     reply_markup=InlineKeyboardMarkup([[
                         InlineKeyboardButton("🏠 Main Menu", callback_data="start")
                     ]])
                 )
-            
-            # Cleanup files
-            cleanup_system.cleanup_file(input_path)
-            cleanup_system.cleanup_file(output_path)
-        else:
-            await update.message.reply_text(
-                "❌ **Error protecting PDF**\n"
-                "The PDF file may be corrupted or already password protected.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🏠 Main Menu", callback_data="start")
-                ]])
-            )
     
     except Exception as e:
         logger.error(f"Error in password protection: {e}")
-        await update.message.reply_text(
-            "❌ Error processing PDF\n"
-            "Please try again with a different PDF file.",
+        await bot.send_message(
+            chat_id=chat_id,
+            text="❌ Error processing PDF\n"
+                 "Please try again with a different PDF file.",
             reply_markup=InlineKeyboardMarkup([[
                 InlineKeyboardButton("🏠 Main Menu", callback_data="start")
             ]])
         )
-    
-    # Clear user state
-    state_manager.clear_user_state(user_id)
 
 async def handle_ocr_image_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle image upload for OCR processing"""
@@ -1526,10 +1734,16 @@ async def handle_ocr_image_upload(update: Update, context: ContextTypes.DEFAULT_
         # Handle photo upload
         photo = update.message.photo[-1]  # Get highest resolution
         
+        # Start downloading the image while more arrive; OCR reads the
+        # original bytes, so nothing is re-encoded here
+        upload_prefetcher.prefetch(context.bot, user_id, photo.file_id, '.jpg')
+        
         # Add image to user's collection
         images = state_manager.get_user_data(user_id, 'images') or []
         images.append({
             'file_id': photo.file_id,
+            'file_unique_id': photo.file_unique_id,
+            'file_size': photo.file_size,
             'type': 'photo'
         })
         state_manager.set_user_data(user_id, 'images', images)
@@ -1574,6 +1788,9 @@ async def process_ocr_to_pdf(query, context):
         )
         return
     
+    if not await admit_job(query.message, user_id, 'ocr2pdf'):
+        return
+    
     await query.edit_message_text(
         f"🔄 **Processing {len(images)} images...**\n"
         "• Downloading images\n"
@@ -1583,55 +1800,64 @@ async def process_ocr_to_pdf(query, context):
         parse_mode='Markdown'
     )
     
+    await run_ocr2pdf_job(context.bot, query.message.chat_id, user_id, {'images': images})
+
+@register_job_runner('ocr2pdf')
+async def run_ocr2pdf_job(bot, chat_id, user_id, inputs, attempt=1):
+    """Download images, extract their text with OCR and send the PDF"""
+    images = inputs['images']
+    
     try:
-        # Download images
-        image_paths = []
-        for i, image_data in enumerate(images):
-            file = await context.bot.get_file(image_data['file_id'])
-            image_path = f"ocr_image_{user_id}_{i}.jpg"
-            await file.download_to_drive(image_path)
-            image_paths.append(image_path)
-        
-        # Create OCR PDF
-        from pdf_utils import create_ocr_pdf
-        pdf_path = create_ocr_pdf(image_paths)
-        
-        if pdf_path and os.path.exists(pdf_path):
-            # Send the PDF
-            with open(pdf_path, 'rb') as pdf_file:
-                await context.bot.send_document(
-                    chat_id=query.message.chat_id,
-                    document=pdf_file,
-                    filename=f"ocr_extracted_{user_id}.pdf",
-                    caption="🔍 **OCR Text Extraction Complete!**\n\n"
-                           f"📸 Processed {len(images)} images\n"
-                           f"📄 Text extracted and compiled into searchable PDF\n"
-                           f"🔍 You can now search for text within this PDF",
-                    parse_mode='Markdown',
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🏠 Main Menu", callback_data="start")
-                    ]])
-                )
-            
-            # Cleanup files
-            cleanup_system.cleanup_file(pdf_path)
-            for image_path in image_paths:
-                cleanup_system.cleanup_file(image_path)
-        else:
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="❌ **OCR Processing Failed**\n"
-                     "Could not extract text from the images.\n"
-                     "Please try with clearer images containing text.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🏠 Main Menu", callback_data="start")
-                ]])
-            )
+        async with run_job(user_id, chat_id, 'ocr2pdf', inputs, attempt, defer_slot=True) as job:
+            # Reuse the PDF of an identical earlier OCR job
+            cache_key = result_cache.make_key('ocr2pdf', [image_data.get('file_unique_id') for image_data in images])
+            filename = f"ocr_extracted_{user_id}.pdf"
+            caption = ("🔍 **OCR Text Extraction Complete!**\n\n"
+                       f"📸 Processed {len(images)} images\n"
+                       f"📄 Text extracted and compiled into searchable PDF\n"
+                       f"🔍 You can now search for text within this PDF")
+            reply_markup = InlineKeyboardMarkup([[
+                InlineKeyboardButton("🏠 Main Menu", callback_data="start")
+            ]])
+            if not await resend_delivered(bot, job, chat_id, cache_key, filename, caption=caption,
+                                          parse_mode='Markdown', reply_markup=reply_markup):
+                await job.acquire()
+                image_paths = [job.workspace.file(f"ocr_{i}.jpg") for i in range(len(images))]
+                pdf_output = await result_cache.get(cache_key)
+                if pdf_output is None:
+                    # Download images
+                    job.set_stage('downloading', files=image_paths)
+                    image_paths = await upload_prefetcher.collect(
+                        bot, user_id, [image_data['file_id'] for image_data in images], image_paths
+                    )
+                    
+                    # Create OCR PDF, in memory unless the images are large
+                    job.set_stage('converting')
+                    output = io.BytesIO() if fits_in_memory(*map(os.path.getsize, image_paths)) else job.workspace.file('result.pdf')
+                    pdf_output = await conversion_executor.run(create_ocr_pdf, image_paths, output=output)
+                    if pdf_output is not None:
+                        await result_cache.put(cache_key, pdf_output)
+                
+                if pdf_output is not None and (not isinstance(pdf_output, str) or os.path.exists(pdf_output)):
+                    # Send the PDF
+                    job.set_stage('uploading', files=[pdf_output])
+                    await document_delivery.send_document(
+                        bot, chat_id, cache_key, pdf_output,
+                        filename=filename, caption=caption, parse_mode='Markdown', reply_markup=reply_markup
+                    )
+                else:
+                    await bot.send_message(
+                        chat_id=chat_id,
+                        text="❌ **OCR Processing Failed**\n"
+                             "Could not extract text from the images.\n"
+                             "Please try with clearer images containing text.",
+                        reply_markup=reply_markup
+                    )
     
     except Exception as e:
         logger.error(f"Error in OCR processing: {e}")
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
+        await bot.send_message(
+            chat_id=chat_id,
             text="❌ **Error processing OCR**\n"
                  "Please try again with different images.",
             reply_markup=InlineKeyboardMarkup([[
@@ -1641,6 +1867,7 @@ async def process_ocr_to_pdf(query, context):
     
     # Clear user state
     state_manager.clear_user_state(user_id)
+    upload_prefetcher.release(user_id)
 
 # AI Enhancement Feature Handlers
 async def ai_enhance_callback(query, context):
@@ -1719,6 +1946,9 @@ async def handle_ai_analysis_upload(update: Update, context: ContextTypes.DEFAUL
         )
         return
     
+    if not await admit_job(update.message, user_id, 'ai'):
+        return
+    
     await update.message.reply_text(
         f"📄 **Document received:** {file_name}\n\n"
         "🤖 **Starting AI analysis...**\n"
@@ -1729,62 +1959,80 @@ async def handle_ai_analysis_upload(update: Update, context: ContextTypes.DEFAUL
         parse_mode='Markdown'
     )
     
+    await run_ai_job(context.bot, update.effective_chat.id, user_id, {
+        'file_id': file_info.file_id,
+        'file_size': file_info.file_size,
+        'file_type': file_type,
+        'file_name': file_name
+    })
+    
+    # Clear user state for AI analysis
+    state_manager.clear_user_state(user_id)
+
+@register_job_runner('ai')
+async def run_ai_job(bot, chat_id, user_id, inputs, attempt=1):
+    """Download a document, analyze it with AI and send the suggestions"""
+    file_type = inputs['file_type']
+    
     try:
-        # Download the file
-        file = await context.bot.get_file(file_info.file_id)
-        temp_path = f"ai_analysis_{user_id}.{file_type}"
-        await file.download_to_drive(temp_path)
-        
-        # Analyze with AI
-        analysis_result = analyze_document_file(temp_path, file_type)
+        async with run_job(user_id, chat_id, 'ai', inputs, attempt) as job:
+            # Download the file into the job's workspace
+            temp_path = job.workspace.file(f"input.{file_type}")
+            job.set_stage('downloading', files=[temp_path])
+            await file_downloader.download_all(bot, [inputs['file_id']], [temp_path])
+            
+            # Analyze with AI
+            job.set_stage('converting')
+            analysis_result = await conversion_executor.run(analyze_document_file, temp_path, file_type)
+            job.set_stage('uploading')
         
-        # Format and send results
-        formatted_suggestions = format_enhancement_suggestions(analysis_result)
+            # Format and send results
+            formatted_suggestions = format_enhancement_suggestions(analysis_result)
         
-        # Split long messages to avoid Telegram limits
-        max_length = 4000
-        if len(formatted_suggestions) > max_length:
-            # Split into chunks
-            chunks = []
-            current_chunk = ""
-            lines = formatted_suggestions.split('\n')
+            # Split long messages to avoid Telegram limits
+            max_length = 4000
+            if len(formatted_suggestions) > max_length:
+                # Split into chunks
+                chunks = []
+                current_chunk = ""
+                lines = formatted_suggestions.split('\n')
             
-            for line in lines:
-                if len(current_chunk + line + '\n') > max_length:
-                    if current_chunk:
-                        chunks.append(current_chunk)
-                        current_chunk = line + '\n'
+                for line in lines:
+                    if len(current_chunk + line + '\n') > max_length:
+                        if current_chunk:
+                            chunks.append(current_chunk)
+                            current_chunk = line + '\n'
+                        else:
+                            chunks.append(line[:max_length])
                     else:
-                        chunks.append(line[:max_length])
-                else:
-                    current_chunk += line + '\n'
+                        current_chunk += line + '\n'
             
-            if current_chunk:
-                chunks.append(current_chunk)
+                if current_chunk:
+                    chunks.append(current_chunk)
             
-            # Send chunks
-            for i, chunk in enumerate(chunks):
-                if i == len(chunks) - 1:  # Last chunk
-                    await update.message.reply_text(
-                        chunk,
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🏠 Main Menu", callback_data="start")
-                        ]])
-                    )
-                else:
-                    await update.message.reply_text(
-                        chunk
-                    )
-        else:
-            await update.message.reply_text(
-                formatted_suggestions,
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🏠 Main Menu", callback_data="start")
-                ]])
-            )
-        
-        # Cleanup file
-        cleanup_system.cleanup_file(temp_path)
+                # Send chunks
+                for i, chunk in enumerate(chunks):
+                    if i == len(chunks) - 1:  # Last chunk
+                        await bot.send_message(
+                            chat_id=chat_id,
+                            text=chunk,
+                            reply_markup=InlineKeyboardMarkup([[
+                                InlineKeyboardButton("🏠 Main Menu", callback_data="start")
+                            ]])
+                        )
+                    else:
+                        await bot.send_message(
+                            chat_id=chat_id,
+                            text=chunk
+                        )
+            else:
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=formatted_suggestions,
+                    reply_markup=InlineKeyboardMarkup([[
+                        InlineKeyboardButton("🏠 Main Menu", callback_data="start")
+                    ]])
+                )
         
     except Exception as e:
         logger.error(f"Error in AI analysis: {e}")
@@ -1799,12 +2047,11 @@ async def handle_ai_analysis_upload(update: Update, context: ContextTypes.DEFAUL
                             "There was an error analyzing your document. "
                             "Please try with a different file or try again later.")
         
-        await update.message.reply_text(
-            error_message,
+        await bot.send_message(
+            chat_id=chat_id,
+            text=error_message,
             reply_markup=InlineKeyboardMarkup([[
                 InlineKeyboardButton("🏠 Main Menu", callback_data="start")
             ]])
         )
-    
-    # Clear user state for AI analysis
-    state_manager.clear_user_state(user_id)
+
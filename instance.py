@@ -0,0 +1,57 @@
+import os
+import fcntl
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Instance that owns journal rows written before jobs were tagged
+DEFAULT_INSTANCE_ID = '0'
+
+class ProcessInstance:
+    """Identity of this bot process among workers sharing the temp directory.
+
+    Each process holds an exclusive lock file for its instance ID for as
+    long as it runs. Without INSTANCE_ID set, it claims the lowest free
+    numeric ID, so a restarted worker takes over the ID of a worker that
+    is gone rather than one that is still running. Jobs and workspaces
+    are tagged with the ID, and a worker only recovers or removes its own.
+    """
+
+    def __init__(self, instance_id: str = None, lock_dir: str = None, max_instances: int = 64):
+        self.lock_dir = lock_dir or os.environ.get('INSTANCE_LOCK_DIR', tempfile.gettempdir())
+        self._lock_file = None
+        requested = instance_id or os.environ.get('INSTANCE_ID')
+        if requested:
+            if not self._claim(requested):
+                raise RuntimeError(
+                    f"Instance {requested} is already running (lock {self._lock_path(requested)}); "
+                    "give every worker its own INSTANCE_ID"
+                )
+            self.instance_id = requested
+        else:
+            for candidate in range(max_instances):
+                if self._claim(str(candidate)):
+                    self.instance_id = str(candidate)
+                    break
+            else:
+                raise RuntimeError(f"All {max_instances} instance IDs are held by running workers")
+        logger.info(f"Running as instance {self.instance_id}")
+
+    def _lock_path(self, instance_id: str) -> str:
+        """Get the lock file of an instance ID"""
+        return os.path.join(self.lock_dir, f"pdfbot_instance_{instance_id}.lock")
+
+    def _claim(self, instance_id: str) -> bool:
+        """Take the lock of an instance ID if no running process holds it"""
+        lock_file = open(self._lock_path(instance_id), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+# Global process instance
+process_instance = ProcessInstance()
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, List
+from instance import process_instance, DEFAULT_INSTANCE_ID
+
+logger = logging.getLogger(__name__)
+
+# Stages after which a job needs no recovery
+TERMINAL_STAGES = ('done', 'failed', 'requeued')
+
+class JobJournal:
+    """Append-only SQLite journal of conversion jobs.
+
+    Every stage change is a new row; a job's current stage is its latest
+    row. The first row ('queued') carries everything needed to run the job
+    again: user, chat, operation and inputs (Telegram file IDs plus
+    parameters). Later rows may list local files the job created so they
+    can be removed if the job never finishes. Every row is tagged with the
+    instance that wrote it, so workers sharing the journal only recover
+    their own jobs.
+    """
+
+    def __init__(self, path: str = None, instance_id: str = None):
+        self.path = path or os.environ.get(
+            'JOB_JOURNAL_PATH', os.path.join(tempfile.gettempdir(), 'pdfbot_jobs.db')
+        )
+        self.instance_id = instance_id or process_instance.instance_id
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, "
+                "ts REAL NOT NULL, stage TEXT NOT NULL, payload TEXT NOT NULL, instance TEXT)"
+            )
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(job_events)")]
+            if 'instance' not in columns:
+                connection.execute("ALTER TABLE job_events ADD COLUMN instance TEXT")
+            connection.execute("CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq)")
+
+    def _connection(self):
+        """Get this thread's database connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _append(self, job_id: str, stage: str, payload: Dict[str, Any]):
+        """Append one event row"""
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO job_events (job_id, ts, stage, payload, instance) VALUES (?, ?, ?, ?, ?)",
+                (job_id, time.time(), stage, json.dumps(payload), self.instance_id)
+            )
+
+    def start_job(self, user_id: int, chat_id: int, operation: str,
+                  inputs: Dict[str, Any], attempt: int = 1) -> str:
+        """Record a new job and return its ID"""
+        job_id = uuid.uuid4().hex
+        self._append(job_id, 'queued', {
+            'user_id': user_id,
+            'chat_id': chat_id,
+            'operation': operation,
+            'inputs': inputs,
+            'attempt': attempt
+        })
+        return job_id
+
+    def record_stage(self, job_id: str, stage: str, files: List[str] = None, **details):
+        """Record that a job entered a new stage"""
+        payload = dict(details)
+        if files:
+            payload['files'] = list(files)
+        self._append(job_id, stage, payload)
+
+    def unfinished_jobs(self, instance_id: str = None) -> List[Dict[str, Any]]:
+        """Get jobs whose latest stage is not terminal, of one instance or of all"""
+        connection = self._connection()
+        query = (
+            "SELECT e.job_id, e.stage FROM job_events e "
+            "JOIN (SELECT job_id, MAX(seq) AS seq FROM job_events GROUP BY job_id) latest "
+            "ON e.seq = latest.seq "
+            f"WHERE e.stage NOT IN ({','.join('?' * len(TERMINAL_STAGES))})"
+        )
+        params = TERMINAL_STAGES
+        if instance_id is not None:
+            # Rows written before tagging belong to the default instance
+            query += " AND COALESCE(e.instance, ?) = ?"
+            params += (DEFAULT_INSTANCE_ID, instance_id)
+        rows = connection.execute(query, params).fetchall()
+
+        jobs = []
+        for job_id, stage in rows:
+            events = connection.execute(
+                "SELECT stage, payload FROM job_events WHERE job_id = ? ORDER BY seq", (job_id,)
+            ).fetchall()
+            job = json.loads(events[0][1])
+            job['job_id'] = job_id
+            job['stage'] = stage
+            job['files'] = [path for _, payload in events for path in json.loads(payload).get('files', [])]
+            jobs.append(job)
+        return jobs
+
+    def compact(self, max_age_hours: float = 24) -> int:
+        """Drop the history of jobs that finished more than max_age_hours ago"""
+        cutoff = time.time() - max_age_hours * 3600
+        with self._connection() as connection:
+            cursor = connection.execute(
+                "DELETE FROM job_events WHERE job_id IN ("
+                "SELECT job_id FROM job_events "
+                f"WHERE stage IN ({','.join('?' * len(TERMINAL_STAGES))}) AND ts < ?)",
+                (*TERMINAL_STAGES, cutoff)
+            )
+        return cursor.rowcount
+
+    def get_stats(self):
+        """Get counts of unfinished and recorded jobs"""
+        connection = self._connection()
+        total = connection.execute("SELECT COUNT(DISTINCT job_id) FROM job_events").fetchone()[0]
+        return {
+            'jobs': total,
+            'unfinished': len(self.unfinished_jobs())
+        }
+
+# Global job journal instance
+job_journal = JobJournal()
@@ -0,0 +1,231 @@
+import os
+import time
+import logging
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, Dict, List, Optional
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from job_journal import job_journal
+from dispatcher import update_dispatcher
+from fair_scheduler import fair_scheduler
+from workspace import workspace_registry
+from instance import process_instance
+from disk_quota import disk_quota
+from downloads import fits_in_memory
+from metrics import metrics_registry
+from tracing import tracer
+from usage_stats import usage_stats
+
+logger = logging.getLogger(__name__)
+
+# A job interrupted this many times is failed instead of re-queued
+MAX_JOB_ATTEMPTS = int(os.environ.get('MAX_JOB_ATTEMPTS', 2))
+
+# Input keys that are never written to the journal
+UNJOURNALED_INPUTS = ('password',)
+
+OPERATION_NAMES = {
+    'txt2pdf': 'Text ➝ PDF',
+    'img2pdf': 'Images ➝ PDF',
+    'doc2pdf': 'Document ➝ PDF',
+    'mergepdf': 'PDF merge',
+    'splitpdf': 'PDF split',
+    'password': 'Password protection',
+    'ocr2pdf': 'OCR ➝ PDF',
+    'ai': 'AI analysis'
+}
+
+# operation -> async runner(bot, chat_id, user_id, inputs, attempt)
+job_runners = {}
+
+JOB_STAGE_SECONDS = metrics_registry.histogram(
+    'pdfbot_job_stage_seconds', 'Time jobs spend in each stage', ('operation', 'stage')
+)
+JOB_SECONDS = metrics_registry.histogram(
+    'pdfbot_job_seconds', 'Time from job submission to finish', ('operation',)
+)
+JOBS_TOTAL = metrics_registry.counter('pdfbot_jobs_total', 'Finished jobs by outcome', ('operation', 'outcome'))
+
+def register_job_runner(operation: str):
+    """Register the coroutine that runs (and re-runs) jobs of an operation"""
+    def decorator(runner):
+        job_runners[operation] = runner
+        return runner
+    return decorator
+
+class Job:
+    """A conversion job whose progress is written to the journal"""
+
+    def __init__(self, user_id: int, chat_id: int, operation: str, inputs: Dict[str, Any], attempt: int = 1):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.operation = operation
+        self.attempt = attempt
+        journaled_inputs = {key: value for key, value in inputs.items() if key not in UNJOURNALED_INPUTS}
+        self.job_id = job_journal.start_job(user_id, chat_id, operation, journaled_inputs, attempt)
+        self.stage = 'queued'
+        self.workspace = None
+        self._disk_sizes = _disk_input_sizes(inputs)
+        self._resources = None
+        self.trace = tracer.start(self.job_id, user_id, operation, attempt)
+        self.trace.set_stage(self.stage)
+        self.started = self._stage_started = time.perf_counter()
+
+    def _end_stage(self) -> float:
+        """Record how long the current stage took"""
+        now = time.perf_counter()
+        JOB_STAGE_SECONDS.labels(self.operation, self.stage).observe(now - self._stage_started)
+        self._stage_started = now
+        return now
+
+    def set_stage(self, stage: str, files=None):
+        """Move the job to a new stage, noting any local files it created"""
+        self._end_stage()
+        self.stage = stage
+        self.trace.set_stage(stage)
+        # In-memory buffers need no cleanup after a crash
+        files = [path for path in files or [] if isinstance(path, str)]
+        job_journal.record_stage(self.job_id, stage, files=files)
+
+    async def acquire(self):
+        """Wait for disk space and a job slot, then create the job's workspace"""
+        if self.workspace is not None:
+            return
+        # Waiting here must not hold up other users' updates
+        update_dispatcher.release_slot()
+        await self._resources.enter_async_context(disk_quota.reserve(self.operation, self._disk_sizes, self.job_id))
+        await self._resources.enter_async_context(fair_scheduler.slot(self.user_id, self.operation))
+        self.workspace = self._resources.enter_context(
+            workspace_registry.open(self.job_id, self.user_id, self.operation)
+        )
+
+    def finish(self, outcome: str, **details):
+        """Record the end of the job"""
+        finished = self._end_stage()
+        JOB_SECONDS.labels(self.operation).observe(finished - self.started)
+        JOBS_TOTAL.labels(self.operation, outcome).inc()
+        tracer.finish(self.trace, outcome)
+        usage_stats.record(outcome, self.user_id, self.operation)
+        job_journal.record_stage(self.job_id, outcome, **details)
+
+def _disk_input_sizes(inputs: Dict[str, Any]) -> List[Optional[int]]:
+    """Get the Telegram-reported sizes of the inputs a job downloads to disk"""
+    if 'file_id' in inputs:
+        sizes = [inputs.get('file_size')]
+    else:
+        sizes = [item.get('file_size') for key in ('images', 'pdfs') for item in inputs.get(key, [])]
+    # Small jobs are converted in memory
+    return [] if fits_in_memory(*sizes) else sizes
+
+@asynccontextmanager
+async def run_job(user_id: int, chat_id: int, operation: str, inputs: Dict[str, Any], attempt: int = 1,
+                  defer_slot: bool = False):
+    """Journal a job from start to finish.
+
+    The job stays 'queued' until the disk quota can reserve space for its
+    inputs and the fair scheduler gives it a slot. Its update gives back
+    its dispatcher slot first, so jobs waiting for a heavy-job slot never
+    hold up other users' updates. It then gets a scratch workspace that
+    is removed when the block exits. With ``defer_slot`` the block starts
+    right away and calls ``job.acquire()`` only if it has real work to do,
+    e.g. after a file_id resend missed. The job's trace is current
+    throughout, so spans opened in the block join it. An exception marks
+    the job failed. Cancellation (shutdown) leaves it unfinished so it is
+    recovered on the next start.
+    """
+    job = Job(user_id, chat_id, operation, inputs, attempt)
+    with tracer.activate(job.trace):
+        try:
+            async with AsyncExitStack() as resources:
+                job._resources = resources
+                if not defer_slot:
+                    await job.acquire()
+                yield job
+        except Exception as e:
+            job.finish('failed', error=str(e))
+            raise
+        else:
+            job.finish('done')
+
+def _format_seconds(seconds: float) -> str:
+    """Format a wait time for users"""
+    if seconds < 90:
+        return f"{max(1, round(seconds))} seconds"
+    return f"{round(seconds / 60)} minutes"
+
+async def admit_job(message, user_id: int, operation: str) -> bool:
+    """Apply the user's rate limit and tell them if the job has to wait"""
+    allowed, seconds = fair_scheduler.admit(user_id, operation)
+    if not allowed:
+        await message.reply_text(
+            "⏳ **Too many heavy jobs at once**\n\n"
+            f"Please try again in about {_format_seconds(seconds)}.",
+            parse_mode='Markdown',
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🏠 Main Menu", callback_data="start")
+            ]])
+        )
+        return False
+    
+    if seconds > 0:
+        await message.reply_text(
+            "🕒 **Server busy**\n\n"
+            f"Your {OPERATION_NAMES.get(operation, operation)} job is queued and should start in about {_format_seconds(seconds)}.",
+            parse_mode='Markdown'
+        )
+    return True
+
+def _remove_files(paths):
+    """Remove files left behind by an interrupted job"""
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.unlink(path)
+        except OSError as e:
+            logger.warning(f"Could not remove {path}: {e}")
+
+async def _notify(bot, chat_id, text):
+    """Send a recovery notice, ignoring delivery errors"""
+    try:
+        await bot.send_message(chat_id=chat_id, text=text)
+    except Exception as e:
+        logger.warning(f"Could not notify chat {chat_id}: {e}")
+
+async def recover_interrupted_jobs(bot):
+    """Re-queue or cleanly fail jobs left unfinished by the last shutdown.
+
+    Only this instance's jobs are recovered; other workers sharing the
+    journal may still be running theirs.
+    """
+    # No job of this instance is running yet, so its workspaces are orphaned
+    workspace_registry.remove_orphans()
+    
+    jobs = job_journal.unfinished_jobs(process_instance.instance_id)
+    for job in jobs:
+        _remove_files(job['files'])
+        operation = job['operation']
+        runner = job_runners.get(operation)
+        name = OPERATION_NAMES.get(operation, operation)
+        inputs = job['inputs']
+        # Jobs without a registered runner (e.g. password, whose input is
+        # never journaled) cannot be re-run
+        if runner is None or job['attempt'] >= MAX_JOB_ATTEMPTS:
+            job_journal.record_stage(job['job_id'], 'failed', error='interrupted by restart')
+            await _notify(
+                bot, job['chat_id'],
+                f"⚠️ Your {name} job was interrupted by a server restart. Please start it again."
+            )
+            logger.info(f"Failed interrupted job {job['job_id']} ({operation})")
+            continue
+
+        job_journal.record_stage(job['job_id'], 'requeued')
+        await _notify(bot, job['chat_id'], f"♻️ Resuming your {name} job after a server restart...")
+
+        def make_job(runner=runner, job=job, inputs=inputs):
+            return runner(bot, job['chat_id'], job['user_id'], inputs, job['attempt'] + 1)
+
+        update_dispatcher.submit(job['user_id'], make_job)
+        logger.info(f"Re-queued interrupted job {job['job_id']} ({operation})")
+
+    if jobs:
+        logger.info(f"Recovered {len(jobs)} interrupted jobs")
+    return len(jobs)
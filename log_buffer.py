@@ -0,0 +1,126 @@
+import os
+import copy
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from collections import Counter, deque
+from typing import List, Optional, Tuple
+
+# Libraries that log every HTTP request at INFO
+NOISY_LOGGERS = ('httpx', 'httpcore', 'telegram.ext.ExtBot')
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# Log argument types that look the same whenever they are formatted
+IMMUTABLE_ARGS = (str, bytes, int, float, complex, bool, type(None))
+
+class RingBufferHandler(logging.Handler):
+    """Keep the most recent log records in memory for the master panel.
+
+    Records are stored as they are and only formatted when a page of them
+    is read, so keeping a record costs one deque append.
+    """
+
+    def __init__(self, capacity: int = None):
+        super().__init__()
+        self.capacity = capacity or int(os.environ.get('LOG_BUFFER_SIZE', 2000))
+        self._records = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self.setFormatter(logging.Formatter(LOG_FORMAT, '%H:%M:%S'))
+
+    def emit(self, record: logging.LogRecord):
+        if record.exc_info:
+            # Keep the traceback text, not the frames it references
+            if not record.exc_text:
+                record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        with self._lock:
+            self._records.append(record)
+
+    def records(self, level: int = logging.NOTSET, module: str = None) -> List[logging.LogRecord]:
+        """Get the buffered records at or above ``level`` from ``module`` (and its children), newest first"""
+        with self._lock:
+            records = list(self._records)
+        records.reverse()
+        return [record for record in records
+                if record.levelno >= level
+                and (not module or record.name == module or record.name.startswith(module + '.'))]
+
+    def page(self, page: int = 0, per_page: int = 15, level: int = logging.NOTSET,
+             module: str = None, max_line: int = 300) -> Tuple[List[str], int]:
+        """Format one page of matching records, newest first, and get the page count"""
+        records = self.records(level, module)
+        pages = max(1, -(-len(records) // per_page))
+        lines = []
+        for record in records[page * per_page:(page + 1) * per_page]:
+            line = self.format(record)
+            lines.append(line if len(line) <= max_line else line[:max_line - 1] + '…')
+        return lines, pages
+
+    def top_modules(self, limit: int = 4) -> List[str]:
+        """Get the top-level modules that logged the most buffered records"""
+        with self._lock:
+            names = Counter(record.name.split('.')[0] for record in self._records)
+        return [name for name, _ in names.most_common(limit)]
+
+    def get_stats(self):
+        """Get buffer usage"""
+        with self._lock:
+            buffered = len(self._records)
+        return {'buffered': buffered, 'capacity': self.capacity}
+
+def _args(args) -> tuple:
+    """Get the values of a record's %-style arguments"""
+    return tuple(args.values()) if isinstance(args, dict) else args
+
+class RawQueueHandler(logging.handlers.QueueHandler):
+    """Queue records as they are, leaving all formatting to the listener.
+
+    The stock handler formats each record, traceback included, on the
+    thread that logs it. The queue here never leaves the process, so the
+    record needs no pickling; only arguments that could change before the
+    listener gets to them are rendered into the message first.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.args and not all(isinstance(arg, IMMUTABLE_ARGS) for arg in _args(record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+# Global log buffer instance
+log_buffer = RingBufferHandler()
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging(level: str = None):
+    """Route logging through a queue to stderr and the ring buffer.
+
+    Code that logs only puts the record on a queue; a listener thread does
+    the formatting (tracebacks included) and stream I/O, so logging never
+    blocks the event loop or the webhook. The level comes from LOG_LEVEL
+    (default INFO).
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(RawQueueHandler(log_queue))
+    root.setLevel(level)
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+
+    _listener = logging.handlers.QueueListener(log_queue, console, log_buffer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
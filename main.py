@@ -1,4 +1,6 @@
 from app import app
 
 if __name__ == '__main__':
-    app.run()
+    import os
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -1,10 +1,27 @@
 import os
+import time
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from user_states import UserStateManager
 from cleanup_system import cleanup_system
-import psutil
+from dispatcher import update_dispatcher
+from update_dedup import update_deduplicator
+from conversion_executor import conversion_executor
+from job_journal import job_journal
+from fair_scheduler import fair_scheduler
+from downloads import file_downloader
+from prefetch import upload_prefetcher
+from result_cache import result_cache
+from delivery import document_delivery
+from workspace import workspace_registry
+from disk_quota import disk_quota
+from temp_tracker import temp_tracker
+from disk_pressure import disk_pressure_watcher
+from jobs import OPERATION_NAMES
+from stats_sampler import stats_sampler
+from tracing import tracer
+from broadcast import broadcaster
 
 logger = logging.getLogger(__name__)
 
@@ -32,24 +49,103 @@ class MasterControl:
     def get_system_stats(self):
         """Get system statistics"""
         try:
-            # CPU and Memory stats
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
+            # Server stats come from the background sampler; sample now
+            # only if it has not run yet
+            sample = stats_sampler.latest() or stats_sampler.sample()
             
-            # Temp file stats
-            temp_files, temp_size = cleanup_system.get_temp_stats()
+            # Update dispatcher stats
+            dispatcher_stats = update_dispatcher.get_stats()
+            executor_stats = conversion_executor.get_stats()
+            dedup_stats = update_deduplicator.get_stats()
+            session_stats = UserStateManager().get_stats()
+            journal_stats = job_journal.get_stats()
+            scheduler_stats = fair_scheduler.get_stats()
+            download_stats = file_downloader.get_stats()
+            prefetch_stats = upload_prefetcher.get_stats()
+            cache_stats = result_cache.get_stats()
+            delivery_stats = document_delivery.get_stats()
+            workspace_stats = workspace_registry.get_stats()
+            quota_stats = disk_quota.get_stats()
+            leak_stats = temp_tracker.get_stats()
+            pressure_stats = disk_pressure_watcher.get_stats()
+            trace_stats = tracer.get_stats()
             
             stats = {
-                'cpu_percent': cpu_percent,
-                'memory_used': memory.used,
-                'memory_total': memory.total,
-                'memory_percent': memory.percent,
-                'disk_used': disk.used,
-                'disk_total': disk.total,
-                'disk_percent': (disk.used / disk.total) * 100,
-                'temp_files': temp_files,
-                'temp_size': temp_size
+                'cpu_percent': sample['cpu_percent'],
+                'memory_used': sample['memory_used'],
+                'memory_total': sample['memory_total'],
+                'memory_percent': sample['memory_percent'],
+                'rss': sample['rss'],
+                'disk_used': sample['disk_used'],
+                'disk_total': sample['disk_total'],
+                'disk_percent': sample['disk_percent'],
+                'temp_files': sample['temp_files'],
+                'temp_size': sample['temp_size'],
+                'sample_age': time.time() - sample['time'],
+                'trends': stats_sampler.trends(),
+                'trend_minutes': stats_sampler.window_minutes,
+                'disk_reserved': quota_stats['reserved'],
+                'disk_reservation_holders': quota_stats['holders'],
+                'disk_waiting': quota_stats['waiting'],
+                'disk_queued': quota_stats['queued'],
+                'disk_cleanups': quota_stats['cleanups'],
+                'disk_watermark': quota_stats['watermark'],
+                'temp_outputs_tracked': leak_stats['tracked'],
+                'temp_output_leaks': leak_stats['leaks'],
+                'temp_output_leaked_bytes': leak_stats['leaked_bytes'],
+                'pressure_high_watermark': pressure_stats['high_watermark'],
+                'pressure_low_watermark': pressure_stats['low_watermark'],
+                'pressure_triggered': pressure_stats['triggered'],
+                'pressure_deepest_pass': pressure_stats['deepest_pass'],
+                'pressure_freed': pressure_stats['freed'],
+                'updates_queued': dispatcher_stats['queued'],
+                'updates_in_flight': dispatcher_stats['in_flight'],
+                'updates_max_concurrency': dispatcher_stats['max_concurrency'],
+                'updates_processed': dispatcher_stats['processed'],
+                'updates_failed': dispatcher_stats['failed'],
+                'updates_shed': dispatcher_stats['shed'] + dispatcher_stats['dropped'],
+                'updates_shedding': dispatcher_stats['shedding'],
+                'duplicate_updates': dedup_stats['hits'],
+                'session_backend': session_stats['backend'],
+                'sessions': session_stats['sessions'],
+                'session_bytes': session_stats['bytes'],
+                'conversion_workers': executor_stats['workers'],
+                'conversions_completed': executor_stats['completed'],
+                'conversions_failed': executor_stats['failed'],
+                'conversion_timeouts': executor_stats['timeouts'],
+                'conversions_resubmitted': executor_stats['resubmitted'],
+                'journaled_jobs': journal_stats['jobs'],
+                'unfinished_jobs': journal_stats['unfinished'],
+                'job_slots': scheduler_stats['slots'],
+                'jobs_running': scheduler_stats['running'],
+                'jobs_waiting': scheduler_stats['waiting'],
+                'jobs_rate_limited': scheduler_stats['rejected'],
+                'jobs_delayed': scheduler_stats['delayed'],
+                'files_downloaded': download_stats['downloaded'],
+                'download_bytes': download_stats['bytes'],
+                'download_retries': download_stats['retried'],
+                'download_failures': download_stats['failed'],
+                'staging_sessions': prefetch_stats['sessions'],
+                'prefetch_hits': prefetch_stats['hits'],
+                'prefetch_misses': prefetch_stats['misses'],
+                'cache_entries': cache_stats['entries'],
+                'cache_bytes': cache_stats['bytes'],
+                'cache_max_bytes': cache_stats['max_bytes'],
+                'cache_hits': cache_stats['hits'],
+                'cache_misses': cache_stats['misses'],
+                'cache_hit_rate': cache_stats['hit_rate'],
+                'cache_evictions': cache_stats['evictions'],
+                'delivered_files': delivery_stats['entries'],
+                'deliveries_resent': delivery_stats['resent'],
+                'deliveries_uploaded': delivery_stats['uploaded'],
+                'delivery_ids_stale': delivery_stats['stale'],
+                'workspaces_live': workspace_stats['live'],
+                'workspaces_removed': workspace_stats['removed'],
+                'workspace_orphans_removed': workspace_stats['orphans_removed'],
+                'live_workspaces': workspace_registry.live_workspaces(),
+                'traces_recent': trace_stats['recent'],
+                'traces_exported': trace_stats['exported'],
+                'slowest_jobs': tracer.slowest(5)
             }
             
             return stats
@@ -155,17 +251,86 @@ async def handle_master_stats(query, context):
     stats = master_control.get_system_stats()
     
     if stats:
+        # Longest-running jobs first
+        workspace_lines = "".join(
+            f"\n• `{workspace['job_id'][:8]}` {OPERATION_NAMES.get(workspace['operation'], workspace['operation'])}, "
+            f"{workspace['age']:.0f}s, {workspace['files']} files / {workspace['bytes']/1024/1024:.1f} MB"
+            for workspace in stats['live_workspaces'][:5]
+        )
+        
+        # Slowest recent jobs and the stage that took longest
+        slowest_lines = "".join(
+            f"\n• `{job['job_id'][:8]}` {OPERATION_NAMES.get(job['operation'], job['operation'])}, "
+            f"{job['duration']:.1f}s {job['outcome']}, mostly {job['dominant_stage']} ({job['dominant_stage_seconds']:.1f}s)"
+            + (f", slowest step `{job['dominant_span']}` ({job['dominant_span_seconds']:.1f}s)" if job['dominant_span'] else "")
+            for job in stats['slowest_jobs']
+        ) or "\n• None yet"
+        
+        # Recent trends from the stats sampler
+        trend_formats = [
+            ('CPU', 'cpu_percent', lambda value: f"{value:.0f}%"),
+            ('Memory', 'memory_percent', lambda value: f"{value:.0f}%"),
+            ('Bot RSS', 'rss', lambda value: f"{value/1024/1024:.0f}MB"),
+            ('Disk', 'disk_percent', lambda value: f"{value:.1f}%"),
+            ('Temp files', 'temp_files', lambda value: f"{value:.0f}"),
+            ('Queue depth', 'queue_depth', lambda value: f"{value:.0f}")
+        ]
+        trend_lines = "".join(
+            f"\n• {label}: {' / '.join(format_value(value) for value in stats['trends'][field])}"
+            for label, field, format_value in trend_formats if field in stats['trends']
+        )
         text = f"""
 📊 **System Statistics**
 
-**💻 Server Performance:**
+**💻 Server Performance:** (sampled {stats['sample_age']:.0f}s ago)
 • CPU Usage: {stats['cpu_percent']:.1f}%
 • Memory: {stats['memory_used']/1024/1024/1024:.1f}GB / {stats['memory_total']/1024/1024/1024:.1f}GB ({stats['memory_percent']:.1f}%)
+• Bot RSS: {stats['rss']/1024/1024:.0f}MB (including workers)
 • Disk: {stats['disk_used']/1024/1024/1024:.1f}GB / {stats['disk_total']/1024/1024/1024:.1f}GB ({stats['disk_percent']:.1f}%)
 
+**📈 Last {stats['trend_minutes']:.0f} min (min / avg / max):**{trend_lines}
+
 **🗂️ Temporary Files:**
 • Count: {stats['temp_files']} files
 • Size: {stats['temp_size']/1024/1024:.2f} MB
+• Disk reserved: {stats['disk_reserved']/1024/1024:.0f} MB by {stats['disk_reservation_holders']} jobs, {stats['disk_waiting']} waiting ({stats['disk_queued']} queued so far)
+• Early cleanups: {stats['disk_cleanups']} (watermark {stats['disk_watermark']:.0f}%)
+• Disk pressure cleanups: {stats['pressure_triggered']} (above {stats['pressure_high_watermark']:.0f}% until {stats['pressure_low_watermark']:.0f}%, deepest pass {stats['pressure_deepest_pass']}, {stats['pressure_freed']/1024/1024:.1f} MB freed)
+• Temp PDFs tracked: {stats['temp_outputs_tracked']}, leaked & reclaimed: {stats['temp_output_leaks']} ({stats['temp_output_leaked_bytes']/1024/1024:.1f} MB)
+
+**👤 Sessions ({stats['session_backend']}):**
+• Active: {stats['sessions']}
+• Size: {stats['session_bytes']/1024:.1f} KB
+
+**📥 Update Dispatcher:**
+• Queued: {stats['updates_queued']}
+• In flight: {stats['updates_in_flight']} / {stats['updates_max_concurrency']}
+• Processed: {stats['updates_processed']} ({stats['updates_failed']} failed)
+• Shed: {stats['updates_shed']}{' (shedding now)' if stats['updates_shedding'] else ''}
+• Duplicate deliveries dropped: {stats['duplicate_updates']}
+
+**⚙️ Conversion Pool:**
+• Workers: {stats['conversion_workers']}
+• Completed: {stats['conversions_completed']} ({stats['conversions_failed']} failed, {stats['conversion_timeouts']} timed out, {stats['conversions_resubmitted']} resubmitted after a recycle)
+• Job slots: {stats['jobs_running']} / {stats['job_slots']} busy, {stats['jobs_waiting']} waiting
+• Rate limited: {stats['jobs_rate_limited']}, delayed: {stats['jobs_delayed']}
+• Downloads: {stats['files_downloaded']} files, {stats['download_bytes']/1024/1024:.1f} MB ({stats['download_retries']} retries, {stats['download_failures']} failed)
+• Prefetch: {stats['staging_sessions']} staging sessions, {stats['prefetch_hits']} hits / {stats['prefetch_misses']} misses
+• Journaled jobs: {stats['journaled_jobs']} ({stats['unfinished_jobs']} unfinished)
+
+**🗃️ Result Cache:**
+• Entries: {stats['cache_entries']} ({stats['cache_bytes']/1024/1024:.1f} / {stats['cache_max_bytes']/1024/1024:.0f} MB)
+• Hits: {stats['cache_hits']} / misses: {stats['cache_misses']} ({stats['cache_hit_rate']:.1f}% hit rate)
+• Evictions: {stats['cache_evictions']}
+• Deliveries: {stats['deliveries_resent']} resent by file ID, {stats['deliveries_uploaded']} uploaded ({stats['delivery_ids_stale']} stale IDs)
+• Known file IDs: {stats['delivered_files']}
+
+**🧰 Job Workspaces:**
+• Live: {stats['workspaces_live']}{workspace_lines}
+• Torn down: {stats['workspaces_removed']} ({stats['workspace_orphans_removed']} orphans swept)
+
+**🐢 Slowest Jobs (last {stats['traces_recent']}):**{slowest_lines}
+• Traces exported: {stats['traces_exported']}
 
 **⏰ Last Updated:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         """
@@ -221,8 +386,47 @@ async def handle_master_broadcast_request(query, context):
     await query.edit_message_text(
         "📢 **Broadcast Message**\n\n"
         "Type the message you want to send to all bot users:\n\n"
-        "**Note:** This will be sent to everyone who has used the bot.",
+        f"**Note:** This will be sent to everyone who has used the bot ({broadcaster.get_stats()['chats']} chats).",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("📊 Last Broadcast", callback_data="master_broadcast_status")
+        ]]),
+        parse_mode='Markdown'
+    )
+
+async def handle_master_broadcast_status(query, context):
+    """Show the progress of the latest broadcast"""
+    stats = broadcaster.get_stats()
+    broadcast = stats['latest']
+    keyboard = [[InlineKeyboardButton("🔄 Refresh", callback_data="master_broadcast_status"),
+                 InlineKeyboardButton("🏠 Main Panel", callback_data="master_panel")]]
+    
+    if broadcast is None:
+        text = "📢 **Broadcasts**\n\nNo broadcast has been sent yet."
+        keyboard = [[InlineKeyboardButton("🏠 Main Panel", callback_data="master_panel")]]
+    else:
+        done = broadcast['sent'] + broadcast['failed'] + broadcast['unreachable']
+        text = (
+            f"📢 **Broadcast #{broadcast['id']}** ({broadcast['status']})\n\n"
+            f"• Progress: {done} / {broadcast['total']} chats\n"
+            f"• Sent: {broadcast['sent']}\n"
+            f"• Failed: {broadcast['failed']}\n"
+            f"• Blocked or deleted: {broadcast['unreachable']}\n"
+            f"• Rate: {stats['rate']:.1f} msg/s ({stats['rate_limited']} rate limits, {stats['paused']}s paused for user traffic)\n\n"
+            f"**⏰ Last Updated:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        )
+        if broadcast['status'] in ('queued', 'running'):
+            keyboard.insert(0, [InlineKeyboardButton("⏹️ Cancel Broadcast", callback_data="master_broadcast_cancel")])
+    
+    await query.edit_message_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     )
 
+async def handle_master_broadcast_cancel(query, context):
+    """Cancel unfinished broadcasts"""
+    cancelled = broadcaster.cancel()
+    logger.info(f"Master cancelled {cancelled} broadcasts")
+    await handle_master_broadcast_status(query, context)
+
 from datetime import datetime
\ No newline at end of file
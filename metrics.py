@@ -0,0 +1,225 @@
+import math
+import time
+import bisect
+import logging
+from typing import Callable, Dict, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a fast text PDF to a slow OCR or AI job
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _format_value(value: float) -> str:
+    """Format a sample value for the text exposition format"""
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value) -> str:
+    """Escape a label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Format a label set, e.g. {operation="img2pdf"}"""
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+class _Metric:
+    """A named metric with optional labels"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._function = None
+
+    def labels(self, *values):
+        """Get the child metric for one combination of label values"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the (unlabeled) value from ``function`` at scrape time"""
+        self._function = function
+        return self
+
+    def _new_child(self):
+        """Create the value for a new label combination"""
+        raise NotImplementedError
+
+    def samples(self):
+        """Yield (suffix, label names, label values, value) for the exposition"""
+        if self._function is not None:
+            yield '', (), (), self._function()
+            return
+        for values, child in list(self._children.items()):
+            yield '', self.labelnames, values, child.value
+
+class _Value:
+    """A counter or gauge value"""
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        """Add to the value"""
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        """Subtract from the value"""
+        self.value -= amount
+
+    def set(self, value: float):
+        """Replace the value"""
+        self.value = value
+
+class Counter(_Metric):
+    """A value that only goes up"""
+
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        """Increment the unlabeled counter"""
+        self.labels().inc(amount)
+
+class Gauge(_Metric):
+    """A value that goes up and down"""
+
+    type_name = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        """Set the unlabeled gauge"""
+        self.labels().set(value)
+
+class _HistogramValue:
+    """Bucket counts, sum and count of one histogram child"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Record one observation"""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        """Time a block and observe its duration in seconds"""
+        return _Timer(self)
+
+class _Timer:
+    """Context manager observing the wall time of its block"""
+
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+class Histogram(_Metric):
+    """Fixed-bucket distribution of observed values"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        """Observe a value on the unlabeled histogram"""
+        self.labels().observe(value)
+
+    def samples(self):
+        """Yield cumulative buckets, sum and count for every label combination"""
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                yield '_bucket', self.labelnames + ('le',), values + (_format_value(bound),), cumulative
+            yield '_sum', self.labelnames, values, child.sum
+            yield '_count', self.labelnames, values, child.count
+
+class MetricsRegistry:
+    """Counters, gauges and histograms served in the Prometheus text format.
+
+    Updates are plain attribute arithmetic with no locking, so metrics
+    must be updated from the event loop thread. Values owned by other
+    threads are exposed through ``set_function``, which reads them at
+    scrape time.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        """Add a metric, or return the one already registered under its name"""
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Register a counter"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Register a gauge"""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Register a histogram"""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render every metric in the text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                logger.warning(f"Could not collect metric {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for suffix, names, values, value in samples:
+                lines.append(f"{metric.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+# Global metrics registry instance
+metrics_registry = MetricsRegistry()
@@ -1,32 +1,95 @@
+import io
 import os
 import tempfile
-from fpdf import FPDF
-from reportlab.lib.pagesizes import letter, A4, legal
-from reportlab.lib.colors import black, blue, red, green
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from PyPDF2 import PdfWriter, PdfReader
-from PIL import Image
 import logging
+import contextlib
+from temp_tracker import temp_tracker, TEMP_OUTPUT_PREFIX
+from tracing import tracer
 
-# OCR imports (optional - will fallback if not available)
-try:
-    import pytesseract
-    import cv2
-    import numpy as np
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+# Heavy libraries (ReportLab, fpdf, PyPDF2, Pillow, OpenCV, pytesseract) are
+# imported inside the functions that use them, so importing this module is
+# cheap and each feature only pays for its own dependencies on first use.
 
 logger = logging.getLogger(__name__)
 
-def create_text_pdf(text, font='arial', color='black', size='a4', password=None):
+_ocr_available = None
+
+def is_ocr_available():
+    """Check (once) whether the optional OCR dependencies are installed"""
+    global _ocr_available
+    if _ocr_available is None:
+        try:
+            import pytesseract  # noqa: F401
+            import cv2  # noqa: F401
+            _ocr_available = True
+        except ImportError:
+            _ocr_available = False
+    return _ocr_available
+
+# Converters read inputs from a path or a binary file-like object. They
+# write to ``output`` when one is given (e.g. io.BytesIO) and return it;
+# otherwise they write to a new temp file and return its path.
+
+def new_pdf_output(output=None, password=None):
+    """Get where a converter builds its PDF.
+
+    With a password the unprotected build is only an intermediate, so it
+    stays in memory when the caller asked for in-memory output.
+    """
+    if output is not None:
+        return io.BytesIO() if password else output
+    temp_fd, temp_path = tempfile.mkstemp(prefix=TEMP_OUTPUT_PREFIX, suffix='.pdf')
+    os.close(temp_fd)
+    temp_tracker.track(temp_path)
+    return temp_path
+
+def discard_pdf_output(target):
+    """Delete a temp file output; in-memory outputs are just dropped"""
+    if isinstance(target, str):
+        if os.path.exists(target):
+            os.unlink(target)
+        temp_tracker.untrack(target)
+
+def open_pdf_output(target):
+    """Open a converter's result for reading, whether a path or a buffer"""
+    if isinstance(target, str):
+        return open(target, 'rb')
+    target.seek(0)
+    return contextlib.nullcontext(target)
+
+def describe_pdf_output(target):
+    """Describe a converter's result for log messages"""
+    if isinstance(target, str):
+        return target
+    return f"memory ({target.getbuffer().nbytes} bytes)"
+
+def _rewind(source):
+    """Return an input ready to read from the start"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+def _finish_pdf_output(target, output, password, kind):
+    """Apply the optional password and return the converter's result"""
+    if password:
+        with tracer.span('pdf.encrypt'):
+            protected = add_password_protection(target, password, output=output)
+        discard_pdf_output(target)
+        logger.info(f"Password-protected {kind} PDF created successfully: {describe_pdf_output(protected)}")
+        return protected
+
+    logger.info(f"{kind} PDF created successfully: {describe_pdf_output(target)}")
+    return target
+
+def create_text_pdf(text, font='arial', color='black', size='a4', password=None, output=None):
     """Create a PDF from text with styling options"""
+    from reportlab.lib.pagesizes import letter, A4, legal
+    from reportlab.lib.colors import black, blue, red, green
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     
-    # Create temporary file
-    temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    # Create the output file or buffer
+    target = new_pdf_output(output, password)
     
     try:
         # Define page sizes
@@ -46,7 +109,7 @@ def create_text_pdf(text, font='arial', color='black', size='a4', password=None)
         
         # Create document
         doc = SimpleDocTemplate(
-            temp_path,
+            target,
             pagesize=page_sizes.get(size, A4),
             rightMargin=72,
             leftMargin=72,
@@ -94,27 +157,20 @@ def create_text_pdf(text, font='arial', color='black', size='a4', password=None)
         doc.build(story)
         
         # Add password protection if specified
-        if password:
-            protected_path = add_password_protection(temp_path, password)
-            os.unlink(temp_path)  # Remove unprotected version
-            logger.info(f"Password-protected text PDF created successfully: {protected_path}")
-            return protected_path
-        
-        logger.info(f"Text PDF created successfully: {temp_path}")
-        return temp_path
+        return _finish_pdf_output(target, output, password, 'Text')
         
     except Exception as e:
         logger.error(f"Error creating text PDF: {e}")
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        discard_pdf_output(target)
         raise
 
-def create_image_pdf(image_paths, orientation='portrait', password=None):
+def create_image_pdf(image_paths, orientation='portrait', password=None, output=None):
     """Create a PDF from multiple images with optimization"""
+    from fpdf import FPDF
+    from PIL import Image
     
-    # Create temporary file
-    temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    # Create the output file or buffer
+    target = new_pdf_output(output, password)
     
     try:
         # Create FPDF instance
@@ -134,32 +190,36 @@ def create_image_pdf(image_paths, orientation='portrait', password=None):
         for image_path in image_paths:
             try:
                 # Open and process image
-                with Image.open(image_path) as img:
-                    # Convert to RGB if needed
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        background = Image.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'P':
-                            img = img.convert('RGBA')
-                        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                        img = background
-                    elif img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # Auto-rotate based on EXIF data
-                    try:
-                        from PIL import ExifTags
-                        if hasattr(img, 'getexif'):
-                            exif = img.getexif()
-                            if exif is not None:
-                                orientation = exif.get(ExifTags.ORIENTATION)
-                                if orientation == 3:
-                                    img = img.rotate(180, expand=True)
-                                elif orientation == 6:
-                                    img = img.rotate(270, expand=True)
-                                elif orientation == 8:
-                                    img = img.rotate(90, expand=True)
-                    except:
-                        pass  # Skip if EXIF processing fails
+                with Image.open(_rewind(image_path)) as img:
+                    # Decode, convert and rotate
+                    with tracer.span('image.decode', pixels=img.size[0] * img.size[1]):
+                        img.load()
+                        
+                        # Convert to RGB if needed
+                        if img.mode in ('RGBA', 'LA', 'P'):
+                            background = Image.new('RGB', img.size, (255, 255, 255))
+                            if img.mode == 'P':
+                                img = img.convert('RGBA')
+                            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+                            img = background
+                        elif img.mode != 'RGB':
+                            img = img.convert('RGB')
+                        
+                        # Auto-rotate based on EXIF data
+                        try:
+                            from PIL import ExifTags
+                            if hasattr(img, 'getexif'):
+                                exif = img.getexif()
+                                if exif is not None:
+                                    orientation = exif.get(ExifTags.ORIENTATION)
+                                    if orientation == 3:
+                                        img = img.rotate(180, expand=True)
+                                    elif orientation == 6:
+                                        img = img.rotate(270, expand=True)
+                                    elif orientation == 8:
+                                        img = img.rotate(90, expand=True)
+                        except:
+                            pass  # Skip if EXIF processing fails
                     
                     # Calculate scaling to fit page
                     img_width, img_height = img.size
@@ -179,151 +239,170 @@ def create_image_pdf(image_paths, orientation='portrait', password=None):
                     if scale < 1.0:
                         new_width = int(img_width * scale)
                         new_height = int(img_height * scale)
-                        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                        with tracer.span('image.resize'):
+                            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
                     
-                    # Save optimized image temporarily
-                    optimized_path = f"{image_path}_optimized.jpg"
-                    img.save(optimized_path, 'JPEG', quality=85, optimize=True)
+                    # Encode the optimized image in memory
+                    optimized_image = io.BytesIO()
+                    with tracer.span('image.encode'):
+                        img.save(optimized_image, 'JPEG', quality=85, optimize=True)
                     
                     # Add page and image to PDF
                     pdf.add_page()
-                    pdf.image(optimized_path, x=x, y=y, w=final_width, h=final_height)
-                    
-                    # Clean up optimized image
-                    if os.path.exists(optimized_path):
-                        os.unlink(optimized_path)
+                    pdf.image(optimized_image, x=x, y=y, w=final_width, h=final_height)
                         
             except Exception as e:
                 logger.error(f"Error processing image {image_path}: {e}")
                 continue
         
         # Output PDF
-        pdf.output(temp_path)
+        with tracer.span('pdf.write', pages=len(pdf.pages)):
+            pdf.output(target)
         
         # Add password protection if specified
-        if password:
-            protected_path = add_password_protection(temp_path, password)
-            os.unlink(temp_path)  # Remove unprotected version
-            logger.info(f"Password-protected image PDF created successfully: {protected_path}")
-            return protected_path
-        
-        logger.info(f"Image PDF created successfully: {temp_path}")
-        return temp_path
+        return _finish_pdf_output(target, output, password, 'Image')
         
     except Exception as e:
         logger.error(f"Error creating image PDF: {e}")
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        discard_pdf_output(target)
         raise
 
-def merge_pdfs(pdf_paths):
+def merge_pdfs(pdf_paths, output=None):
     """Merge multiple PDF files"""
+    from PyPDF2 import PdfWriter, PdfReader
     
-    # Create temporary file
-    temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    # Create the output file or buffer
+    target = new_pdf_output(output)
     
     try:
         writer = PdfWriter()
         
         for pdf_path in pdf_paths:
             try:
-                with open(pdf_path, 'rb') as pdf_file:
-                    reader = PdfReader(pdf_file)
-                    
-                    # Add all pages from the current PDF
-                    for page in reader.pages:
-                        writer.add_page(page)
+                reader = PdfReader(_rewind(pdf_path))
+                
+                # Add all pages from the current PDF
+                for page in reader.pages:
+                    writer.add_page(page)
                         
             except Exception as e:
                 logger.error(f"Error reading PDF {pdf_path}: {e}")
                 continue
         
         # Write merged PDF
-        with open(temp_path, 'wb') as output_file:
-            writer.write(output_file)
+        writer.write(target)
         
-        logger.info(f"PDFs merged successfully: {temp_path}")
-        return temp_path
+        logger.info(f"PDFs merged successfully: {describe_pdf_output(target)}")
+        return target
         
     except Exception as e:
         logger.error(f"Error merging PDFs: {e}")
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        discard_pdf_output(target)
         raise
 
-def split_pdf(pdf_path, page_numbers):
+def split_pdf(pdf_path, page_numbers, output=None):
     """Split PDF and extract specific pages"""
+    from PyPDF2 import PdfWriter, PdfReader
     
-    # Create temporary file
-    temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    # Create the output file or buffer
+    target = new_pdf_output(output)
     
     try:
         writer = PdfWriter()
+        reader = PdfReader(_rewind(pdf_path))
         
-        with open(pdf_path, 'rb') as pdf_file:
-            reader = PdfReader(pdf_file)
-            
-            # Add specified pages (convert to 0-based indexing)
-            for page_num in page_numbers:
-                if 1 <= page_num <= len(reader.pages):
-                    writer.add_page(reader.pages[page_num - 1])
+        # Add specified pages (convert to 0-based indexing)
+        for page_num in page_numbers:
+            if 1 <= page_num <= len(reader.pages):
+                writer.add_page(reader.pages[page_num - 1])
         
         # Write split PDF
-        with open(temp_path, 'wb') as output_file:
-            writer.write(output_file)
+        writer.write(target)
         
-        logger.info(f"PDF split successfully: {temp_path}")
-        return temp_path
+        logger.info(f"PDF split successfully: {describe_pdf_output(target)}")
+        return target
         
     except Exception as e:
         logger.error(f"Error splitting PDF: {e}")
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        discard_pdf_output(target)
         raise
 
-def add_password_protection(pdf_path, password):
+def get_pdf_page_count(pdf_path):
+    """Get the number of pages in a PDF file"""
+    from PyPDF2 import PdfReader
+    
+    reader = PdfReader(_rewind(pdf_path))
+    return len(reader.pages)
+
+# Longest image side that fits an A4 page (10 mm margins) without scaling
+PAGE_IMAGE_MAX_SIDE = 1047
+
+def prepare_image(image_path, max_side=None):
+    """Apply EXIF orientation, convert to RGB and optionally downscale, in place"""
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        if max_side and max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        img.save(image_path, 'JPEG', quality=90)
+    return image_path
+
+def add_password_protection(pdf_path, password, output=None):
     """Add password protection to a PDF file"""
-    # Create temporary file for protected PDF
-    temp_fd, protected_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    from PyPDF2 import PdfWriter, PdfReader
+    
+    # Create the output file or buffer for the protected PDF
+    protected = new_pdf_output(output)
     
     try:
         # Read original PDF
-        with open(pdf_path, 'rb') as input_file:
-            reader = PdfReader(input_file)
-            writer = PdfWriter()
-            
-            # Copy all pages
-            for page in reader.pages:
-                writer.add_page(page)
-            
-            # Encrypt PDF with password
-            writer.encrypt(password, password, use_128bit=True)
-            
-            # Write protected PDF
-            with open(protected_path, 'wb') as output_file:
-                writer.write(output_file)
+        reader = PdfReader(_rewind(pdf_path))
+        writer = PdfWriter()
+        
+        # Copy all pages
+        for page in reader.pages:
+            writer.add_page(page)
+        
+        # Encrypt PDF with password
+        writer.encrypt(password, password, use_128bit=True)
         
-        logger.info(f"Password protection added successfully: {protected_path}")
-        return protected_path
+        # Write protected PDF
+        writer.write(protected)
+        
+        logger.info(f"Password protection added successfully: {describe_pdf_output(protected)}")
+        return protected
         
     except Exception as e:
         logger.error(f"Error adding password protection: {e}")
-        if os.path.exists(protected_path):
-            os.unlink(protected_path)
+        discard_pdf_output(protected)
         raise
 
 def extract_text_from_image(image_path):
     """Extract text from image using OCR (if available)"""
-    if not OCR_AVAILABLE:
+    if not is_ocr_available():
         logger.warning("OCR not available - pytesseract or opencv not installed")
         return None
     
+    import pytesseract
+    import cv2
+    
     try:
         # Read image
-        img = cv2.imread(image_path)
+        if isinstance(image_path, str):
+            img = cv2.imread(image_path)
+        else:
+            import numpy as np
+            img = cv2.imdecode(np.frombuffer(_rewind(image_path).read(), np.uint8), cv2.IMREAD_COLOR)
         if img is None:
             logger.error(f"Could not read image: {image_path}")
             return None
@@ -351,21 +430,24 @@ def extract_text_from_image(image_path):
         logger.error(f"Error extracting text from image: {e}")
         return None
 
-def create_ocr_pdf(image_paths, password=None):
+def create_ocr_pdf(image_paths, password=None, output=None):
     """Create PDF from images with OCR text extraction"""
-    if not OCR_AVAILABLE:
+    if not is_ocr_available():
         # Fallback to regular image PDF if OCR not available
         logger.warning("OCR not available - creating regular image PDF")
-        return create_image_pdf(image_paths, password=password)
+        return create_image_pdf(image_paths, password=password, output=output)
     
-    # Create temporary file
-    temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-    os.close(temp_fd)
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    
+    # Create the output file or buffer
+    target = new_pdf_output(output, password)
     
     try:
         # Create document
         doc = SimpleDocTemplate(
-            temp_path,
+            target,
             pagesize=A4,
             rightMargin=72,
             leftMargin=72,
@@ -378,13 +460,14 @@ def create_ocr_pdf(image_paths, password=None):
         story = []
         
         for i, image_path in enumerate(image_paths):
-            if not os.path.exists(image_path):
+            if isinstance(image_path, str) and not os.path.exists(image_path):
                 logger.warning(f"Image not found: {image_path}")
                 continue
                 
             try:
                 # Extract text from image
-                extracted_text = extract_text_from_image(image_path)
+                with tracer.span('ocr.extract', page=i + 1):
+                    extracted_text = extract_text_from_image(image_path)
                 
                 if extracted_text:
                     # Add page heading
@@ -407,24 +490,17 @@ def create_ocr_pdf(image_paths, password=None):
                 continue
         
         # Build PDF
-        if story:
-            doc.build(story)
-        else:
-            # Create empty PDF if no content
-            doc.build([Paragraph("No text could be extracted from the provided images.", styles['Normal'])])
+        with tracer.span('pdf.write'):
+            if story:
+                doc.build(story)
+            else:
+                # Create empty PDF if no content
+                doc.build([Paragraph("No text could be extracted from the provided images.", styles['Normal'])])
         
         # Add password protection if specified
-        if password:
-            protected_path = add_password_protection(temp_path, password)
-            os.unlink(temp_path)  # Remove unprotected version
-            logger.info(f"Password-protected OCR PDF created successfully: {protected_path}")
-            return protected_path
-        
-        logger.info(f"OCR PDF created successfully: {temp_path}")
-        return temp_path
+        return _finish_pdf_output(target, output, password, 'OCR')
         
     except Exception as e:
         logger.error(f"Error creating OCR PDF: {e}")
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        discard_pdf_output(target)
         raise
@@ -0,0 +1,149 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from typing import Dict, List
+from downloads import file_downloader
+from conversion_executor import conversion_executor
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+class UploadPrefetcher:
+    """Download and preprocess uploads while the user is still sending files.
+
+    Each user's session gets a staging directory. Every upload starts a
+    background task that downloads the file there and preprocesses it in
+    the conversion pool, so when the user presses Done only the final
+    assembly is left. ``collect`` waits for those tasks and downloads
+    anything that was not prefetched (e.g. after a restart). Sessions are
+    released when their job finishes, when the user starts over, or after
+    PREFETCH_TTL_MINUTES without uploads.
+    """
+
+    def __init__(self, root: str = None, ttl_seconds: float = None, max_files: int = None):
+        self.root = root or os.path.join(tempfile.gettempdir(), 'pdfbot_staging')
+        self.ttl_seconds = ttl_seconds or float(os.environ.get('PREFETCH_TTL_MINUTES', 60)) * 60
+        self.max_files = max_files or int(os.environ.get('PREFETCH_MAX_FILES', 50))
+        self._sessions: Dict[int, Dict[str, asyncio.Task]] = {}
+        self._last_used: Dict[int, float] = {}
+        self._loop = None
+        self.prefetched = 0
+        self.hits = 0
+        self.misses = 0
+        self.released = 0
+
+    def _session_dir(self, user_id: int) -> str:
+        """Get the staging directory of a user's session"""
+        return os.path.join(self.root, str(user_id))
+
+    def prefetch(self, bot, user_id: int, file_id: str, suffix: str, prepare=None, *args):
+        """Start downloading an upload, then run ``prepare(path, *args)`` on it"""
+        self._loop = asyncio.get_running_loop()
+        session = self._sessions.setdefault(user_id, {})
+        self._last_used[user_id] = time.time()
+        if file_id in session or len(session) >= self.max_files:
+            return
+
+        session_dir = self._session_dir(user_id)
+        os.makedirs(session_dir, exist_ok=True)
+        path = os.path.join(session_dir, f"{len(session)}{suffix}")
+        task = self._loop.create_task(self._fetch(bot, file_id, path, prepare, args))
+        task.add_done_callback(self._log_failure)
+        session[file_id] = task
+        self.prefetched += 1
+
+    async def _fetch(self, bot, file_id: str, path: str, prepare, args) -> str:
+        """Download one upload into the staging area and preprocess it"""
+        await file_downloader.download_all(bot, [file_id], [path])
+        if prepare:
+            await conversion_executor.run(prepare, path, *args)
+        return path
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        """Log (and so retrieve) a failed prefetch; collect() falls back to a download"""
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Prefetch failed: {task.exception()}")
+
+    async def collect(self, bot, user_id: int, file_ids: List[str], paths: List[str]) -> List[str]:
+        """Get local paths for ``file_ids`` in order.
+
+        Prefetched files are returned from the staging area; the rest are
+        downloaded to the matching entry of ``paths``.
+        """
+        session = self._sessions.get(user_id, {})
+        results = list(paths)
+        missing = []
+        with tracer.span('prefetch.wait') as span:
+            for index, file_id in enumerate(file_ids):
+                task = session.get(file_id)
+                if task is None:
+                    missing.append(index)
+                    continue
+                try:
+                    results[index] = await task
+                    self.hits += 1
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        raise
+                    missing.append(index)
+                except Exception:
+                    missing.append(index)
+            span['prefetched'] = len(file_ids) - len(missing)
+
+        if missing:
+            self.misses += len(missing)
+            await file_downloader.download_all(
+                bot, [file_ids[index] for index in missing], [paths[index] for index in missing]
+            )
+        return results
+
+    def release(self, user_id: int):
+        """Cancel a session's prefetches and delete its staged files"""
+        session = self._sessions.pop(user_id, None)
+        self._last_used.pop(user_id, None)
+        if session:
+            for task in session.values():
+                task.cancel()
+            self.released += 1
+        shutil.rmtree(self._session_dir(user_id), ignore_errors=True)
+
+    def _release_idle(self):
+        """Release sessions without uploads for longer than the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        idle = [user_id for user_id, used in self._last_used.items() if used < cutoff]
+        for user_id in idle:
+            self.release(user_id)
+
+        # Staging directories left over from an earlier process
+        if os.path.isdir(self.root):
+            for entry in os.scandir(self.root):
+                if entry.name.isdigit() and int(entry.name) not in self._sessions \
+                        and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+        if idle:
+            logger.info(f"Released {len(idle)} abandoned upload sessions")
+
+    def release_idle_sessions(self):
+        """Release abandoned sessions; safe to call from the scheduler thread"""
+        if self._loop is None or self._loop.is_closed():
+            # Nothing was prefetched in this process; only old directories remain
+            self._release_idle()
+        else:
+            self._loop.call_soon_threadsafe(self._release_idle)
+
+    def get_stats(self):
+        """Get staging area counters"""
+        return {
+            'sessions': len(self._sessions),
+            'prefetched': self.prefetched,
+            'hits': self.hits,
+            'misses': self.misses,
+            'released': self.released
+        }
+
+# Global upload prefetcher instance
+upload_prefetcher = UploadPrefetcher()
@@ -0,0 +1,178 @@
+import io
+import os
+import json
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional
+from metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """Cache generated PDFs on disk, keyed on their inputs.
+
+    A key is a hash of the operation, the Telegram ``file_unique_id`` of
+    every input (in order) and the operation's parameters, so resending the
+    same file with the same settings skips both the download and the
+    conversion. Entries are evicted least recently used first once the
+    cache grows past its byte budget. The index is rebuilt from the cache
+    directory on start, ordered by last use. Entries are read and written
+    in a worker thread so the event loop never waits on the disk.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None, max_entry_bytes: int = None):
+        self.path = path or os.environ.get(
+            'RESULT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pdfbot_cache')
+        )
+        self.max_bytes = max_bytes or int(os.environ.get('RESULT_CACHE_MAX_MB', 200)) * 1024 * 1024
+        self.max_entry_bytes = max_entry_bytes or int(os.environ.get('RESULT_CACHE_MAX_ENTRY_MB', 20)) * 1024 * 1024
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the index from the files already in the cache directory"""
+        os.makedirs(self.path, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+            elif entry.name.endswith('.part'):
+                os.unlink(entry.path)
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._bytes += size
+        if entries:
+            logger.info(f"Result cache loaded {len(entries)} entries ({self._bytes / 1024 / 1024:.1f} MB)")
+
+    def _entry_path(self, key: str) -> str:
+        """Get the file holding a cache entry"""
+        return os.path.join(self.path, f"{key}.pdf")
+
+    @staticmethod
+    def make_key(operation: str, unique_ids: List[Optional[str]], **params: Any) -> Optional[str]:
+        """Build a cache key, or None if any input's file_unique_id is unknown"""
+        if not unique_ids or any(unique_id is None for unique_id in unique_ids):
+            return None
+        material = json.dumps([operation, list(unique_ids), params], sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    async def get(self, key: Optional[str]) -> Optional[io.BytesIO]:
+        """Get a copy of a cached result, marking it recently used"""
+        if key is None:
+            return None
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return await asyncio.to_thread(self._read, key)
+
+    def _read(self, key: str) -> Optional[io.BytesIO]:
+        """Read a cache entry into memory"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as cached_file:
+                result = io.BytesIO(cached_file.read())
+            os.utime(path)
+        except FileNotFoundError:
+            # Removed behind our back (e.g. by disk cleanup)
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return result
+
+    async def put(self, key: Optional[str], result):
+        """Store a result given as a file path or an in-memory buffer"""
+        if key is None:
+            return
+        await asyncio.to_thread(self._store, key, result)
+
+    def _store(self, key: str, result):
+        """Write a cache entry and evict older ones past the budget"""
+        size = os.path.getsize(result) if isinstance(result, str) else result.getbuffer().nbytes
+        if size > self.max_entry_bytes:
+            return
+
+        # Write under a temporary name so readers never see a partial file
+        path = self._entry_path(key)
+        part_path = f"{path}.part"
+        try:
+            if isinstance(result, str):
+                shutil.copyfile(result, part_path)
+            else:
+                with open(part_path, 'wb') as part_file:
+                    part_file.write(result.getbuffer())
+            os.replace(part_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache result {key}: {e}")
+            if os.path.exists(part_path):
+                os.unlink(part_path)
+            return
+
+        with self._lock:
+            self._bytes += size - self._entries.get(key, 0)
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+        # Keep the entry just stored even if it alone exceeds the budget
+        self._evict(self.max_bytes, keep=1)
+
+    def _evict(self, max_bytes: int, keep: int = 0) -> int:
+        """Evict least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            evicted = []
+            freed = 0
+            while self._bytes > max_bytes and len(self._entries) > keep:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                freed += old_size
+                evicted.append(old_key)
+            self.evictions += len(evicted)
+
+        for old_key in evicted:
+            try:
+                os.unlink(self._entry_path(old_key))
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def trim(self, share: float) -> int:
+        """Shrink the cache to a share of its budget to free disk; return the bytes freed"""
+        return self._evict(int(self.max_bytes * share))
+
+    def get_stats(self):
+        """Get cache size and hit/miss/eviction counts"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups * 100) if lookups else 0.0
+            }
+
+# Global result cache instance
+result_cache = ResultCache()
+
+metrics_registry.counter('pdfbot_result_cache_hits_total', 'Result cache hits').set_function(
+    lambda: result_cache.hits)
+metrics_registry.counter('pdfbot_result_cache_misses_total', 'Result cache misses').set_function(
+    lambda: result_cache.misses)
+metrics_registry.gauge('pdfbot_result_cache_bytes', 'Size of the result cache').set_function(
+    lambda: result_cache.get_stats()['bytes'])
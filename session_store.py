@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# A session is {'state': Optional[str], 'data': Dict[str, Any]}
+
+# How stale a session's access time may get before a read refreshes it
+TOUCH_INTERVAL_SECONDS = 60
+
+class InMemorySessionStore:
+    """Keep sessions in this process with LRU and idle-TTL eviction"""
+
+    def __init__(self, max_sessions: int = None, ttl_seconds: float = None):
+        self.max_sessions = max_sessions or int(os.environ.get('SESSION_MAX', 10000))
+        self.ttl_seconds = ttl_seconds or float(os.environ.get('SESSION_TTL_HOURS', 24)) * 3600
+        self._sessions: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._last_access: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def load(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get a user's session and mark it as recently used"""
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                return None
+            self._sessions.move_to_end(user_id)
+            self._last_access[user_id] = time.time()
+            return session
+
+    def save(self, user_id: int, session: Dict[str, Any]):
+        """Store a user's session, evicting the least recently used if full"""
+        with self._lock:
+            self._sessions[user_id] = session
+            self._sessions.move_to_end(user_id)
+            self._last_access[user_id] = time.time()
+            while len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                self._last_access.pop(evicted, None)
+                logger.debug(f"Session of user {evicted} evicted (LRU)")
+
+    def delete(self, user_id: int):
+        """Remove a user's session"""
+        with self._lock:
+            self._sessions.pop(user_id, None)
+            self._last_access.pop(user_id, None)
+
+    def active_user_ids(self) -> List[int]:
+        """Get users whose session has a state"""
+        with self._lock:
+            return [user_id for user_id, session in self._sessions.items() if session.get('state')]
+
+    def evict_expired(self, ttl_seconds: float = None) -> int:
+        """Remove sessions idle for longer than the TTL"""
+        cutoff = time.time() - (ttl_seconds or self.ttl_seconds)
+        with self._lock:
+            expired = [user_id for user_id, accessed in self._last_access.items() if accessed < cutoff]
+            for user_id in expired:
+                self._sessions.pop(user_id, None)
+                del self._last_access[user_id]
+        return len(expired)
+
+    def get_stats(self):
+        """Get session count and approximate size"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            'backend': 'memory',
+            'sessions': len(sessions),
+            'bytes': sum(len(json.dumps(session, default=str)) for session in sessions)
+        }
+
+class SQLiteSessionStore:
+    """Keep sessions in a SQLite database shared by all worker processes.
+
+    The database runs in WAL mode so readers never block the writer, and it
+    survives restarts. Each thread gets its own connection.
+    """
+
+    def __init__(self, path: str = None, ttl_seconds: float = None):
+        self.path = path or os.environ.get(
+            'SESSION_DB_PATH', os.path.join(tempfile.gettempdir(), 'pdfbot_sessions.db')
+        )
+        self.ttl_seconds = ttl_seconds or float(os.environ.get('SESSION_TTL_HOURS', 24)) * 3600
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id INTEGER PRIMARY KEY, state TEXT, data TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)")
+        connection.commit()
+
+    def _connection(self):
+        """Get this thread's database connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def load(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get a user's session and mark it as recently used"""
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT state, data, last_access FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        # Refresh the access time at most once per interval, so reads rarely write
+        now = time.time()
+        if now - row[2] >= TOUCH_INTERVAL_SECONDS:
+            with connection:
+                connection.execute(
+                    "UPDATE sessions SET last_access = ? WHERE user_id = ?", (now, user_id)
+                )
+        return {'state': row[0], 'data': json.loads(row[1])}
+
+    def save(self, user_id: int, session: Dict[str, Any]):
+        """Store a user's session"""
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, state, data, last_access) VALUES (?, ?, ?, ?)",
+                (user_id, session.get('state'), json.dumps(session.get('data', {})), time.time())
+            )
+
+    def delete(self, user_id: int):
+        """Remove a user's session"""
+        with self._connection() as connection:
+            connection.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def active_user_ids(self) -> List[int]:
+        """Get users whose session has a state"""
+        rows = self._connection().execute(
+            "SELECT user_id FROM sessions WHERE state IS NOT NULL"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def evict_expired(self, ttl_seconds: float = None) -> int:
+        """Remove sessions idle for longer than the TTL"""
+        cutoff = time.time() - (ttl_seconds or self.ttl_seconds)
+        with self._connection() as connection:
+            cursor = connection.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,))
+        return cursor.rowcount
+
+    def get_stats(self):
+        """Get session count and stored size"""
+        count, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(COALESCE(state, '')) + LENGTH(data)), 0) FROM sessions"
+        ).fetchone()
+        return {
+            'backend': 'sqlite',
+            'sessions': count,
+            'bytes': size
+        }
+
+SESSION_BACKENDS = {
+    'memory': InMemorySessionStore,
+    'sqlite': SQLiteSessionStore
+}
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_session_store():
+    """Get the process-wide session store selected by SESSION_BACKEND"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            backend = os.environ.get('SESSION_BACKEND', 'memory').lower()
+            if backend not in SESSION_BACKENDS:
+                raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+            _default_store = SESSION_BACKENDS[backend]()
+            logger.info(f"Session store initialized with {backend} backend")
+        return _default_store
@@ -0,0 +1,108 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+import psutil
+from cleanup_system import cleanup_system
+from dispatcher import update_dispatcher
+from fair_scheduler import fair_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Sampled values summarized as min/avg/max
+TREND_FIELDS = ('cpu_percent', 'memory_percent', 'rss', 'disk_percent', 'temp_files', 'queue_depth')
+
+class StatsSampler:
+    """Sample system stats in a background thread into a ring buffer.
+
+    Every STATS_SAMPLE_SECONDS the thread records CPU, memory, the bot's
+    RSS (including its conversion workers), disk usage, temp file counts
+    and queue depths. The buffer holds STATS_WINDOW_MINUTES of samples, so
+    the master panel reads the latest values and recent trends without
+    blocking the event loop.
+    """
+
+    def __init__(self, interval: float = None, window_minutes: float = None):
+        self.interval = interval or float(os.environ.get('STATS_SAMPLE_SECONDS', 10))
+        self.window_minutes = window_minutes or float(os.environ.get('STATS_WINDOW_MINUTES', 15))
+        self._samples = deque(maxlen=max(1, int(self.window_minutes * 60 / self.interval)))
+        self._lock = threading.Lock()
+        self._process = psutil.Process()
+        self._thread = None
+
+    def _rss(self) -> int:
+        """Get the resident memory of this process and its children"""
+        rss = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return rss
+
+    def sample(self) -> Dict[str, Any]:
+        """Take one sample and add it to the buffer"""
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        temp_files, temp_size = cleanup_system.get_temp_stats()
+        dispatcher_stats = update_dispatcher.get_stats()
+        sample = {
+            'time': time.time(),
+            # CPU use since the previous sample
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_used': memory.used,
+            'memory_total': memory.total,
+            'memory_percent': memory.percent,
+            'rss': self._rss(),
+            'disk_used': disk.used,
+            'disk_total': disk.total,
+            'disk_percent': disk.used / disk.total * 100,
+            'temp_files': temp_files,
+            'temp_size': temp_size,
+            'queue_depth': dispatcher_stats['queued'] + fair_scheduler.get_stats()['waiting']
+        }
+        with self._lock:
+            self._samples.append(sample)
+        return sample
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Get the most recent sample"""
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def trends(self, minutes: float = None) -> Dict[str, tuple]:
+        """Get (min, avg, max) of each trend field over the last ``minutes``"""
+        cutoff = time.time() - (minutes or self.window_minutes) * 60
+        with self._lock:
+            samples = [sample for sample in self._samples if sample['time'] >= cutoff]
+        if not samples:
+            return {}
+        trends = {}
+        for field in TREND_FIELDS:
+            values = [sample[field] for sample in samples]
+            trends[field] = (min(values), sum(values) / len(values), max(values))
+        return trends
+
+    def start(self):
+        """Start sampling in a background thread"""
+        if self._thread is not None:
+            return
+        # The first cpu_percent call only sets the baseline
+        psutil.cpu_percent(interval=None)
+
+        def run():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.sample()
+                except Exception as e:
+                    logger.error(f"Stats sample failed: {e}")
+
+        self._thread = threading.Thread(target=run, name='stats-sampler', daemon=True)
+        self._thread.start()
+        logger.info(f"Stats sampler started ({self.interval:.0f}s interval, {self.window_minutes:.0f} min window)")
+
+# Global stats sampler instance
+stats_sampler = StatsSampler()
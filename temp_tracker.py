@@ -0,0 +1,101 @@
+import os
+import re
+import time
+import logging
+import tempfile
+import threading
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+# Converters name their temp file outputs with this prefix
+TEMP_OUTPUT_PREFIX = 'pdfbot_out_'
+
+# Temp outputs from before they were prefixed (plain tempfile.mkstemp names)
+LEGACY_OUTPUT_NAME = re.compile(r'tmp[a-z0-9_]{8}\.pdf')
+
+class TempFileTracker:
+    """Track the temp PDFs converters create and reclaim leaked ones.
+
+    Converters register each temp file output when they create it, and
+    ``discard_pdf_output`` unregisters it. A worker process cannot share
+    its registrations, so conversion_executor registers worker outputs
+    when their paths come back to the bot process. A temp output on disk
+    that is not registered and is older than TEMP_OUTPUT_TTL_MINUTES was
+    orphaned by an exception or a crash. The leak sweep logs and deletes
+    it.
+    """
+
+    def __init__(self, directory: str = None, ttl_seconds: float = None):
+        self.directory = directory or tempfile.gettempdir()
+        self.ttl_seconds = ttl_seconds or float(os.environ.get('TEMP_OUTPUT_TTL_MINUTES', 30)) * 60
+        self._tracked = set()
+        self._lock = threading.Lock()
+        self.sweeps = 0
+        self.leaks = 0
+        self.leaked_bytes = 0
+
+    @staticmethod
+    def is_temp_output(path: str) -> bool:
+        """Check whether a path is named like a converter's temp output"""
+        name = os.path.basename(path)
+        return (name.startswith(TEMP_OUTPUT_PREFIX) and name.endswith('.pdf')) \
+            or LEGACY_OUTPUT_NAME.fullmatch(name) is not None
+
+    def track(self, path: str):
+        """Register a temp output owned by this process"""
+        # In a pool worker the bot process registers the returned path instead
+        if multiprocessing.parent_process() is not None:
+            return
+        with self._lock:
+            self._tracked.add(os.path.abspath(path))
+
+    def untrack(self, path: str):
+        """Unregister a temp output that was deleted or handed over"""
+        with self._lock:
+            self._tracked.discard(os.path.abspath(path))
+
+    def sweep(self, ttl_seconds: float = None) -> int:
+        """Delete untracked temp outputs older than the TTL"""
+        cutoff = time.time() - (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        leaked = 0
+        leaked_bytes = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not self.is_temp_output(entry.name):
+                    continue
+                with self._lock:
+                    if os.path.abspath(entry.path) in self._tracked:
+                        continue
+                try:
+                    file_stat = entry.stat(follow_symlinks=False)
+                    if file_stat.st_mtime >= cutoff or not entry.is_file(follow_symlinks=False):
+                        continue
+                    os.unlink(entry.path)
+                except OSError:
+                    continue
+                leaked += 1
+                leaked_bytes += file_stat.st_size
+                logger.warning(f"Reclaimed leaked temp PDF {entry.name} "
+                               f"({file_stat.st_size / 1024:.0f} KB, {(time.time() - file_stat.st_mtime) / 3600:.1f}h old)")
+
+        self.sweeps += 1
+        self.leaks += leaked
+        self.leaked_bytes += leaked_bytes
+        if leaked:
+            logger.warning(f"Leak sweep reclaimed {leaked} temp PDFs ({leaked_bytes / 1024 / 1024:.1f} MB)")
+        return leaked
+
+    def get_stats(self):
+        """Get tracked output and leak counts"""
+        with self._lock:
+            tracked = len(self._tracked)
+        return {
+            'tracked': tracked,
+            'sweeps': self.sweeps,
+            'leaks': self.leaks,
+            'leaked_bytes': self.leaked_bytes
+        }
+
+# Global temp file tracker instance
+temp_tracker = TempFileTracker()
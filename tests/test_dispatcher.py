@@ -0,0 +1,74 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.mkdtemp(prefix='pdfbot_test_')
+os.environ.setdefault('JOB_JOURNAL_PATH', os.path.join(_scratch, 'jobs.db'))
+os.environ.setdefault('WORKSPACE_ROOT', os.path.join(_scratch, 'workspaces'))
+os.environ.setdefault('TRACE_PATH', os.path.join(_scratch, 'traces.jsonl'))
+os.environ.setdefault('USAGE_STATS_PATH', os.path.join(_scratch, 'usage.db'))
+
+import jobs
+from dispatcher import UpdateDispatcher
+from fair_scheduler import FairScheduler
+
+def test_light_update_runs_while_heavy_jobs_wait(monkeypatch):
+    """Jobs waiting for a heavy-job slot do not hold the dispatcher's update slots"""
+    dispatcher = UpdateDispatcher(max_concurrency=2)
+    monkeypatch.setattr(jobs, 'update_dispatcher', dispatcher)
+    monkeypatch.setattr(jobs, 'fair_scheduler', FairScheduler(slots=1))
+
+    async def scenario():
+        release = asyncio.Event()
+        started = []
+
+        def heavy(user_id):
+            async def job():
+                async with jobs.run_job(user_id, user_id, 'ocr2pdf', {}):
+                    started.append(user_id)
+                    await release.wait()
+            return job
+
+        light_done = asyncio.Event()
+
+        async def light():
+            light_done.set()
+
+        # One job holds the only heavy-job slot, the others wait for it
+        for user_id in (1, 2, 3):
+            assert dispatcher.submit(user_id, heavy(user_id), heavy=True)
+        await asyncio.sleep(0.1)
+        assert started == [1]
+
+        assert dispatcher.submit(4, light)
+        await asyncio.wait_for(light_done.wait(), 2)
+
+        release.set()
+        while dispatcher.get_stats()['active_lanes']:
+            await asyncio.sleep(0.01)
+        assert sorted(started) == [1, 2, 3]
+        assert dispatcher.get_stats()['failed'] == 0
+
+    asyncio.run(scenario())
+
+def test_deferred_job_takes_no_slot_until_it_acquires(monkeypatch):
+    """A job that finishes without real work, e.g. a file_id resend, never waits for a heavy-job slot"""
+    scheduler = FairScheduler(slots=1)
+    monkeypatch.setattr(jobs, 'fair_scheduler', scheduler)
+
+    async def scenario():
+        async with scheduler.slot(1, 'ocr2pdf'):
+            async with jobs.run_job(2, 2, 'img2pdf', {}, defer_slot=True) as job:
+                assert job.workspace is None
+            assert scheduler.get_stats()['running'] == 1
+
+        async with jobs.run_job(2, 2, 'img2pdf', {}, defer_slot=True) as job:
+            await job.acquire()
+            assert os.path.isdir(job.workspace.directory)
+            assert scheduler.get_stats()['running'] == 1
+        assert scheduler.get_stats()['running'] == 0
+
+    asyncio.run(asyncio.wait_for(scenario(), 2))
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# The trace of the job the current task (or worker call) belongs to, and
+# the name of the innermost open span
+_current_trace = contextvars.ContextVar('trace', default=None)
+_current_span = contextvars.ContextVar('span', default=None)
+
+class Trace:
+    """Timed spans of one job.
+
+    Spans are stored as dicts with a wall-clock ``start`` (so spans from
+    pool workers line up with the bot's), a ``duration`` in seconds, the
+    name of their ``parent`` span and any attributes. Stages are spans too,
+    with ``stage`` set; other spans opened during a stage are its children.
+    """
+
+    def __init__(self, job_id: Optional[str], user_id: Optional[int], operation: Optional[str], attempt: int = 1):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.operation = operation
+        self.attempt = attempt
+        self.started = time.time()
+        self._started_perf = time.perf_counter()
+        self.duration = None
+        self.outcome = None
+        self.spans: List[Dict[str, Any]] = []
+        self.stage = None
+        self._stage_start = self.started
+        self._stage_perf = self._started_perf
+
+    def add(self, name: str, start: float, duration: float, parent: Optional[str] = None, **attributes):
+        """Record a finished span"""
+        span = {'name': name, 'parent': parent, 'start': start, 'duration': duration}
+        span.update(attributes)
+        self.spans.append(span)
+
+    def _close_stage(self) -> float:
+        """Record the current stage as a span and return the time"""
+        now = time.perf_counter()
+        if self.stage is not None:
+            self.add(self.stage, self._stage_start, now - self._stage_perf, stage=True)
+        self._stage_start = time.time()
+        self._stage_perf = now
+        return now
+
+    def set_stage(self, stage: str):
+        """End the current stage and start a new one"""
+        self._close_stage()
+        self.stage = stage
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Get the seconds spent in each stage"""
+        totals = {}
+        for span in self.spans:
+            if span.get('stage'):
+                totals[span['name']] = totals.get(span['name'], 0.0) + span['duration']
+        return totals
+
+    def summary(self) -> Dict[str, Any]:
+        """Get the job's duration and where most of it went"""
+        totals = self.stage_totals()
+        dominant_stage = max(totals, key=totals.get) if totals else None
+        # Innermost steps, summed by name (e.g. every image.resize of the job)
+        parents = {span['parent'] for span in self.spans}
+        steps = {}
+        for span in self.spans:
+            if not span.get('stage') and span['name'] not in parents:
+                steps[span['name']] = steps.get(span['name'], 0.0) + span['duration']
+        dominant_span = max(steps, key=steps.get) if steps else None
+        return {
+            'job_id': self.job_id,
+            'operation': self.operation,
+            'outcome': self.outcome,
+            'started': self.started,
+            'duration': self.duration,
+            'dominant_stage': dominant_stage,
+            'dominant_stage_seconds': totals.get(dominant_stage, 0.0),
+            'dominant_span': dominant_span,
+            'dominant_span_seconds': steps.get(dominant_span, 0.0)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the JSON record of the trace, with span starts relative to the job's"""
+        return {
+            'job_id': self.job_id,
+            'user_id': self.user_id,
+            'operation': self.operation,
+            'attempt': self.attempt,
+            'outcome': self.outcome,
+            'started': self.started,
+            'duration': self.duration,
+            'stages': self.stage_totals(),
+            'spans': [dict(span, start=round(span['start'] - self.started, 6), duration=round(span['duration'], 6))
+                      for span in self.spans]
+        }
+
+class Tracer:
+    """Lightweight per-job tracing exported to a local JSONL file.
+
+    ``run_job`` activates a job's trace for the task running it, so spans
+    opened anywhere below (downloads, pool conversions, uploads) join it
+    without passing the job around. Pool workers collect their spans
+    (image decode, resize, encode, document conversion) and send them back
+    with the result. Outside a job ``span`` does nothing. Finished traces
+    are appended to TRACE_PATH, rotated at TRACE_MAX_MB, and the latest
+    TRACE_RECENT are kept in memory for the master panel.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None, recent: int = None):
+        self.path = path or os.environ.get(
+            'TRACE_PATH', os.path.join(tempfile.gettempdir(), 'pdfbot_traces.jsonl')
+        )
+        self.max_bytes = max_bytes or int(float(os.environ.get('TRACE_MAX_MB', 5)) * 1024 * 1024)
+        self._recent = deque(maxlen=recent or int(os.environ.get('TRACE_RECENT', 200)))
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.export_errors = 0
+
+    def start(self, job_id: str, user_id: int, operation: str, attempt: int = 1) -> Trace:
+        """Create the trace of a job"""
+        return Trace(job_id, user_id, operation, attempt)
+
+    @contextmanager
+    def activate(self, trace: Trace):
+        """Make ``trace`` the current trace for the duration of the block"""
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    def current(self) -> Optional[Trace]:
+        """Get the current trace, if any"""
+        return _current_trace.get()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a block as a span of the current trace.
+
+        Yields the span's attribute dict, so the block can add attributes
+        it only learns while running.
+        """
+        trace = _current_trace.get()
+        if trace is None:
+            yield attributes
+            return
+
+        parent = _current_span.get() or trace.stage
+        token = _current_span.set(name)
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes['error'] = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            trace.add(name, start, time.perf_counter() - started, parent, **attributes)
+
+    @contextmanager
+    def collect(self, parent: str):
+        """Collect the spans of a block, e.g. a call in a pool worker, under ``parent``"""
+        trace = Trace(None, None, None)
+        trace.stage = parent
+        with self.activate(trace):
+            yield trace
+
+    def finish(self, trace: Trace, outcome: str):
+        """End a job's trace and export it"""
+        finished = trace._close_stage()
+        trace.stage = None
+        trace.outcome = outcome
+        trace.duration = finished - trace._started_perf
+        with self._lock:
+            self._recent.append(trace.summary())
+        self._export(trace)
+
+    def _export(self, trace: Trace):
+        """Append a trace to the JSONL file, rotating it when it is full"""
+        try:
+            line = json.dumps(trace.to_dict(), default=str) + '\n'
+            with self._lock:
+                try:
+                    if os.path.getsize(self.path) + len(line) > self.max_bytes:
+                        os.replace(self.path, self.path + '.1')
+                except FileNotFoundError:
+                    pass
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write(line)
+            self.exported += 1
+        except (OSError, TypeError, ValueError) as e:
+            self.export_errors += 1
+            logger.warning(f"Could not export trace of job {trace.job_id}: {e}")
+
+    def slowest(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the summaries of the slowest recent jobs"""
+        with self._lock:
+            recent = list(self._recent)
+        return sorted(recent, key=lambda summary: summary['duration'], reverse=True)[:limit]
+
+    def get_stats(self):
+        """Get export counts"""
+        with self._lock:
+            recent = len(self._recent)
+        return {
+            'recent': recent,
+            'exported': self.exported,
+            'export_errors': self.export_errors,
+            'path': self.path
+        }
+
+# Global tracer instance
+tracer = Tracer()
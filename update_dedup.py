@@ -0,0 +1,45 @@
+import os
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class UpdateDeduplicator:
+    """Remember recently seen update IDs to drop Telegram webhook retries.
+
+    IDs live in a set for O(1) lookups and in a fixed-size deque that
+    records insertion order, so the oldest ID is forgotten once the window
+    is full and memory stays bounded.
+    """
+
+    def __init__(self, window: int = None):
+        self.window = window or int(os.environ.get('UPDATE_DEDUP_WINDOW', 10000))
+        self._order = deque()
+        self._seen = set()
+        self.hits = 0
+        self.misses = 0
+
+    def is_duplicate(self, update_id) -> bool:
+        """Check an update ID and record it if it is new"""
+        if update_id in self._seen:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        if len(self._order) >= self.window:
+            self._seen.discard(self._order.popleft())
+        self._order.append(update_id)
+        self._seen.add(update_id)
+        return False
+
+    def get_stats(self):
+        """Get duplicate hit and miss counters"""
+        return {
+            'window': self.window,
+            'tracked': len(self._order),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+# Global update deduplicator instance
+update_deduplicator = UpdateDeduplicator()
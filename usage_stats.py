@@ -0,0 +1,273 @@
+import os
+import math
+import time
+import queue
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+def _day(timestamp: float) -> str:
+    """Get the UTC date of a timestamp, e.g. '2024-05-01'"""
+    return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+
+class HyperLogLog:
+    """Fixed-size sketch that estimates how many distinct items were added.
+
+    With 2**precision one-byte registers the standard error is about
+    1.04 / sqrt(2**precision): 4 KB and 1.6% at the default precision 12.
+    """
+
+    def __init__(self, precision: int = 12, registers: bytes = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.size)
+
+    def add(self, item) -> bool:
+        """Add an item; returns whether the sketch changed"""
+        value = int.from_bytes(hashlib.blake2b(str(item).encode(), digest_size=8).digest(), 'big')
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other: 'HyperLogLog'):
+        """Fold another sketch of the same precision into this one"""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        """Estimate the number of distinct items"""
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        # Linear counting is more accurate while many registers are empty
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+class UsageStats:
+    """Append-only usage event log with pre-aggregated counters.
+
+    ``record`` only puts the event on a queue; a writer thread appends
+    batches of events to SQLite and updates the aggregates in the same
+    transaction: event counts per day, kind and operation, and
+    HyperLogLog sketches of distinct users overall, per day and per
+    operation. The aggregates are also kept in memory, so the master
+    panel never scans the raw log. Raw events older than
+    USAGE_EVENT_RETENTION_DAYS are pruned; the aggregates are kept.
+    """
+
+    def __init__(self, path: str = None, retention_days: float = None, batch_size: int = 500):
+        self.path = path or os.environ.get(
+            'USAGE_STATS_PATH', os.path.join(tempfile.gettempdir(), 'pdfbot_usage.db')
+        )
+        self.retention_days = retention_days or float(os.environ.get('USAGE_EVENT_RETENTION_DAYS', 30))
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.recorded = 0
+        self.written = 0
+        self.write_errors = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS usage_events ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, user_id INTEGER, "
+                "kind TEXT NOT NULL, operation TEXT)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS usage_counts ("
+                "day TEXT NOT NULL, kind TEXT NOT NULL, operation TEXT NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (day, kind, operation))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS usage_sketches (scope TEXT PRIMARY KEY, registers BLOB NOT NULL)"
+            )
+        self._load()
+
+    def _connection(self):
+        """Get this thread's database connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _load(self):
+        """Load the aggregates into memory"""
+        connection = self._connection()
+        self._counts: Dict[tuple, int] = {
+            (day, kind, operation): count
+            for day, kind, operation, count in connection.execute(
+                "SELECT day, kind, operation, count FROM usage_counts"
+            )
+        }
+        self._sketches: Dict[str, HyperLogLog] = {
+            scope: HyperLogLog(registers=registers)
+            for scope, registers in connection.execute("SELECT scope, registers FROM usage_sketches")
+        }
+        self.events = connection.execute("SELECT COUNT(*) FROM usage_events").fetchone()[0]
+
+    def record(self, kind: str, user_id: Optional[int], operation: str = None):
+        """Queue a usage event, e.g. ('active', user) or ('done', user, 'img2pdf')"""
+        self._queue.put_nowait((time.time(), user_id, kind, operation))
+        self.recorded += 1
+
+    def _apply(self, events) -> Iterable[str]:
+        """Update the in-memory aggregates and return the sketch scopes that changed"""
+        changed = set()
+        with self._lock:
+            for timestamp, user_id, kind, operation in events:
+                day = _day(timestamp)
+                key = (day, kind, operation or '')
+                self._counts[key] = self._counts.get(key, 0) + 1
+                if user_id is None:
+                    continue
+                scopes = ['users', f'day:{day}']
+                if operation:
+                    scopes.append(f'op:{operation}')
+                for scope in scopes:
+                    sketch = self._sketches.get(scope)
+                    if sketch is None:
+                        sketch = self._sketches[scope] = HyperLogLog()
+                    if sketch.add(user_id):
+                        changed.add(scope)
+            return {scope: bytes(self._sketches[scope].registers) for scope in changed}
+
+    def _write(self, events):
+        """Append a batch of events and update the stored aggregates"""
+        sketches = self._apply(events)
+        counts = {}
+        for timestamp, _, kind, operation in events:
+            key = (_day(timestamp), kind, operation or '')
+            counts[key] = counts.get(key, 0) + 1
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT INTO usage_events (ts, user_id, kind, operation) VALUES (?, ?, ?, ?)", events
+            )
+            connection.executemany(
+                "INSERT INTO usage_counts (day, kind, operation, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (day, kind, operation) DO UPDATE SET count = count + excluded.count",
+                [key + (count,) for key, count in counts.items()]
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO usage_sketches (scope, registers) VALUES (?, ?)", sketches.items()
+            )
+        self.events += len(events)
+        self.written += len(events)
+
+    def flush(self):
+        """Write every queued event now"""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if events:
+            self._write(events)
+
+    def start(self):
+        """Start writing events in a background thread"""
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                events = [self._queue.get()]
+                while len(events) < self.batch_size:
+                    try:
+                        events.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    self._write(events)
+                except Exception as e:
+                    self.write_errors += 1
+                    logger.error(f"Could not write {len(events)} usage events: {e}")
+
+        self._thread = threading.Thread(target=run, name='usage-stats', daemon=True)
+        self._thread.start()
+        logger.info("Usage stats writer started")
+
+    def prune(self) -> int:
+        """Delete raw events and daily sketches past the retention period"""
+        cutoff = time.time() - self.retention_days * 86400
+        with self._connection() as connection:
+            deleted = connection.execute("DELETE FROM usage_events WHERE ts < ?", (cutoff,)).rowcount
+            old_scopes = [scope for scope in list(self._sketches)
+                          if scope.startswith('day:') and scope[4:] < _day(cutoff)]
+            connection.executemany("DELETE FROM usage_sketches WHERE scope = ?", [(scope,) for scope in old_scopes])
+        with self._lock:
+            for scope in old_scopes:
+                self._sketches.pop(scope, None)
+        self.events -= deleted
+        if deleted:
+            logger.info(f"Pruned {deleted} usage events older than {self.retention_days:.0f} days")
+        return deleted
+
+    def _distinct(self, scopes) -> int:
+        """Estimate the distinct users across sketches"""
+        merged = HyperLogLog()
+        found = False
+        for scope in scopes:
+            sketch = self._sketches.get(scope)
+            if sketch is not None:
+                merged.merge(sketch)
+                found = True
+        return merged.count() if found else 0
+
+    def _sum(self, kinds, days=None, operation=None) -> int:
+        """Sum the event counts of some kinds, optionally on some days or for one operation"""
+        return sum(count for (day, kind, op), count in self._counts.items()
+                   if kind in kinds and (days is None or day in days)
+                   and (operation is None or op == operation))
+
+    def get_summary(self, days: int = 7) -> Dict:
+        """Get user and job totals from the aggregates"""
+        today = _day(time.time())
+        recent_days = {_day(time.time() - offset * 86400) for offset in range(days)}
+        with self._lock:
+            operations = sorted({op for (_, kind, op) in self._counts if op and kind in ('done', 'failed')})
+            summary = {
+                'total_users': self._distinct(['users']),
+                'active_today': self._distinct([f'day:{today}']),
+                'active_recent': self._distinct([f'day:{day}' for day in recent_days]),
+                'recent_days': days,
+                'files_processed': self._sum(('done',)),
+                'files_today': self._sum(('done',), {today}),
+                'jobs_failed': self._sum(('failed',)),
+                'operations': [
+                    {
+                        'operation': operation,
+                        'done': self._sum(('done',), operation=operation),
+                        'failed': self._sum(('failed',), operation=operation),
+                        'users': self._distinct([f'op:{operation}'])
+                    }
+                    for operation in operations
+                ]
+            }
+        summary['operations'].sort(key=lambda row: row['done'], reverse=True)
+        return summary
+
+    def get_stats(self):
+        """Get event log counts"""
+        return {
+            'events': self.events,
+            'recorded': self.recorded,
+            'pending': self._queue.qsize(),
+            'write_errors': self.write_errors
+        }
+
+# Global usage stats instance
+usage_stats = UsageStats()
@@ -1,68 +1,89 @@
 import logging
 from typing import Dict, Any, Optional
+from session_store import get_session_store
 
 logger = logging.getLogger(__name__)
 
 class UserStateManager:
     """Manage user states and data for multi-step operations"""
     
-    def __init__(self):
-        self.user_states: Dict[int, str] = {}
-        self.user_data: Dict[int, Dict[str, Any]] = {}
+    def __init__(self, store=None):
+        # All managers share the configured store unless one is passed in
+        self.store = store or get_session_store()
+    
+    def _load(self, user_id: int) -> Dict[str, Any]:
+        """Load a user's session, or an empty one"""
+        return self.store.load(user_id) or {'state': None, 'data': {}}
+    
+    def _save(self, user_id: int, session: Dict[str, Any]):
+        """Save a user's session, dropping it once it is empty"""
+        if session['state'] is None and not session['data']:
+            self.store.delete(user_id)
+        else:
+            self.store.save(user_id, session)
     
     def set_state(self, user_id: int, state: str):
         """Set user state"""
-        self.user_states[user_id] = state
+        session = self._load(user_id)
+        session['state'] = state
+        self._save(user_id, session)
         logger.debug(f"User {user_id} state set to: {state}")
     
     def get_state(self, user_id: int) -> Optional[str]:
         """Get user state"""
-        return self.user_states.get(user_id)
+        return self._load(user_id)['state']
     
     def clear_state(self, user_id: int):
         """Clear user state"""
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        session = self._load(user_id)
+        if session['state'] is not None:
+            session['state'] = None
+            self._save(user_id, session)
             logger.debug(f"User {user_id} state cleared")
     
     def set_user_data(self, user_id: int, key: str, value: Any):
         """Set user data"""
-        if user_id not in self.user_data:
-            self.user_data[user_id] = {}
-        self.user_data[user_id][key] = value
+        session = self._load(user_id)
+        session['data'][key] = value
+        self._save(user_id, session)
         logger.debug(f"User {user_id} data set: {key}")
     
     def get_user_data(self, user_id: int, key: str) -> Any:
         """Get user data"""
-        return self.user_data.get(user_id, {}).get(key)
+        return self._load(user_id)['data'].get(key)
     
     def clear_user_data(self, user_id: int, key: str):
         """Clear specific user data"""
-        if user_id in self.user_data and key in self.user_data[user_id]:
-            del self.user_data[user_id][key]
+        session = self._load(user_id)
+        if key in session['data']:
+            del session['data'][key]
+            self._save(user_id, session)
             logger.debug(f"User {user_id} data cleared: {key}")
     
     def clear_user_state(self, user_id: int):
         """Clear all user state and data"""
-        self.clear_state(user_id)
-        if user_id in self.user_data:
-            del self.user_data[user_id]
-            logger.debug(f"User {user_id} all data cleared")
+        self.store.delete(user_id)
+        logger.debug(f"User {user_id} all data cleared")
     
     def get_all_user_data(self, user_id: int) -> Dict[str, Any]:
         """Get all user data"""
-        return self.user_data.get(user_id, {})
+        return self._load(user_id)['data']
     
     def has_state(self, user_id: int) -> bool:
         """Check if user has an active state"""
-        return user_id in self.user_states
+        return self.get_state(user_id) is not None
     
     def get_active_users(self) -> list:
         """Get list of users with active states"""
-        return list(self.user_states.keys())
+        return self.store.active_user_ids()
+    
+    def cleanup_inactive_users(self, active_threshold_hours: float = None):
+        """Clean up data for users inactive longer than the threshold (default: the store's TTL)"""
+        removed = self.store.evict_expired(None if active_threshold_hours is None else active_threshold_hours * 3600)
+        if removed:
+            logger.info(f"Removed {removed} inactive user sessions")
+        return removed
     
-    def cleanup_inactive_users(self, active_threshold_hours: int = 24):
-        """Clean up data for inactive users (placeholder for future enhancement)"""
-        # This could be enhanced to track timestamps and clean up old data
-        # For now, data persists until manually cleared
-        pass
+    def get_stats(self):
+        """Get session count and size from the store"""
+        return self.store.get_stats()
@@ -0,0 +1,143 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List
+from instance import process_instance
+
+logger = logging.getLogger(__name__)
+
+class Workspace:
+    """Scratch directory of one job"""
+
+    def __init__(self, job_id: str, user_id: int, operation: str, directory: str):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.operation = operation
+        self.directory = directory
+        self.created = time.time()
+
+    def file(self, name: str) -> str:
+        """Get a path inside the workspace; directory parts of ``name`` are dropped"""
+        return os.path.join(self.directory, os.path.basename(name) or 'file')
+
+    def usage(self):
+        """Count the files in the workspace and their total size"""
+        files = 0
+        size = 0
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.is_file(follow_symlinks=False):
+                    files += 1
+                    size += entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            pass
+        return files, size
+
+class WorkspaceRegistry:
+    """Give every job its own scratch directory and remove it when the job ends.
+
+    Workspaces live under WORKSPACE_ROOT/<instance ID>, one directory per
+    job ID, so workers sharing the disk never touch each other's. They are
+    deleted as soon as their job finishes, whether it succeeded, failed or
+    was cancelled. The registry of live workspaces feeds the master panel.
+    Directories that are not live (left by a crashed process) are orphans
+    and are removed on start and by the hourly cleanup.
+    """
+
+    def __init__(self, root: str = None, instance_id: str = None):
+        self.root = os.path.join(
+            root or os.environ.get('WORKSPACE_ROOT', os.path.join(tempfile.gettempdir(), 'pdfbot_work')),
+            instance_id or process_instance.instance_id
+        )
+        self._live: Dict[str, Workspace] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.removed = 0
+        self.orphans_removed = 0
+
+    @contextmanager
+    def open(self, job_id: str, user_id: int, operation: str):
+        """Create a job's workspace for the duration of the block"""
+        workspace = Workspace(job_id, user_id, operation, os.path.join(self.root, job_id))
+        # Register first so an orphan sweep never sees it half created
+        with self._lock:
+            self._live[job_id] = workspace
+        try:
+            os.makedirs(workspace.directory, exist_ok=True)
+            self.created += 1
+            yield workspace
+        finally:
+            shutil.rmtree(workspace.directory, ignore_errors=True)
+            with self._lock:
+                self._live.pop(job_id, None)
+            self.removed += 1
+
+    def live_workspaces(self) -> List[Dict[str, Any]]:
+        """Describe the workspaces of running jobs, oldest first"""
+        with self._lock:
+            workspaces = sorted(self._live.values(), key=lambda workspace: workspace.created)
+        now = time.time()
+        described = []
+        for workspace in workspaces:
+            files, size = workspace.usage()
+            described.append({
+                'job_id': workspace.job_id,
+                'user_id': workspace.user_id,
+                'operation': workspace.operation,
+                'age': now - workspace.created,
+                'files': files,
+                'bytes': size
+            })
+        return described
+
+    def written(self, job_id: str) -> int:
+        """Get the bytes a running job has written to its workspace"""
+        with self._lock:
+            workspace = self._live.get(job_id)
+        return workspace.usage()[1] if workspace else 0
+
+    def remove_orphans(self, max_age_seconds: float = 0) -> int:
+        """Remove directories of dead jobs not modified for max_age_seconds"""
+        if not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for entry in os.scandir(self.root):
+            with self._lock:
+                if entry.name in self._live:
+                    continue
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    continue
+            removed += 1
+        if removed:
+            self.orphans_removed += removed
+            logger.info(f"Removed {removed} orphaned job workspaces")
+        return removed
+
+    def get_stats(self):
+        """Get live workspace and teardown counts"""
+        with self._lock:
+            live = len(self._live)
+        return {
+            'live': live,
+            'created': self.created,
+            'removed': self.removed,
+            'orphans_removed': self.orphans_removed
+        }
+
+# Global workspace registry instance
+workspace_registry = WorkspaceRegistry()